@@ -1,24 +1,23 @@
 # -*- coding: utf-8 -*-
 """
 This script processes the source knowledge base, creates text embeddings,
-and stores them in a ChromaDB vector store.
+and stores them in a ChromaDB vector store. The store is synced incrementally:
+only new and changed Q&A pairs are embedded, and removed ones are deleted.
 """
 import json
-import os
 import sys
 from pathlib import Path
 
 # Add the project root to the Python path
 # This is a professional way to ensure that imports from other project directories work correctly
-project_root = Path(__file__).resolve().parent.parent
+project_root = Path(__file__).resolve().parents[3]
 sys.path.append(str(project_root))
 
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain.docstore.document import Document
 from tqdm import tqdm
 
-from erp_ai_pro.core.rag_config import RAGConfig
+from erp_ai_pro.config.rag_config import RAGConfig
+from erp_ai_pro.cognitive.indexing import KnowledgeDocument, content_hash
+from erp_ai_pro.cognitive.ingestion import sync_vector_store
 
 def create_vector_store():
     """Main function to build and persist the vector store."""
@@ -32,39 +31,26 @@ def create_vector_store():
         knowledge_data = json.load(f)
     print(f"Loaded {len(knowledge_data)} knowledge items.")
 
-    # 2. Convert data into LangChain Document objects
+    # 2. Convert data into knowledge documents
     # We create a single document for each Q&A pair, combining them into a coherent text.
     # This helps the retrieval model find relevant context based on either question or answer content.
+    # Pairs without an id are keyed on their content, so the sync can tell them apart.
     documents = []
     for item in tqdm(knowledge_data, desc="Processing documents"):
         content = f"Role: {item['role']}\nQuestion: {item['instruction']}\nAnswer: {item['response']}"
         metadata = {"role": item["role"]}
-        doc = Document(page_content=content, metadata=metadata)
-        documents.append(doc)
-    
-    print(f"Created {len(documents)} LangChain documents.")
+        document_id = str(item.get("id") or content_hash(content, metadata))
+        documents.append(KnowledgeDocument(document_id, content, metadata))
 
-    # 3. Initialize the embedding model
-    print(f"Initializing embedding model: {config.embedding_model_name}")
-    # This model runs locally and is great for general-purpose text embeddings.
-    embedding_function = SentenceTransformerEmbeddings(model_name=config.embedding_model_name)
+    print(f"Created {len(documents)} knowledge documents.")
 
-    # 4. Create and persist the ChromaDB vector store
-    print(f"Creating and persisting vector store at: {config.vector_store_path}")
-    if os.path.exists(config.vector_store_path):
-        print("Vector store already exists. Deleting old version.")
-        # A more robust implementation might update the store instead of deleting.
-        import shutil
-        shutil.rmtree(config.vector_store_path)
+    # 3. Sync the ChromaDB vector store: embed new and changed documents, delete removed ones.
+    # The store is updated in place, so it stays queryable while this runs.
+    print(f"Syncing vector store at: {config.vector_store_path} (embedding model: {config.embedding_model_name})")
+    config.vector_store_backend = "chroma"
+    report = sync_vector_store(config, documents)
 
-    vector_store = Chroma.from_documents(
-        documents=documents,
-        embedding=embedding_function,
-        persist_directory=config.vector_store_path,
-        collection_name=config.collection_name
-    )
-
-    print(f"Vector store created successfully with {vector_store._collection.count()} documents.")
+    print(f"Vector store synced: {report}.")
     print("--- Vector Store Creation Complete ---")
 
 if __name__ == "__main__":
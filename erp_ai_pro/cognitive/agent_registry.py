@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Agent Registry for ERP AI Pro
+Agents are registered as factories and built on first use, or warmed in the background
+after the server has started accepting traffic. Construction runs off the event loop and
+at most once per agent, however many requests ask for it concurrently.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import structlog
+from prometheus_client import Gauge, Histogram
+
+logger = structlog.get_logger()
+
+# Metrics
+agent_ready = Gauge('erp_ai_agent_ready', 'Whether an agent is initialized and ready', ['agent'])
+agent_load_duration = Histogram('erp_ai_agent_load_seconds', 'Time spent initializing an agent', ['agent'])
+
+# Agent states
+REGISTERED = "registered"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class AgentRegistry:
+    """Holds agent instances and the factories that build the ones not created yet."""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._states: Dict[str, str] = {}
+        self._errors: Dict[str, str] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._warmup_task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, instance: Any):
+        """Registers an agent that is already built."""
+        self._instances[name] = instance
+        self._states[name] = READY
+        agent_ready.labels(agent=name).set(1)
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """
+        Registers a (synchronous, possibly slow) factory; the agent is built on first use.
+        """
+        self._factories[name] = factory
+        self._states[name] = REGISTERED
+        agent_ready.labels(agent=name).set(0)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._states
+
+    def __getitem__(self, name: str) -> Any:
+        """Returns an agent that must already be built."""
+        return self._instances[name]
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Returns the agent if it is ready, without triggering initialization."""
+        return self._instances.get(name)
+
+    async def get(self, name: str) -> Optional[Any]:
+        """
+        Returns the agent, building it first if needed. Concurrent callers share one build.
+        Returns None for unknown agents and agents whose initialization failed.
+        """
+        if name in self._instances:
+            return self._instances[name]
+        if name not in self._factories or self._states[name] == FAILED:
+            return None
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if name in self._instances or self._states[name] == FAILED:
+                return self._instances.get(name)
+
+            self._states[name] = LOADING
+            logger.info(f"Initializing {name}...")
+            start_time = time.perf_counter()
+            try:
+                loop = asyncio.get_running_loop()
+                instance = await loop.run_in_executor(None, self._factories[name])
+            except Exception as e:
+                self._states[name] = FAILED
+                self._errors[name] = str(e)
+                logger.error(f"Failed to initialize {name}: {e}")
+                return None
+
+            self._load_seconds[name] = time.perf_counter() - start_time
+            agent_load_duration.labels(agent=name).observe(self._load_seconds[name])
+            self._instances[name] = instance
+            self._states[name] = READY
+            agent_ready.labels(agent=name).set(1)
+            logger.info(f"{name} ready in {self._load_seconds[name]:.2f}s.")
+            return instance
+
+    def warmup(self, names: Iterable[str]) -> asyncio.Task:
+        """Builds the given agents one after another in a background task."""
+        names = list(names)
+        unknown = [name for name in names if name not in self]
+        if unknown:
+            logger.warning(f"Cannot preload unknown agents: {unknown}")
+        names = [name for name in names if name in self]
+
+        async def run():
+            for name in names:
+                await self.get(name)
+
+        self._warmup_task = asyncio.ensure_future(run())
+        return self._warmup_task
+
+    def stop_warmup(self):
+        """Cancels a pending warmup. An agent already being built in a thread still finishes."""
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Per-agent readiness for health checks."""
+        report = {}
+        for name, state in self._states.items():
+            entry: Dict[str, Any] = {"state": state}
+            if name in self._load_seconds:
+                entry["load_seconds"] = round(self._load_seconds[name], 3)
+            if name in self._errors:
+                entry["error"] = self._errors[name]
+            report[name] = entry
+        return report
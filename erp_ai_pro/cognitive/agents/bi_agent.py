@@ -5,18 +5,22 @@ Acts as an interface to the powerful BI module.
 """
 
 import logging
-from typing import Dict, Any
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, Any
 import numpy as np
 import structlog
 
 # Import the existing, powerful BI module
-from erp_ai_pro.core.business_intelligence import BusinessIntelligence, BIConfig
+from erp_ai_pro.cognitive.business_intelligence import BusinessIntelligence, BIConfig
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = structlog.get_logger()
 
-def create_sample_data() -> Dict[str, pd.DataFrame]:
+def create_sample_data() -> Dict[str, "pd.DataFrame"]:
     """Creates sample data for the BI agent to analyze."""
+    import pandas as pd
+
     # Sample sales data
     sales_data = {
         'date': pd.to_datetime(pd.date_range(start='2023-01-01', periods=100)),
@@ -12,18 +12,11 @@ from datetime import datetime
 import json
 import base64
 from io import BytesIO
-from PIL import Image, ImageDraw
-import cv2
 import numpy as np
+from pydantic import BaseModel, Field
 
-# Selenium for browser automation
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
+# Selenium (and the browser driver it controls) is imported when an agent is created
+# or an action runs, so importing the tool definitions stays cheap.
 
 # Configuration
 ERP_BASE_URL = os.getenv("ERP_BASE_URL", "http://localhost:3000")
@@ -45,6 +38,10 @@ class ComputerUseAgent:
     
     def setup_driver(self):
         """Khởi tạo Selenium WebDriver với các options tối ưu."""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.support.ui import WebDriverWait
+
         chrome_options = Options()
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
@@ -227,6 +224,9 @@ class ComputerUseAgent:
     
     async def _click_element(self, target: str) -> Dict[str, Any]:
         """Click vào element."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
         try:
             # Multiple strategies to find element
             element = None
@@ -286,6 +286,7 @@ class ComputerUseAgent:
     
     async def _type_text(self, target: str, text: str) -> Dict[str, Any]:
         """Nhập text vào input field."""
+        from selenium.webdriver.common.by import By
         try:
             # Find input element
             element = None
@@ -330,6 +331,7 @@ class ComputerUseAgent:
     
     async def _navigate_to(self, target: str) -> Dict[str, Any]:
         """Navigate đến page hoặc section."""
+        from selenium.webdriver.common.by import By
         try:
             # Try to find and click navigation menu
             nav_element = None
@@ -391,6 +393,9 @@ class ComputerUseAgent:
     
     async def _wait_for_element(self, target: str) -> Dict[str, Any]:
         """Đợi element xuất hiện."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
         try:
             # Wait for element to be present
             element = WebDriverWait(self.driver, 10).until(
@@ -409,6 +414,7 @@ class ComputerUseAgent:
     
     async def _extract_data(self, target: str) -> Dict[str, Any]:
         """Extract dữ liệu từ page."""
+        from selenium.webdriver.common.by import By
         try:
             extracted_data = {}
             
@@ -1,20 +1,53 @@
 import asyncio
-from typing import Dict, Any, List
-from erp_ai_pro.core.tools import VectorSearchTool, graph_erp_lookup
-from erp_ai_pro.core.rag_config import RAGConfig
+import time
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+import structlog
+
+from erp_ai_pro.config.rag_config import RAGConfig
+from erp_ai_pro.cognitive.llm_providers import LLMProvider
+from erp_ai_pro.cognitive.rbac import document_filter
+from erp_ai_pro.cognitive.cascade import ModelCascade
+from erp_ai_pro.cognitive.embeddings import load_sentence_encoder
+from erp_ai_pro.cognitive.indexing import index_version
+from erp_ai_pro.cognitive.retrieval import BM25Index, HybridRetriever
+from erp_ai_pro.cognitive.reranking import CrossEncoderReranker
+from erp_ai_pro.cognitive.tracing import span
+from erp_ai_pro.cognitive.vector_index import NativeVectorStore
+
+logger = structlog.get_logger()
 
 class KnowledgeAgent:
     """
     Agent chuyên xử lý truy vấn kiến thức cho hệ thống ERP AI Pro.
     Sử dụng vector search, LLM và RBAC để trả lời câu hỏi dựa trên vai trò người dùng.
     """
-    def __init__(self, config, llm):
+    def __init__(self, config, llm: LLMProvider, cascade: Optional[ModelCascade] = None):
         self.config = config or RAGConfig()
         self.llm = llm
-        # Khởi tạo vector search tool
-        self.vector_search_tool = VectorSearchTool(self._init_vector_store(), self.config.retrieval_k)
+        # Model cascade (tùy chọn): câu hỏi đơn giản do model nhỏ trả lời, còn lại do self.llm.
+        self.cascade = cascade
+        # Khởi tạo vector store
+        self.vector_store = self._init_vector_store()
+        # Phiên bản index đang dùng; khi tiến trình đồng bộ (indexing.py) ghi phiên bản mới,
+        # retrieve() nạp lại index mà không chặn các truy vấn đang chạy
+        self.index_version = index_version(self._index_path()) if self.vector_store is not None else None
+        self._index_checked_at = time.monotonic()
+        self._reloading = False
+        # Chỉ mục BM25 chạy song song với vector store (hybrid retrieval); None nếu tắt
+        self.retriever = self._init_hybrid_retriever()
+        # Cross-encoder xếp hạng lại các ứng viên; None nếu tắt hoặc không tải được model
+        self.reranker = self._init_reranker()
 
     def _init_vector_store(self):
+        if self.config.vector_store_backend == "native":
+            # Index memory-mapped, dùng chung giữa các worker
+            return NativeVectorStore(
+                self.config.native_index_path,
+                load_sentence_encoder(self.config.embedding_model_name),
+                nprobe=self.config.native_index_nprobe,
+                rescore_factor=self.config.native_index_rescore_factor,
+            )
         # Khởi tạo vector store (ChromaDB)
         from langchain_community.vectorstores import Chroma
         from langchain_community.embeddings import SentenceTransformerEmbeddings
@@ -25,32 +58,223 @@ class KnowledgeAgent:
             collection_name=self.config.collection_name
         )
 
-    async def execute(self, question: str, role: str) -> Dict[str, Any]:
+    def _index_path(self) -> str:
+        if self.config.vector_store_backend == "native":
+            return self.config.native_index_path
+        return self.config.vector_store_path
+
+    def _init_hybrid_retriever(self) -> Optional[HybridRetriever]:
+        # Dựng chỉ mục BM25 từ toàn bộ chunk đã có trong vector store
+        if self.vector_store is None or not self.config.hybrid_retrieval_enabled:
+            return None
+        stored = self.vector_store.get(include=["documents", "metadatas"])
+        lexical_index = BM25Index()
+        lexical_index.add_many(zip(stored["documents"], stored["metadatas"]))
+        return HybridRetriever(
+            self._dense_search,
+            lexical_index,
+            candidates_k=self.config.hybrid_candidates_k,
+            rrf_k=self.config.hybrid_rrf_k,
+        )
+
+    def _init_reranker(self) -> Optional[CrossEncoderReranker]:
+        if self.vector_store is None or not self.config.rerank_enabled:
+            return None
+        if self.config.rerank_k >= self.config.retrieval_k:
+            # Rerank chỉ sắp xếp lại mà không lọc bớt tài liệu nào: không đáng chi phí cross-encoder
+            logger.info(f"rerank_k ({self.config.rerank_k}) >= retrieval_k ({self.config.retrieval_k}), bỏ qua rerank.")
+            return None
+        reranker = CrossEncoderReranker(
+            self.config.reranker_model_name,
+            batch_size=self.config.rerank_batch_size,
+            cache_size=self.config.rerank_cache_size,
+            max_latency_ms=self.config.rerank_max_latency_ms,
+            probe_interval_seconds=self.config.rerank_probe_interval_seconds,
+        )
+        try:
+            # Tải model ngay khi dựng agent, để truy vấn đầu tiên không phải chờ
+            reranker.load()
+        except Exception as e:
+            logger.warning(f"Không tải được cross-encoder '{self.config.reranker_model_name}', bỏ qua rerank: {e}")
+            return None
+        return reranker
+
+    async def _refresh_index(self):
+        """
+        Kiểm tra phiên bản index tối đa mỗi index_refresh_seconds giây; khi phiên bản đổi thì
+        mở phiên bản mới và dựng lại chỉ mục BM25 trong executor. Các truy vấn trong lúc nạp
+        vẫn dùng index cũ, đến khi index mới được gán thay thế.
+        """
+        if self.vector_store is None or self._reloading:
+            return
+        now = time.monotonic()
+        if now - self._index_checked_at < self.config.index_refresh_seconds:
+            return
+        self._index_checked_at = now
+        self._reloading = True
+        try:
+            loop = asyncio.get_running_loop()
+            version = await loop.run_in_executor(None, index_version, self._index_path())
+            if version == self.index_version:
+                return
+            await loop.run_in_executor(None, self._reload_index)
+            self.index_version = version
+            logger.info(f"KnowledgeAgent đã nạp phiên bản index {version}.")
+        except Exception as e:
+            logger.warning(f"Không nạp lại được index, tiếp tục dùng phiên bản cũ: {e}")
+        finally:
+            self._reloading = False
+
+    def _reload_index(self):
+        if isinstance(self.vector_store, NativeVectorStore):
+            self.vector_store.reload()
+        self.retriever = self._init_hybrid_retriever()
+        if self.reranker is not None:
+            # Điểm cache theo id tài liệu; nội dung có thể đã đổi
+            self.reranker.scores.clear()
+
+    def _dense_search(self, question: str, k: int, role: Optional[str] = None) -> List[Dict[str, Any]]:
+        # Lọc theo vai trò ngay trong vector store: chỉ tìm trong các tài liệu vai trò được xem
+        if isinstance(self.vector_store, NativeVectorStore):
+            documents = self.vector_store.similarity_search(question, k=k, role=role)
+        else:
+            documents = self.vector_store.similarity_search(question, k=k, filter=document_filter(role))
+        return [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents]
+
+    async def retrieve(self, question: str, role: str) -> List[Dict[str, Any]]:
+        """
+        Tìm các tài liệu liên quan trong số tài liệu mà vai trò được phép xem
+        (metadata.authorized_roles): vector search, kết hợp với BM25 bằng reciprocal rank
+        fusion khi bật hybrid retrieval, rồi cross-encoder giữ lại rerank_k tài liệu tốt nhất.
+        Không có tác dụng phụ, nên có thể chạy song song (speculative) trong lúc
+        Orchestrator đang định tuyến.
+        """
+        await self._refresh_index()
+        loop = asyncio.get_running_loop()
+        search = self.retriever.search if self.retriever else self._dense_search
+        with span("retrieval", agent="KnowledgeAgent", hybrid=self.retriever is not None, role=role):
+            # Không rerank thì chỉ lấy số tài liệu sẽ đưa vào prompt
+            k = self.config.retrieval_k if self.reranker else min(self.config.retrieval_k, self.config.rerank_k)
+            documents = await loop.run_in_executor(None, search, question, k, role)
+        if self.reranker is None:
+            return documents
+        with span("rerank", agent="KnowledgeAgent", candidates=len(documents)) as reranking:
+            documents, outcome = await self.reranker.rerank(question, documents, self.config.rerank_k)
+            reranking.set(outcome=outcome)
+        return documents
+
+    async def execute(self, question: str, role: str, source_documents: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         Xử lý truy vấn kiến thức: tìm context, gọi LLM sinh câu trả lời, trả về answer, source, thought process.
+        Nếu source_documents đã được truy xuất trước (speculative), bỏ qua bước tìm kiếm.
         """
         thought_process = []
-        source_documents = []
         answer = ""
+        error = None
         try:
             # 1. Vector search lấy context
-            context = self.vector_search_tool.vector_search(question, role)
-            thought_process.append(f"Vector search context:\n{context}")
-            source_documents.append({"page_content": context, "metadata": {"source": "vector_search"}})
+            source_documents, prompt = await self._prepare(question, role, source_documents, thought_process)
 
             # 2. Gọi LLM sinh câu trả lời
-            prompt = self._build_prompt(question, context)
-            llm_response = await self._call_llm(prompt)
+            llm_response = await self._call_llm(prompt, question, source_documents)
             answer = llm_response
             thought_process.append(f"LLM answer: {answer}")
         except Exception as e:
             answer = f"Xin lỗi, có lỗi xảy ra khi xử lý truy vấn: {e}"
             thought_process.append(str(e))
-        return {
-            "answer": answer,
-            "source_documents": source_documents,
-            "thought_process": thought_process
-        }
+            error = str(e)
+        return self._result(answer, source_documents, thought_process, error)
+
+    async def execute_batch(self, queries: List[Tuple[str, str]],
+                            source_documents: Optional[List[Optional[List[Dict[str, Any]]]]] = None) -> List[Dict[str, Any]]:
+        """
+        Xử lý nhiều truy vấn (question, role) cùng lúc: truy xuất context song song cho tất cả
+        câu hỏi, rồi sinh toàn bộ câu trả lời trong một lần gọi LLM theo lô (generate_batch).
+        source_documents (nếu có) là context đã truy xuất sẵn cho từng truy vấn; None thì tự truy xuất.
+        Kết quả theo đúng thứ tự đầu vào, mỗi phần tử giống kết quả của execute().
+        """
+        thought_processes: List[List[str]] = [[] for _ in queries]
+        documents = source_documents or [None] * len(queries)
+        prepared = await asyncio.gather(
+            *(self._prepare(question, role, retrieved, thought_process)
+              for (question, role), retrieved, thought_process in zip(queries, documents, thought_processes)),
+            return_exceptions=True,
+        )
+        errors: Dict[int, Exception] = {index: item for index, item in enumerate(prepared) if isinstance(item, Exception)}
+        ready = [index for index in range(len(queries)) if index not in errors]
+
+        answers: Dict[int, str] = {}
+        if ready:
+            try:
+                with span("llm", agent="KnowledgeAgent", batch_size=len(ready)):
+                    prompts = [prepared[index][1] for index in ready]
+                    if self.cascade:
+                        generated = await self.cascade.generate_answers(
+                            [(prompt, queries[index][0], prepared[index][0]) for prompt, index in zip(prompts, ready)],
+                            temperature=0.7, top_p=0.9, max_tokens=1024,
+                        )
+                        outputs = [answer for answer, _ in generated]
+                    else:
+                        outputs = await self.llm.generate_batch(prompts, temperature=0.7, top_p=0.9, max_tokens=1024)
+                answers.update(zip(ready, outputs))
+            except Exception as e:
+                errors.update((index, e) for index in ready)
+
+        results = []
+        for index, thought_process in enumerate(thought_processes):
+            if index in errors:
+                answer = f"Xin lỗi, có lỗi xảy ra khi xử lý truy vấn: {errors[index]}"
+                thought_process.append(str(errors[index]))
+            else:
+                answer = answers[index]
+                thought_process.append(f"LLM answer: {answer}")
+            source_documents = prepared[index][0] if not isinstance(prepared[index], Exception) else []
+            error = str(errors[index]) if index in errors else None
+            results.append(self._result(answer, source_documents, thought_process, error))
+        return results
+
+    async def stream(self, question: str, role: str, source_documents: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Giống execute() nhưng trả về từng đoạn câu trả lời ngay khi LLM sinh ra:
+        các sự kiện {"event": "token", "data": {"text": ...}}, cuối cùng là một sự kiện
+        {"event": "result", "data": ...} với cùng nội dung mà execute() trả về.
+        """
+        thought_process = []
+        chunks = []
+        error = None
+        try:
+            source_documents, prompt = await self._prepare(question, role, source_documents, thought_process)
+            llm = self.cascade.stream_model(question, source_documents) if self.cascade else self.llm
+            with span("llm", agent="KnowledgeAgent"):
+                async for chunk in llm.stream(prompt, temperature=0.7, top_p=0.9, max_tokens=1024):
+                    chunks.append(chunk)
+                    yield {"event": "token", "data": {"text": chunk}}
+            answer = "".join(chunks).strip()
+            thought_process.append(f"LLM answer: {answer}")
+        except Exception as e:
+            # Các token đã gửi đi không thể thu hồi; sự kiện result mang thông báo lỗi.
+            answer = f"Xin lỗi, có lỗi xảy ra khi xử lý truy vấn: {e}"
+            thought_process.append(str(e))
+            error = str(e)
+        yield {"event": "result", "data": self._result(answer, source_documents, thought_process, error)}
+
+    @staticmethod
+    def _result(answer: str, source_documents: Optional[List[Dict[str, Any]]], thought_process: List[str],
+                error: Optional[str] = None) -> Dict[str, Any]:
+        # Kết quả lỗi mang thêm trường "error", để không bị lưu vào response cache như một câu trả lời
+        result = {"answer": answer, "source_documents": source_documents or [], "thought_process": thought_process}
+        if error is not None:
+            result["error"] = error
+        return result
+
+    async def _prepare(self, question: str, role: str, source_documents: Optional[List[Dict[str, Any]]],
+                       thought_process: List[str]) -> Tuple[List[Dict[str, Any]], str]:
+        """Tìm context (nếu chưa có) và dựng prompt cho LLM."""
+        if source_documents is None:
+            source_documents = await self.retrieve(question, role)
+        context = "\n\n".join(doc["page_content"] for doc in source_documents)
+        thought_process.append(f"Vector search context:\n{context}")
+        return source_documents, self._build_prompt(question, context)
 
     def _build_prompt(self, question: str, context: str) -> str:
         return f"""Bạn là trợ lý AI ERP chuyên nghiệp. Dưới đây là ngữ cảnh truy xuất được từ hệ thống:
@@ -60,25 +284,13 @@ Câu hỏi của người dùng: {question}
 
 Hãy trả lời ngắn gọn, chính xác, có trích dẫn nguồn nếu có thể."""
 
-    async def _call_llm(self, prompt: str) -> str:
-        # Hỗ trợ cả vLLM (async) và HuggingFace pipeline (sync)
-        if hasattr(self.llm, 'acomplete'):  # vLLM async
-            sampling_params = self._get_sampling_params()
-            result = await self.llm.acomplete(prompt, sampling_params)
-            return result.outputs[0].text.strip()
-        elif callable(self.llm):  # HuggingFace pipeline
-            # pipeline có thể không async, nên dùng run_in_executor
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, lambda: self.llm(prompt, max_new_tokens=256)[0]["generated_text"])
-            return result.strip()
-        else:
-            raise RuntimeError("LLM không hỗ trợ kiểu gọi async hoặc pipeline.")
-
-    def _get_sampling_params(self):
-        """Helper to create sampling parameters for vLLM."""
-        from vllm import SamplingParams
-        return SamplingParams(
-            temperature=0.7, # Default temperature
-            top_p=0.9,       # Default top_p
-            max_tokens=1024  # A reasonable limit for an answer
-        )
\ No newline at end of file
+    async def _call_llm(self, prompt: str, question: str, source_documents: List[Dict[str, Any]]) -> str:
+        # LLMProvider là giao diện async chung cho cả vLLM và HuggingFace pipeline
+        with span("llm", agent="KnowledgeAgent") as generation:
+            if self.cascade is None:
+                return await self.llm.generate(prompt, temperature=0.7, top_p=0.9, max_tokens=1024)
+            answer, tier = await self.cascade.generate_answer(
+                prompt, question, source_documents, temperature=0.7, top_p=0.9, max_tokens=1024
+            )
+            generation.set(tier=tier)
+            return answer
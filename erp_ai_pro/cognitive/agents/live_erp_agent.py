@@ -5,12 +5,17 @@ Handles real-time interactions with the ERP system by executing specific tools.
 """
 
 import logging
-from typing import Dict, Any, List, Callable
+from typing import Dict, Any, List, Callable, Optional
+
+from pydantic import BaseModel, ValidationError
 
 import structlog
 
 # Import all available tools from the tools layer
 from erp_ai_pro.tools import tools
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.rendering import ResponseRenderer
+from erp_ai_pro.cognitive.tracing import span
 
 logger = structlog.get_logger()
 
@@ -18,9 +23,11 @@ class LiveERPAgent:
     """
     The specialized agent for executing live calls to the ERP system.
     It acts as a dispatcher, calling the appropriate tool based on the orchestrator's request.
+    Tool outputs are structured; the renderer turns them into the answer text.
     """
 
-    def __init__(self):
+    def __init__(self, renderer: Optional[ResponseRenderer] = None):
+        self.renderer = renderer or ResponseRenderer(SystemConfig())
         # Instantiate all available tools
         self.available_tools = {
             # Base Tools
@@ -44,15 +51,18 @@ class LiveERPAgent:
         tool = self.available_tools.get(tool_name)
         return tool.run if tool else None
 
-    async def execute(self, tool_name: str, tool_input: Dict[str, Any], allowed_tools: List[str]) -> Dict[str, Any]:
+    async def execute(self, tool_name: str, tool_input: Dict[str, Any], allowed_tools: List[str], question: str = "") -> Dict[str, Any]:
         """
         The main execution method for this agent.
         It finds and executes the requested tool with the given input, respecting RBAC.
+        The tool name and input normally come straight from the orchestrator's routing plan,
+        so no further LLM call is needed; the input is validated against the tool's input_schema.
 
         Args:
             tool_name: The name of the tool to execute.
             tool_input: The arguments for the tool.
             allowed_tools: The list of tools the user is allowed to run.
+            question: The user's question; the answer is rendered in its language.
         """
         logger.info(f"LiveERPAgent attempting to execute tool: '{tool_name}' with input: {tool_input}")
 
@@ -69,16 +79,32 @@ class LiveERPAgent:
             logger.error(error_msg)
             return {"error": error_msg}
 
-        # 3. Execute Tool
+        # 3. Validate Input
+        try:
+            tool_input = self.available_tools[tool_name].input_schema(**tool_input).model_dump()
+        except ValidationError as e:
+            error_msg = f"Invalid input for tool '{tool_name}': {e}"
+            logger.warning(error_msg)
+            return {"error": error_msg}
+
+        # 4. Execute Tool
         try:
             # Note: LangChain tools often use .run() or .invoke(). We standardize on .run()
-            result = tool_function(**tool_input)
-            
-            return {
-                "status": "success",
-                "tool_name": tool_name,
-                "result": result
-            }
+            with span("tool", agent="LiveERPAgent", tool=tool_name):
+                result = tool_function(**tool_input)
+        except tools.ToolError as e:
+            logger.warning(f"LiveERPAgent tool '{tool_name}' failed: {e}")
+            return {"error": str(e)}
         except Exception as e:
             logger.error(f"LiveERPAgent tool '{tool_name}' execution failed: {e}", exc_info=True)
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+
+        # 5. Render the answer (templates, no LLM call for a single tool)
+        answer, rendered_by = await self.renderer.render(question, [(tool_name, result)])
+        return {
+            "status": "success",
+            "tool_name": tool_name,
+            "result": result.model_dump() if isinstance(result, BaseModel) else result,
+            "answer": answer,
+            "rendered_by": rendered_by,
+        }
\ No newline at end of file
@@ -5,14 +5,16 @@ Handles all image-based processing and analysis.
 """
 
 import logging
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any
 import numpy as np
-from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration, CLIPProcessor, CLIPModel
-import easyocr
 import structlog
 
-from erp_ai_pro.core.config import SystemConfig
+from erp_ai_pro.config.config import SystemConfig
+
+# PIL, transformers (and torch) and easyocr are imported when the models are loaded,
+# so that importing this module does not pull them into every worker.
+if TYPE_CHECKING:
+    from PIL import Image
 
 logger = structlog.get_logger()
 
@@ -27,6 +29,9 @@ class MultimodalProcessor:
     def setup_models(self):
         """Initialize multimodal models."""
         try:
+            from transformers import BlipProcessor, BlipForConditionalGeneration, CLIPProcessor, CLIPModel
+            import easyocr
+
             # BLIP for image captioning
             self.blip_processor = BlipProcessor.from_pretrained(self.config.vision_model_name)
             self.blip_model = BlipForConditionalGeneration.from_pretrained(self.config.vision_model_name)
@@ -45,6 +50,7 @@ class MultimodalProcessor:
 
     async def process_image(self, image_path: str) -> Dict[str, Any]:
         """Process image and extract information."""
+        from PIL import Image
         try:
             # Load image
             image = Image.open(image_path).convert('RGB')
@@ -72,7 +78,7 @@ class MultimodalProcessor:
             logger.error(f"Error processing image: {e}")
             return {"error": str(e)}
 
-    def _is_chart(self, image: Image.Image) -> bool:
+    def _is_chart(self, image: "Image.Image") -> bool:
         """Detect if image is a chart/graph."""
         # Simple heuristic - can be improved with specialized models
         np_image = np.array(image)
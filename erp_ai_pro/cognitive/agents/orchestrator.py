@@ -4,22 +4,45 @@ Orchestrator Agent for ERP AI Pro
 The central brain that routes requests to specialized agents.
 """
 
+import asyncio
+import inspect
+import json
 import logging
-from typing import Dict, Any
+import math
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
 
+import numpy as np
 import structlog
+from prometheus_client import Gauge, Histogram
+from pydantic import ValidationError
 
 # This import will be updated later when config is centralized.
 from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.cache import RedisCache, TieredCache, TTLCache, extract_entities, normalize_question
+from erp_ai_pro.cognitive.embeddings import Encoder, load_sentence_encoder, normalize_rows
+from erp_ai_pro.cognitive.llm_providers import LLMProvider
+from erp_ai_pro.cognitive.cascade import LARGE, SMALL, record_escalation, record_tier
+from erp_ai_pro.cognitive.tracing import span
 
 logger = structlog.get_logger()
 
-# The prompt is the core of the Orchestrator's logic.
-ORCHESTRATOR_SYSTEM_PROMPT = """You are a highly intelligent Orchestrator AI for a complex ERP system. 
-Your primary role is to analyze a user's query and route it to the most appropriate specialized agent. 
-You must respond with ONLY the name of the chosen agent.
+# Metrics
+routing_batch_size = Histogram(
+    'erp_ai_routing_batch_size', 'Number of routing prompts per batched LLM call',
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+routing_batch_wait = Histogram(
+    'erp_ai_routing_batch_wait_seconds', 'Time the oldest prompt of a batch waited before dispatch',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+routing_batch_max_size = Gauge('erp_ai_routing_batch_max_size', 'Configured maximum routing batch size')
+routing_batch_max_wait = Gauge('erp_ai_routing_batch_max_wait_seconds', 'Configured routing batch wait window')
 
-Here are the available agents and their specializations:
+# The agent catalogue shared by the classification and planning prompts.
+AGENT_CATALOGUE = """Here are the available agents and their specializations:
 
 1.  **LiveERPAgent**:
     - Use for any action that creates, reads, updates, or deletes (CRUD) data in the live ERP system.
@@ -46,7 +69,14 @@ Here are the available agents and their specializations:
     - Use if no other agent is suitable or if the query is ambiguous or conversational.
     - **Example queries**: "Hi", "Can you help me?", "Not sure what I need."
 
----
+"""
+
+# The prompt is the core of the Orchestrator's logic.
+ORCHESTRATOR_SYSTEM_PROMPT = """You are a highly intelligent Orchestrator AI for a complex ERP system. 
+Your primary role is to analyze a user's query and route it to the most appropriate specialized agent. 
+You must respond with ONLY the name of the chosen agent.
+
+""" + AGENT_CATALOGUE + """---
 
 User Query: "{question}"
 
@@ -54,56 +84,753 @@ Based on the query, which agent should be invoked? Respond with only the agent's
 Chosen Agent:
 """
 
+# Routing and tool selection in a single generation. The output is constrained to the
+# JSON schema built by build_plan_schema() when the backend supports guided decoding.
+ORCHESTRATOR_PLAN_PROMPT = """You are a highly intelligent Orchestrator AI for a complex ERP system. 
+Your primary role is to analyze a user's query, route it to the most appropriate specialized agent and, for the LiveERPAgent, choose the ERP tool to run and its arguments. 
+You must respond with ONLY a JSON object.
+
+""" + AGENT_CATALOGUE + """The LiveERPAgent can run exactly one of these ERP tools:
+
+{tools}
+
+---
+
+User Query: "{question}"
+
+Respond with a JSON object of the form {{"agent": "<agent class name>", "tool": "<tool name or null>", "arguments": {{...}}}}.
+Use "tool": null and "arguments": {{}} for every agent except the LiveERPAgent, and for the LiveERPAgent when none of its tools fits the query.
+JSON:
+"""
+
+# Tool selection alone, for questions already routed to the LiveERPAgent. It leaves out
+# the agent catalogue, so it is much shorter to prefill than the full plan prompt.
+TOOL_PLAN_PROMPT = """You are the tool planner of an ERP assistant. Choose the ERP tool that answers the user's query and its arguments.
+You must respond with ONLY a JSON object.
+
+The available ERP tools are:
+
+{tools}
+
+---
+
+User Query: "{question}"
+
+Respond with a JSON object of the form {{"agent": "LiveERPAgent", "tool": "<tool name or null>", "arguments": {{...}}}}.
+Use "tool": null and "arguments": {{}} when none of the tools fits the query.
+JSON:
+"""
+
+
+# Agents the orchestrator may choose for a text-only query.
+ROUTABLE_AGENTS = ["LiveERPAgent", "BusinessIntelligenceAgent", "KnowledgeAgent", "FallbackAgent"]
+
+# Labeled utterances for the semantic fast path. They mirror the examples in the
+# system prompt and the most frequent production queries (English and Vietnamese).
+ROUTING_EXAMPLES: Dict[str, List[str]] = {
+    "LiveERPAgent": [
+        "What are my tasks?",
+        "Show my open tasks",
+        "List all tasks for project PROJ-WEB",
+        "Create a new task for @nhanvien_A to design the homepage",
+        "Update task T-1 to 'Hoàn thành'",
+        "What is the current stock for product PROD001?",
+        "Stock level of PROD001",
+        "What is the balance for customer CUST002?",
+        "Công việc của tôi là gì?",
+        "Liệt kê các công việc của dự án PROJ-WEB",
+        "Tạo công việc mới cho @nhanvien_A",
+        "Cập nhật trạng thái công việc T-1 thành Hoàn thành",
+        "Tồn kho sản phẩm PROD001?",
+        "Số dư công nợ của khách hàng CUST002",
+    ],
+    "BusinessIntelligenceAgent": [
+        "Forecast our revenue for the next quarter.",
+        "Which products are most often sold together?",
+        "Analyze customer churn for the last year.",
+        "What was our best-selling product category in Q2?",
+        "Why did sales drop last month?",
+        "What if we raise prices by 10%?",
+        "Dự báo doanh thu quý tới",
+        "Phân tích tỷ lệ khách hàng rời bỏ năm ngoái",
+        "Sản phẩm nào bán chạy nhất trong quý 2?",
+        "Vì sao doanh số tháng trước giảm?",
+    ],
+    "KnowledgeAgent": [
+        "What is our company's return policy?",
+        "Explain the process for new employee onboarding.",
+        "How do I request a new laptop?",
+        "How do I check the current inventory in the ERP?",
+        "What is the warehouse receiving procedure?",
+        "Chính sách hoàn trả hàng là gì?",
+        "Quy trình nhập kho hàng hóa như thế nào?",
+        "Làm thế nào để kiểm tra tồn kho hiện tại?",
+        "Quy trình tiếp nhận nhân viên mới",
+    ],
+    "FallbackAgent": [
+        "Hi",
+        "Hello there",
+        "Can you help me?",
+        "Not sure what I need.",
+        "Xin chào",
+        "Bạn có thể giúp tôi không?",
+    ],
+}
+
+
+@dataclass
+class RoutingDecision:
+    """The outcome of routing a single request."""
+    agent: str
+    method: str  # "image", "cache", "semantic", "llm" or "fallback"
+    confidence: Optional[float] = None
+    scores: Dict[str, float] = field(default_factory=dict)
+    # Set for LiveERPAgent decisions: the tool to run and its validated input.
+    tool_name: Optional[str] = None
+    tool_input: Dict[str, Any] = field(default_factory=dict)
+    # Cascade tier of the model that made an LLM decision: "small" or "large".
+    tier: Optional[str] = None
+
+
+class SemanticRouter:
+    """
+    Embedding-based router that compares a question against labeled example utterances.
+    It only returns a decision when the best agent clearly beats the runner-up; ambiguous
+    questions are left to the LLM.
+    """
+
+    def __init__(
+        self,
+        examples: Dict[str, List[str]],
+        model_name: Optional[str] = None,
+        min_score: float = 0.55,
+        min_margin: float = 0.08,
+        encoder: Optional[Encoder] = None,
+    ):
+        if encoder is None and model_name is None:
+            raise ValueError("SemanticRouter needs either an encoder or a model_name.")
+        self.examples = examples
+        self.model_name = model_name
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self._encoder = encoder
+        self._labels: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _ensure_index(self):
+        """Embeds the example utterances on first use."""
+        if self._matrix is not None:
+            return
+        with self._lock:
+            if self._matrix is not None:
+                return
+            if self._encoder is None:
+                self._encoder = load_sentence_encoder(self.model_name)
+            labels, texts = [], []
+            for agent_name, utterances in self.examples.items():
+                labels.extend([agent_name] * len(utterances))
+                texts.extend(utterances)
+            self._labels = labels
+            self._matrix = normalize_rows(self._encoder(texts))
+            logger.info(f"SemanticRouter indexed {len(texts)} example utterances.")
+
+    def score(self, question: str) -> Dict[str, float]:
+        """Returns the best cosine similarity per agent for the question."""
+        self._ensure_index()
+        query = normalize_rows(self._encoder([question]))[0]
+        similarities = self._matrix @ query
+        scores: Dict[str, float] = {}
+        for label, similarity in zip(self._labels, similarities):
+            if similarity > scores.get(label, -1.0):
+                scores[label] = float(similarity)
+        return scores
+
+    def route(self, question: str) -> Optional[RoutingDecision]:
+        """Returns a decision when the match is confident enough, otherwise None."""
+        scores = self.score(question)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_agent, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if best_score >= self.min_score and best_score - runner_up >= self.min_margin:
+            return RoutingDecision(agent=best_agent, method="semantic", confidence=best_score, scores=scores)
+        return None
+
+
+class RoutingBatcher:
+    """
+    Coalesces routing prompts that arrive within a short window into one batched LLM call.
+    Batches are processed one at a time; requests arriving meanwhile form the next batch.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], Awaitable[List[Any]]], max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        routing_batch_max_size.set(self.max_batch_size)
+        routing_batch_max_wait.set(self.max_wait)
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """Queues one item and waits for its result from the next batch."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((item, future, self._loop.time()))
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        """Waits for the first item, then gathers more until the window closes or the batch is full."""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Drop requests whose callers gave up while waiting.
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+            routing_batch_size.observe(len(batch))
+            routing_batch_wait.observe(self._loop.time() - min(entry[2] for entry in batch))
+            items = [entry[0] for entry in batch]
+            try:
+                results = await self.process_batch(items)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
 
 class OrchestratorAgent:
     """
     The central agent that decides which specialized agent should handle a request.
+    For the LiveERPAgent it also plans the tool call, so the agent can execute it directly.
+
+    With an escalation_llm (model cascade), self.llm is the small model: its decisions are
+    re-made by the escalation model when they are invalid, below
+    cascade_routing_min_confidence, or lack a tool plan the role could have run.
     """
 
-    def __init__(self, llm, config: SystemConfig):
+    def __init__(
+        self,
+        llm: Optional[LLMProvider],
+        config: SystemConfig,
+        semantic_router: Optional[SemanticRouter] = None,
+        routing_cache: Optional[TieredCache] = None,
+        tools: Optional[Dict[str, Any]] = None,
+        escalation_llm: Optional[LLMProvider] = None,
+    ):
         self.llm = llm
+        self.escalation_llm = escalation_llm
         self.config = config
+        # Tool instances by name; each exposes a pydantic input_schema and a docstring.
+        self.tools = tools or {}
+        self.semantic_router = semantic_router
+        if self.semantic_router is None and config.semantic_routing_enabled:
+            self.semantic_router = SemanticRouter(
+                ROUTING_EXAMPLES,
+                model_name=config.embedding_model_name,
+                min_score=config.semantic_routing_min_score,
+                min_margin=config.semantic_routing_min_margin,
+            )
+        self.routing_cache = routing_cache
+        if self.routing_cache is None and config.routing_cache_enabled:
+            shared = None
+            if config.routing_cache_shared:
+                shared = RedisCache(config.redis_url, prefix="erp_ai:route", ttl=config.cache_ttl)
+            self.routing_cache = TieredCache("routing", TTLCache(config.routing_cache_size, config.cache_ttl), shared)
+        if config.routing_mode not in ("plan", "generate", "logprob"):
+            raise ValueError(f"Unknown routing_mode: '{config.routing_mode}'")
+        self.batcher = RoutingBatcher(
+            self._process_batch,
+            max_batch_size=config.routing_batch_max_size,
+            max_wait_ms=config.routing_batch_max_wait_ms,
+        )
+        self.escalation_batcher = None
+        if escalation_llm is not None:
+            self.escalation_batcher = RoutingBatcher(
+                lambda items: self._process_batch(items, escalation_llm),
+                max_batch_size=config.routing_batch_max_size,
+                max_wait_ms=config.routing_batch_max_wait_ms,
+            )
         logger.info("OrchestratorAgent initialized.")
 
-    async def route_request(self, question: str, has_image: bool = False) -> str:
+    async def route_request(
+        self,
+        question: str,
+        has_image: bool = False,
+        allowed_tools: Optional[List[str]] = None,
+        role: str = "default",
+    ) -> str:
         """
         Determines the best agent to handle the user's request.
         """
+        decision = await self.route(question, has_image=has_image, allowed_tools=allowed_tools, role=role)
+        return decision.agent
+
+    async def route(
+        self,
+        question: str,
+        has_image: bool = False,
+        allowed_tools: Optional[List[str]] = None,
+        role: str = "default",
+    ) -> RoutingDecision:
+        """
+        Routes the request and returns the full decision.
+        Images go straight to the MultimodalAgent, repeated questions are served from the
+        routing cache, confident semantic matches are answered without the LLM, and
+        everything else is decided by the LLM. LiveERPAgent decisions carry the tool name
+        and validated tool input.
+
+        Args:
+            question: The user's question.
+            has_image: Whether the request carries an image.
+            allowed_tools: The tools the caller's role may use.
+            role: The caller's role; part of the routing cache key.
+        """
         logger.info(f"Orchestrator routing question: '{question}'")
 
         if has_image:
             logger.info("Image detected, routing to MultimodalAgent.")
-            return "MultimodalAgent"
+            return RoutingDecision(agent="MultimodalAgent", method="image", confidence=1.0)
+
+        tools = self._plannable_tools(allowed_tools)
+        entities = extract_entities(question)
+        # Diacritics stay in the key: "bán hàng" and "bàn hàng" must not share a plan.
+        cache_key = f"{role}:{normalize_question(question, fold_accents=False)}"
+        if self.routing_cache:
+            with span("routing_cache", agent="OrchestratorAgent") as lookup:
+                cached = await self.routing_cache.get(cache_key)
+                decision = decision_from_cache_entry(cached, entities) if cached else None
+                lookup.set(hit=decision is not None)
+            if decision:
+                logger.info(f"Routing cache hit: {decision.agent}")
+                if decision.agent == "LiveERPAgent" and not decision.tool_name and tools:
+                    # Only the agent was cached: the arguments depend on more than the entities.
+                    plan = await self._cascade(
+                        lambda batcher: self._plan_with_llm(question, tools, agents=["LiveERPAgent"], batcher=batcher), tools
+                    )
+                    decision.tool_name, decision.tool_input, decision.tier = plan.tool_name, plan.tool_input, plan.tier
+                return decision
+
+        decision = await self._route_uncached(question, tools)
+        cacheable = decision.method != "fallback" and (decision.agent != "LiveERPAgent" or decision.tool_name)
+        if self.routing_cache and cacheable:
+            await self.routing_cache.set(cache_key, cache_entry_from_decision(decision, entities))
+        return decision
+
+    def _plannable_tools(self, allowed_tools: Optional[List[str]]) -> Dict[str, Any]:
+        """The tools the LiveERPAgent may run for this caller."""
+        if allowed_tools is None:
+            return dict(self.tools)
+        return {name: tool for name, tool in self.tools.items() if name in allowed_tools}
+
+    async def _route_uncached(self, question: str, tools: Dict[str, Any]) -> RoutingDecision:
+        """
+        Tries the semantic fast path first and the LLM for everything it leaves open.
+        A LiveERPAgent decision without a tool is completed by a tool-only plan.
+        """
+        decision = None
+        if self.semantic_router:
+            try:
+                loop = asyncio.get_running_loop()
+                with span("semantic_route", agent="OrchestratorAgent"):
+                    decision = await loop.run_in_executor(None, self.semantic_router.route, question)
+            except Exception as e:
+                logger.warning(f"Semantic routing unavailable, using the LLM only: {e}")
+                self.semantic_router = None
+            if decision:
+                logger.info(f"Semantic router chose agent: {decision.agent} (score={decision.confidence:.3f})")
+
+        if decision is None:
+            return await self._cascade(lambda batcher: self._route_with_model(question, tools, batcher), tools)
+
+        if decision.agent == "LiveERPAgent":
+            plan = await self._cascade(
+                lambda batcher: self._plan_with_llm(question, tools, agents=["LiveERPAgent"], batcher=batcher), tools
+            )
+            decision.tool_name, decision.tool_input, decision.tier = plan.tool_name, plan.tool_input, plan.tier
+        return decision
+
+    async def _route_with_model(self, question: str, tools: Dict[str, Any], batcher: "RoutingBatcher") -> RoutingDecision:
+        """Routes with one model: a full plan, or an agent name completed by a tool-only plan."""
+        if self.config.routing_mode == "plan":
+            return await self._plan_with_llm(question, tools, batcher=batcher)
+        decision = await self._route_with_llm(question, batcher)
+        if decision.agent == "LiveERPAgent":
+            plan = await self._plan_with_llm(question, tools, agents=["LiveERPAgent"], batcher=batcher)
+            decision.tool_name, decision.tool_input = plan.tool_name, plan.tool_input
+        return decision
 
+    async def _cascade(self, decide: Callable[["RoutingBatcher"], Awaitable[RoutingDecision]], tools: Dict[str, Any]) -> RoutingDecision:
+        """Runs an LLM routing step on the primary model and escalates weak decisions."""
+        decision = await decide(self.batcher)
+        decision.tier = LARGE
+        if self.escalation_batcher is not None:
+            decision.tier = SMALL
+            reason = self._escalation_reason(decision, tools)
+            if reason:
+                record_escalation("routing", reason)
+                decision = await decide(self.escalation_batcher)
+                decision.tier = LARGE
+        record_tier("routing", decision.tier)
+        return decision
+
+    def _escalation_reason(self, decision: RoutingDecision, tools: Dict[str, Any]) -> Optional[str]:
+        if decision.method == "fallback":
+            return "invalid_output"
+        if decision.confidence is not None and decision.confidence < self.config.cascade_routing_min_confidence:
+            return "low_confidence"
+        if decision.agent == "LiveERPAgent" and not decision.tool_name and tools:
+            return "no_tool_plan"
+        return None
+
+    async def _route_with_llm(self, question: str, batcher: Optional["RoutingBatcher"] = None) -> RoutingDecision:
+        """Asks the LLM to pick an agent."""
         if not self.llm:
             logger.error("Orchestrator's LLM is not configured.")
-            return "FallbackAgent"
+            return RoutingDecision(agent="FallbackAgent", method="fallback")
 
         prompt = ORCHESTRATOR_SYSTEM_PROMPT.format(question=question)
-        chosen_agent = ""
 
         try:
-            # Check the type of the LLM object without a hard import of vllm
-            llm_type_name = type(self.llm).__name__
-
-            if llm_type_name == 'LLM':
-                from vllm import SamplingParams
-                sampling_params = SamplingParams(temperature=0.0, max_tokens=20)
-                outputs = self.llm.generate([prompt], sampling_params=sampling_params)
-                chosen_agent = outputs[0].outputs[0].text.strip()
-            else: # Assuming Hugging Face pipeline
-                outputs = self.llm(prompt, max_new_tokens=20)
-                chosen_agent = outputs[0]['generated_text'].replace(prompt, "").strip()
-        
+            with span("llm_route", agent="OrchestratorAgent"):
+                output = await (batcher or self.batcher).submit(("classify", prompt, None))
         except Exception as e:
             logger.error(f"Error during LLM call in Orchestrator: {e}")
-            return "FallbackAgent"
+            return RoutingDecision(agent="FallbackAgent", method="fallback")
+
+        if self.config.routing_mode == "logprob":
+            chosen_agent = max(output, key=output.get)
+            logger.info(f"LLM scored agents: {output}")
+            return RoutingDecision(agent=chosen_agent, method="llm", confidence=output[chosen_agent], scores=output)
+
+        logger.info(f"LLM chose agent: {output}")
+        chosen_agent = parse_agent_name(output)
+        if chosen_agent:
+            return RoutingDecision(agent=chosen_agent, method="llm")
+        else:
+            logger.warning(f"LLM returned an invalid agent name: '{output}'. Using FallbackAgent.")
+            return RoutingDecision(agent="FallbackAgent", method="fallback")
+
+    async def _plan_with_llm(self, question: str, tools: Dict[str, Any], agents: Optional[List[str]] = None,
+                             batcher: Optional["RoutingBatcher"] = None) -> RoutingDecision:
+        """
+        Asks the LLM for a structured plan (agent, tool, arguments) in a single generation.
+        With vLLM the output is constrained to the plan JSON schema; other backends are
+        parsed leniently. Tool arguments are validated against the tool's input_schema.
+        A plan for the LiveERPAgent alone only asks for the tool, with the short tool prompt.
+        """
+        agents = list(agents or ROUTABLE_AGENTS)
+        if not tools and "LiveERPAgent" in agents:
+            if agents == ["LiveERPAgent"]:
+                logger.warning("No ERP tool is available to this role.")
+                return RoutingDecision(agent="LiveERPAgent", method="llm")
+            agents.remove("LiveERPAgent")
+
+        if not self.llm:
+            logger.error("Orchestrator's LLM is not configured.")
+            return RoutingDecision(agent="FallbackAgent", method="fallback")
+
+        template = TOOL_PLAN_PROMPT if agents == ["LiveERPAgent"] else ORCHESTRATOR_PLAN_PROMPT
+        prompt = template.format(tools=describe_tools(tools), question=question)
+        schema = build_plan_schema(agents, tools)
+
+        try:
+            with span("llm_plan", agent="OrchestratorAgent"):
+                output = await (batcher or self.batcher).submit(("plan", prompt, schema))
+        except Exception as e:
+            logger.error(f"Error during LLM call in Orchestrator: {e}")
+            return RoutingDecision(agent="FallbackAgent", method="fallback")
+
+        logger.info(f"LLM plan: {output}")
+        decision = parse_plan(output, tools)
+        if decision is None:
+            chosen_agent = parse_agent_name(output)
+            if chosen_agent in agents:
+                decision = RoutingDecision(agent=chosen_agent, method="llm")
+            elif len(agents) == 1:
+                decision = RoutingDecision(agent=agents[0], method="llm")
+            else:
+                logger.warning(f"LLM returned an invalid plan: '{output}'. Using FallbackAgent.")
+                decision = RoutingDecision(agent="FallbackAgent", method="fallback")
+        return decision
 
-        logger.info(f"LLM chose agent: {chosen_agent}")
-        
-        valid_agents = ["KnowledgeAgent", "BusinessIntelligenceAgent", "LiveERPAgent", "FallbackAgent"]
-        if chosen_agent in valid_agents:
-            return chosen_agent
+    async def _process_batch(self, items: List[Tuple[str, str, Optional[Dict[str, Any]]]], llm: Optional[LLMProvider] = None) -> List[Any]:
+        """
+        Runs a batch of (kind, prompt, schema) routing items on llm (default: self.llm).
+        Classification prompts go through one batched call; plan prompts through one call
+        per distinct schema.
+        """
+        llm = llm or self.llm
+        results: List[Any] = [None] * len(items)
+        classify = [index for index, item in enumerate(items) if item[0] == "classify"]
+        plans: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            if item[0] == "plan":
+                plans.setdefault(json.dumps(item[2], sort_keys=True), []).append(index)
+
+        async def run_classify():
+            prompts = [items[index][1] for index in classify]
+            if self.config.routing_mode == "logprob":
+                outputs = await self._score_batch(prompts, llm)
+            else:
+                outputs = await llm.generate_batch(prompts, max_tokens=20, temperature=0.0)
+            for index, output in zip(classify, outputs):
+                results[index] = output
+
+        async def run_plans(indices: List[int]):
+            prompts = [items[index][1] for index in indices]
+            outputs = await llm.generate_batch(prompts, max_tokens=256, temperature=0.0, json_schema=items[indices[0]][2])
+            for index, output in zip(indices, outputs):
+                results[index] = output
+
+        calls = [run_plans(indices) for indices in plans.values()]
+        if classify:
+            calls.append(run_classify())
+        await asyncio.gather(*calls)
+        return results
+
+    async def _score_batch(self, prompts: List[str], llm: LLMProvider) -> List[Dict[str, float]]:
+        """
+        Scores every routable agent name as a continuation of each prompt and returns the
+        per-agent probability distribution. All (prompt, agent) pairs are scored in one
+        batched prefill; nothing is decoded.
+        """
+        candidates = [(prompt, agent_name) for prompt in prompts for agent_name in ROUTABLE_AGENTS]
+        logprobs = await llm.score_continuations(candidates)
+
+        distributions = []
+        for offset in range(0, len(candidates), len(ROUTABLE_AGENTS)):
+            scores = dict(zip(ROUTABLE_AGENTS, logprobs[offset:offset + len(ROUTABLE_AGENTS)]))
+            distributions.append(softmax(scores))
+        return distributions
+
+
+# Clause boundaries between the intents of a compound question (English and Vietnamese).
+_CONJUNCTIONS = r"(?:and also|and then|as well as|and|also|plus|và cả|và|cùng với|cũng như|đồng thời|rồi)"
+_INTENT_SEPARATOR = re.compile(
+    rf"(\s*(?:[;?\n]+\s*(?:{_CONJUNCTIONS}\s+)?|,?\s+{_CONJUNCTIONS}\s+)\s*)", re.IGNORECASE
+)
+# Question words and request verbs: a clause carrying one of these asks something itself.
+_REQUEST_MARKER = re.compile(
+    r"\b(?:what|which|who|whom|whose|when|where|why|how|show|list|give|get|find|tell|explain|"
+    r"calculate|compute|forecast|compare|summari[sz]e|check|"
+    r"gì|nào|bao nhiêu|ai|đâu|tại sao|vì sao|làm sao|cho tôi|cho biết|hãy|liệt kê|tính|xem|"
+    r"kiểm tra|tìm|dự báo|so sánh|giải thích)\b",
+    re.IGNORECASE,
+)
+# Reporting periods look like entity IDs but are context shared by the whole question.
+_PERIOD = re.compile(r"(?:Q[1-4]|H[12]|FY\d+)", re.IGNORECASE)
+
+
+def _names_own_intent(part: str) -> bool:
+    """True when a clause asks something by itself: it has a request word or an entity ID."""
+    if len(part.split()) < 2:
+        return False
+    entities = [entity for entity in extract_entities(part) if not _PERIOD.fullmatch(entity)]
+    return bool(entities) or _REQUEST_MARKER.search(part) is not None
+
+
+def split_intents(question: str, max_intents: int = 4) -> List[str]:
+    """
+    Splits a compound question into candidate sub-intents at conjunctions and clause
+    punctuation: "Show my open tasks and what is our return policy" -> ["Show my open
+    tasks", "what is our return policy"]. A cut is only made between two clauses that each
+    name their own request or entity; otherwise the conjunction joins words sharing one
+    request ("Show sales and profit for Q3", "Quy trình nhập và xuất kho là gì?") and the
+    clauses stay together. Returns [question] when there is nothing to split or more than
+    max_intents parts. A split is only a candidate: parts that route the same belong together.
+    """
+    pieces = _INTENT_SEPARATOR.split(question)
+    parts: List[str] = []
+    current = pieces[0]
+    for separator, piece in zip(pieces[1::2], pieces[2::2]):
+        if _names_own_intent(current.strip(" ,.")) and _names_own_intent(piece.strip(" ,.")):
+            parts.append(current)
+            current = piece
         else:
-            logger.warning(f"LLM returned an invalid agent name: '{chosen_agent}'. Using FallbackAgent.")
-            return "FallbackAgent"
\ No newline at end of file
+            current += separator + piece
+    parts.append(current)
+    parts = [part.strip(" ,.?;\n") for part in parts]
+    if len(parts) < 2 or len(parts) > max_intents:
+        return [question]
+    return parts
+
+
+def parse_agent_name(text: str) -> Optional[str]:
+    """Extracts the first routable agent name from free-form LLM output."""
+    match = re.search("|".join(ROUTABLE_AGENTS), text)
+    return match.group(0) if match else None
+
+
+def softmax(scores: Dict[str, float]) -> Dict[str, float]:
+    """Turns per-agent log scores into a probability distribution."""
+    peak = max(scores.values())
+    weights = {name: math.exp(score - peak) for name, score in scores.items()}
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def describe_tools(tools: Dict[str, Any]) -> str:
+    """Renders the tool catalogue for the planning prompt."""
+    if not tools:
+        return "(none)"
+    lines = []
+    for name, tool in tools.items():
+        summary = " ".join(inspect.cleandoc(tool.__doc__ or "").split())
+        arguments = {
+            field_name: field_info.description or ""
+            for field_name, field_info in tool.input_schema.model_fields.items()
+        }
+        lines.append(f"- {name}: {summary} Arguments: {json.dumps(arguments, ensure_ascii=False)}")
+    return "\n".join(lines)
+
+
+def build_plan_schema(agents: List[str], tools: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the JSON schema a plan must satisfy: one branch without a tool and one branch
+    per tool whose arguments follow the tool's pydantic input_schema. The branch without
+    a tool includes the LiveERPAgent, so guided decoding is never forced into a tool that
+    does not fit the query.
+    """
+    branches = [{
+        "type": "object",
+        "properties": {
+            "agent": {"enum": list(agents)},
+            "tool": {"type": "null"},
+            "arguments": {"type": "object", "maxProperties": 0},
+        },
+        "required": ["agent", "tool", "arguments"],
+        "additionalProperties": False,
+    }]
+    if "LiveERPAgent" in agents:
+        for name, tool in tools.items():
+            branches.append({
+                "type": "object",
+                "properties": {
+                    "agent": {"const": "LiveERPAgent"},
+                    "tool": {"const": name},
+                    "arguments": tool.input_schema.model_json_schema(),
+                },
+                "required": ["agent", "tool", "arguments"],
+                "additionalProperties": False,
+            })
+    return branches[0] if len(branches) == 1 else {"anyOf": branches}
+
+
+def parse_plan(text: str, tools: Dict[str, Any]) -> Optional[RoutingDecision]:
+    """
+    Parses a JSON plan. Returns None when no valid plan can be read. A LiveERPAgent plan
+    whose tool is unknown or whose arguments fail validation keeps the agent but no tool.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        plan = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(plan, dict) or plan.get("agent") not in ROUTABLE_AGENTS:
+        return None
+    if plan["agent"] != "LiveERPAgent":
+        return RoutingDecision(agent=plan["agent"], method="llm")
+
+    tool_name = plan.get("tool")
+    if tool_name is None:
+        logger.info("Plan found no ERP tool that fits the query.")
+        return RoutingDecision(agent="LiveERPAgent", method="llm")
+    tool = tools.get(tool_name)
+    if tool is None:
+        logger.warning(f"Plan selected an unavailable tool: '{tool_name}'")
+        return RoutingDecision(agent="LiveERPAgent", method="llm")
+    try:
+        tool_input = tool.input_schema(**(plan.get("arguments") or {})).model_dump()
+    except ValidationError as e:
+        logger.warning(f"Plan arguments for '{tool_name}' failed validation: {e}")
+        return RoutingDecision(agent="LiveERPAgent", method="llm")
+    return RoutingDecision(agent="LiveERPAgent", method="llm", tool_name=tool_name, tool_input=tool_input)
+
+
+def cache_entry_from_decision(decision: RoutingDecision, entities: List[str]) -> Dict[str, Any]:
+    """
+    Serializes a decision for the routing cache. Entity IDs in tool arguments are replaced
+    by placeholders so the plan can be reused for the same question about another entity.
+    The tool call is only cached when every string argument is made of entities of the
+    question; otherwise (free text, or an ID the LLM rewrote, e.g. proj-001 -> PROJ-001)
+    only the agent is cached and the tool is planned again.
+    """
+    entry = asdict(decision)
+    tool_input = {key: _mask_entities(value, entities) for key, value in decision.tool_input.items()}
+    if all(_rebuildable(value) for value in tool_input.values()):
+        entry["tool_input"] = tool_input
+    else:
+        entry["tool_name"], entry["tool_input"] = None, {}
+    return entry
+
+
+def decision_from_cache_entry(entry: Dict[str, Any], entities: List[str]) -> Optional[RoutingDecision]:
+    """Restores a cached decision, filling entity placeholders from the current question."""
+    try:
+        tool_input = {key: _unmask_entities(value, entities) for key, value in entry.get("tool_input", {}).items()}
+    except IndexError:
+        return None
+    return RoutingDecision(**{**entry, "method": "cache", "tool_input": tool_input})
+
+
+_ENTITY_PLACEHOLDER = re.compile(r"<entity:(\d+)(:bare)?>")
+
+
+def _mask_entities(value: Any, entities: List[str]) -> Any:
+    if not isinstance(value, str):
+        return value
+    for index, entity in sorted(enumerate(entities), key=lambda item: len(item[1]), reverse=True):
+        value = value.replace(entity, f"<entity:{index}>")
+        bare = entity.lstrip("@")
+        if bare != entity:
+            value = value.replace(bare, f"<entity:{index}:bare>")
+    return value
+
+
+def _rebuildable(value: Any) -> bool:
+    """True for masked arguments that the entities of another question fill in completely."""
+    if not isinstance(value, str):
+        return value is None or isinstance(value, (bool, int, float))
+    return _ENTITY_PLACEHOLDER.search(value) is not None and not _ENTITY_PLACEHOLDER.sub("", value).strip(" ,;")
+
+
+def _unmask_entities(value: Any, entities: List[str]) -> Any:
+    if not isinstance(value, str):
+        return value
+
+    def replace(match):
+        entity = entities[int(match.group(1))]
+        return entity.lstrip("@") if match.group(2) else entity
+
+    return _ENTITY_PLACEHOLDER.sub(replace, value)
+
@@ -4,46 +4,25 @@ Business Intelligence Module for Enhanced ERP AI Pro
 Features: Predictive Analytics, Anomaly Detection, Advanced Reporting, Forecasting
 """
 
-import pandas as pd
+from __future__ import annotations
+
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
 import asyncio
 import logging
 from dataclasses import dataclass
 from pathlib import Path
 import json
 
-# ML Libraries
-from sklearn.ensemble import RandomForestRegressor, IsolationForest
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, mean_absolute_error
-import xgboost as xgb
-import lightgbm as lgb
-from prophet import Prophet
-import optuna
-
-# Data Processing
-import polars as pl
-from statsmodels.tsa.seasonal import seasonal_decompose
-from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tsa.stattools import adfuller
-import scipy.stats as stats
-
-# Visualization (for reports)
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
-
 # Utils
 import structlog
-from concurrent.futures import ThreadPoolExecutor
-import asyncio
+
+# ML, time-series and data libraries (pandas, scikit-learn, xgboost, prophet, optuna,
+# statsmodels, scipy) take seconds and hundreds of MB to import. They are imported
+# inside the methods that use them, so importing this module stays cheap.
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = structlog.get_logger()
 
@@ -78,11 +57,13 @@ class DataProcessor:
     """Advanced data processing for BI analytics."""
     
     def __init__(self, config: BIConfig):
+        from sklearn.preprocessing import StandardScaler
         self.config = config
         self.scaler = StandardScaler()
         
     async def process_sales_data(self, data: pd.DataFrame) -> pd.DataFrame:
         """Process sales data for analysis."""
+        import pandas as pd
         try:
             # Ensure datetime index
             if 'date' in data.columns:
@@ -130,6 +111,7 @@ class DataProcessor:
 
     async def _add_seasonal_features(self, data: pd.DataFrame) -> pd.DataFrame:
         """Add seasonal decomposition features."""
+        from statsmodels.tsa.seasonal import seasonal_decompose
         if not self.config.seasonal_features:
             return data
             
@@ -193,6 +175,8 @@ class ForecastingEngine:
 
     async def _forecast_prophet(self, data: pd.DataFrame) -> Dict[str, Any]:
         """Prophet forecasting model."""
+        from prophet import Prophet
+        from sklearn.metrics import mean_absolute_error, mean_squared_error
         try:
             # Prepare data for Prophet
             df = data.reset_index()
@@ -237,6 +221,8 @@ class ForecastingEngine:
 
     async def _forecast_arima(self, data: pd.DataFrame) -> Dict[str, Any]:
         """ARIMA forecasting model."""
+        from statsmodels.tsa.arima.model import ARIMA
+        from sklearn.metrics import mean_absolute_error, mean_squared_error
         try:
             # Check stationarity
             revenue_series = data['revenue'].dropna()
@@ -279,6 +265,10 @@ class ForecastingEngine:
 
     async def _forecast_xgboost(self, data: pd.DataFrame) -> Dict[str, Any]:
         """XGBoost forecasting model."""
+        import optuna
+        import xgboost as xgb
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import mean_absolute_error, mean_squared_error
         try:
             # Prepare features
             feature_cols = [col for col in data.columns if col not in ['revenue']]
@@ -335,6 +325,8 @@ class ForecastingEngine:
 
     def _xgboost_objective(self, trial, X_train, y_train, X_test, y_test):
         """Objective function for XGBoost hyperparameter optimization."""
+        import xgboost as xgb
+        from sklearn.metrics import mean_squared_error
         params = {
             'n_estimators': trial.suggest_int('n_estimators', 50, 300),
             'max_depth': trial.suggest_int('max_depth', 3, 10),
@@ -351,6 +343,7 @@ class ForecastingEngine:
 
     async def _find_optimal_arima_order(self, series: pd.Series) -> Tuple[int, int, int]:
         """Find optimal ARIMA order using AIC."""
+        from statsmodels.tsa.arima.model import ARIMA
         best_aic = float('inf')
         best_order = (1, 1, 1)
         
@@ -371,6 +364,7 @@ class ForecastingEngine:
 
     async def _ensemble_forecast(self, forecasts: Dict[str, Any]) -> Dict[str, Any]:
         """Create ensemble forecast from multiple models."""
+        import pandas as pd
         if not forecasts:
             return None
         
@@ -448,6 +442,7 @@ class AnomalyDetector:
 
     async def _detect_revenue_anomalies(self, data: pd.DataFrame) -> Dict[str, Any]:
         """Detect revenue anomalies using Isolation Forest."""
+        from sklearn.ensemble import IsolationForest
         try:
             # Prepare features
             features = ['revenue']
@@ -485,6 +480,7 @@ class AnomalyDetector:
 
     async def _detect_customer_anomalies(self, data: pd.DataFrame) -> Dict[str, Any]:
         """Detect customer behavior anomalies."""
+        import scipy.stats as stats
         try:
             # Statistical anomaly detection
             customer_data = data['customer_transactions'].dropna()
@@ -564,6 +560,7 @@ class CustomerSegmentation:
 
     async def _calculate_rfm_scores(self, data: pd.DataFrame) -> pd.DataFrame:
         """Calculate RFM (Recency, Frequency, Monetary) scores."""
+        import pandas as pd
         current_date = data['order_date'].max()
         
         rfm = data.groupby('customer_id').agg({
@@ -586,6 +583,8 @@ class CustomerSegmentation:
 
     async def _perform_clustering(self, rfm_data: pd.DataFrame) -> Dict[str, Any]:
         """Perform K-means clustering on RFM data."""
+        from sklearn.cluster import KMeans
+        from sklearn.preprocessing import StandardScaler
         features = ['recency', 'frequency', 'monetary']
         X = rfm_data[features]
         
@@ -611,6 +610,7 @@ class CustomerSegmentation:
 
     async def _find_optimal_clusters(self, X: np.ndarray) -> int:
         """Find optimal number of clusters using elbow method."""
+        from sklearn.cluster import KMeans
         inertias = []
         k_range = range(2, 11)
         
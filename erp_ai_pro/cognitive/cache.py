@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Caching primitives for ERP AI Pro.
+Provides question normalization, an in-process LRU+TTL cache and an optional
+Redis-backed shared tier, combined behind a small async interface.
+"""
+
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import structlog
+from prometheus_client import Counter
+
+logger = structlog.get_logger()
+
+# Metrics
+cache_hits = Counter('erp_ai_cache_hits_total', 'Cache hits', ['cache', 'tier'])
+cache_misses = Counter('erp_ai_cache_misses_total', 'Cache misses', ['cache'])
+
+# Entity patterns, applied to the original text so the case-sensitive ones still match.
+_MENTION_PATTERN = re.compile(r"@\w+")
+_ENTITY_PATTERN = re.compile(
+    r"\b[A-Z]{2,}-[A-Z0-9]+\b"                  # PROJ-WEB
+    r"|\b[A-Za-z]+(?:[-_][A-Za-z]+)*[-_]?\d+\w*"  # PROD001, CUST002, T-1, SOP_Warehouse_001
+)
+_PUNCTUATION_PATTERN = re.compile(r"[^\w<>\s]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def fold_diacritics(text: str) -> str:
+    """Removes Vietnamese (and other) diacritics: 'Tồn kho' -> 'Ton kho'."""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+def extract_entities(question: str) -> List[str]:
+    """Returns the user mentions and entity IDs in the question, in order of appearance."""
+    matches = list(_MENTION_PATTERN.finditer(question)) + list(_ENTITY_PATTERN.finditer(question))
+    return [match.group(0) for match in sorted(matches, key=lambda match: match.start())]
+
+
+def normalize_question(question: str, mask_entities: bool = True, fold_accents: bool = True) -> str:
+    """
+    Produces a cache key form of a question: entity IDs masked (optional), case-folded,
+    diacritics folded (optional), punctuation dropped and whitespace collapsed. Keep the
+    diacritics for keys that must tell Vietnamese words apart: "bán" (sell) and "bàn" (table).
+    """
+    text = question
+    if mask_entities:
+        text = _MENTION_PATTERN.sub(" <user> ", text)
+        text = _ENTITY_PATTERN.sub(" <id> ", text)
+    text = text.casefold()
+    # Composed form, so "\w" keeps the accented letters and both encodings share a key.
+    text = fold_diacritics(text) if fold_accents else unicodedata.normalize("NFC", text)
+    text = _PUNCTUATION_PATTERN.sub(" ", text)
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after a time-to-live."""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    Shared cache tier backed by Redis. Values are stored as JSON.
+    Failures are logged and treated as misses so Redis can never fail a request; after a
+    failure Redis is skipped for retry_after seconds, leaving only the in-process tier.
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "erp_ai", ttl: int = 3600, retry_after: float = 30.0):
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._client = None
+        self._unavailable_until = 0.0
+
+    def _get_client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.redis_url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        return self._client
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+
+    def _failed(self, operation: str, error: Exception):
+        logger.warning(f"Redis cache {operation} failed, using the in-process tier for {self.retry_after:.0f}s: {error}")
+        self._unavailable_until = time.monotonic() + self.retry_after
+
+    async def get(self, key: str) -> Optional[Any]:
+        if not self._available():
+            return None
+        try:
+            raw = await self._get_client().get(f"{self.prefix}:{key}")
+        except Exception as e:
+            self._failed("read", e)
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        if not self._available():
+            return
+        try:
+            await self._get_client().set(f"{self.prefix}:{key}", json.dumps(value), ex=int(ttl or self.ttl))
+        except Exception as e:
+            self._failed("write", e)
+
+    async def delete(self, key: str):
+        if not self._available():
+            return
+        try:
+            await self._get_client().delete(f"{self.prefix}:{key}")
+        except Exception as e:
+            self._failed("delete", e)
+
+
+class TieredCache:
+    """
+    A named two-tier cache: the in-process tier is checked first, then the optional
+    shared tier, whose hits are copied back into the local tier.
+    Values must be JSON-serializable when a shared tier is configured.
+    """
+
+    def __init__(self, name: str, local: TTLCache, shared: Optional[RedisCache] = None):
+        self.name = name
+        self.local = local
+        self.shared = shared
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            cache_hits.labels(cache=self.name, tier="local").inc()
+            return value
+        if self.shared is not None:
+            value = await self.shared.get(key)
+            if value is not None:
+                cache_hits.labels(cache=self.name, tier="shared").inc()
+                self.local.set(key, value)
+                return value
+        cache_misses.labels(cache=self.name).inc()
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            await self.shared.set(key, value, ttl)
+
+    async def delete(self, key: str):
+        self.local.delete(key)
+        if self.shared is not None:
+            await self.shared.delete(key)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Model Cascade for ERP AI Pro
+Serves routing and simple answers from a small, fast model and escalates to the large
+model (base_model_name) only when a confidence or complexity signal says the small one
+is not enough. Without a small model every call goes to the large model.
+"""
+
+import asyncio
+import re
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+from prometheus_client import Counter
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.llm_providers import LLMProvider, create_llm_provider
+
+logger = structlog.get_logger()
+
+# Metrics
+model_tier_requests = Counter('erp_ai_model_tier_requests_total', 'LLM work served by each cascade tier', ['task', 'tier'])
+model_escalations = Counter('erp_ai_model_escalations_total', 'Small-model results escalated to the large model', ['task', 'reason'])
+
+SMALL = "small"
+LARGE = "large"
+
+# Questions that ask for reasoning over the context rather than looking something up.
+_REASONING_PATTERN = re.compile(
+    r"\b(why|compare|comparison|difference|analy[sz]e|evaluate|recommend|pros and cons|step by step)\b"
+    r"|tại sao|vì sao|so sánh|khác nhau|phân tích|đánh giá|đề xuất|từng bước",
+    re.IGNORECASE,
+)
+
+
+def create_small_llm_provider(config: SystemConfig) -> Optional[LLMProvider]:
+    """Loads small_model_name on small_llm_backend (default: the large model's backend)."""
+    small_config = replace(
+        config,
+        base_model_name=config.small_model_name,
+        llm_backend=config.small_llm_backend or config.llm_backend,
+        gpu_memory_utilization=config.small_gpu_memory_utilization,
+    )
+    return create_llm_provider(small_config)
+
+
+def record_tier(task: str, tier: str):
+    model_tier_requests.labels(task=task, tier=tier).inc()
+
+
+def record_escalation(task: str, reason: str):
+    model_escalations.labels(task=task, reason=reason).inc()
+    logger.info(f"Escalating {task} to the large model: {reason}")
+
+
+class ModelCascade:
+    """
+    Picks the model for each LLM task. Answers go to the small model when the question is
+    short, retrieved context is small and no reasoning is asked for; a small-model answer
+    that comes back empty is regenerated by the large model.
+    """
+
+    def __init__(self, large: LLMProvider, small: Optional[LLMProvider], config: SystemConfig):
+        self.large = large
+        self.small = small
+        self.max_question_words = config.cascade_small_max_question_words
+        self.max_context_chars = config.cascade_small_max_context_chars
+        self.min_answer_chars = config.cascade_min_answer_chars
+
+    @property
+    def enabled(self) -> bool:
+        return self.small is not None
+
+    def answer_tier(self, question: str, documents: List[Dict[str, Any]]) -> Tuple[str, Optional[str]]:
+        """Returns the tier for answering, and the complexity reason when it is the large one."""
+        if self.small is None:
+            return LARGE, None
+        if len(question.split()) > self.max_question_words:
+            return LARGE, "long_question"
+        if sum(len(doc.get("page_content", "")) for doc in documents) > self.max_context_chars:
+            return LARGE, "long_context"
+        if _REASONING_PATTERN.search(question):
+            return LARGE, "reasoning"
+        return SMALL, None
+
+    def model(self, tier: str) -> LLMProvider:
+        return self.small if tier == SMALL and self.small is not None else self.large
+
+    def answer_is_weak(self, answer: str) -> bool:
+        """Confidence signal on a small-model answer: too short to be an answer."""
+        return len(answer.strip()) < self.min_answer_chars
+
+    def stream_model(self, question: str, documents: List[Dict[str, Any]]) -> LLMProvider:
+        """The model to stream an answer from. A streamed answer cannot be escalated once sent."""
+        tier, reason = self.answer_tier(question, documents)
+        if reason:
+            record_escalation("answer", reason)
+        record_tier("answer", tier)
+        return self.model(tier)
+
+    async def generate_answer(self, prompt: str, question: str, documents: List[Dict[str, Any]], **params) -> Tuple[str, str]:
+        """Generates one answer; returns (answer, tier)."""
+        return (await self.generate_answers([(prompt, question, documents)], **params))[0]
+
+    async def generate_answers(self, items: List[Tuple[str, str, List[Dict[str, Any]]]], **params) -> List[Tuple[str, str]]:
+        """
+        Generates answers for (prompt, question, documents) items, one batched call per tier.
+        Weak small-model answers are regenerated together by the large model.
+        Returns (answer, tier) per item, in order.
+        """
+        tiers = []
+        for _, question, documents in items:
+            tier, reason = self.answer_tier(question, documents)
+            if reason:
+                record_escalation("answer", reason)
+            tiers.append(tier)
+
+        answers: List[str] = [""] * len(items)
+
+        async def generate_tier(tier: str):
+            indices = [index for index, item_tier in enumerate(tiers) if item_tier == tier]
+            if indices:
+                outputs = await self.model(tier).generate_batch([items[index][0] for index in indices], **params)
+                for index, output in zip(indices, outputs):
+                    answers[index] = output
+
+        await asyncio.gather(generate_tier(SMALL), generate_tier(LARGE))
+
+        weak = [index for index, tier in enumerate(tiers) if tier == SMALL and self.answer_is_weak(answers[index])]
+        if weak:
+            for _ in weak:
+                record_escalation("answer", "weak_answer")
+            outputs = await self.large.generate_batch([items[index][0] for index in weak], **params)
+            for index, output in zip(weak, outputs):
+                answers[index], tiers[index] = output, LARGE
+
+        for tier in tiers:
+            record_tier("answer", tier)
+        return list(zip(answers, tiers))
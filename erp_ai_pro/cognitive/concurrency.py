@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrency helpers for ERP AI Pro.
+SingleFlight runs a piece of work once per key at a time: concurrent callers with the
+same key wait for the call already in flight instead of starting their own.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+import structlog
+from prometheus_client import Counter, Gauge
+
+logger = structlog.get_logger()
+
+# Metrics
+coalesced_requests = Counter('erp_ai_coalesced_requests_total', 'Requests that joined an identical in-flight call', ['flight'])
+inflight_calls = Gauge('erp_ai_inflight_calls', 'Distinct calls currently in flight', ['flight'])
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key. The first caller starts the work as a task;
+    callers arriving before it finishes await the same task. Nothing is remembered once
+    the call completes, so later callers start fresh work.
+
+    A caller that is cancelled (e.g. a disconnected client) stops waiting without cancelling
+    the shared call, which the other callers may still be waiting on.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Returns (result, shared), where shared is True if the caller joined a call already in flight."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            coalesced_requests.labels(flight=self.name).inc()
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            inflight_calls.labels(flight=self.name).inc()
+            task.add_done_callback(lambda _task: self._forget(key, _task))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        inflight_calls.labels(flight=self.name).dec()
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Single-flight call '{self.name}' failed for all its callers: {task.exception()}")
+
+    def __len__(self) -> int:
+        return len(self._calls)
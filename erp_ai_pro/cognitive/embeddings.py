@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Shared sentence embedding helpers for ERP AI Pro.
+Loads each SentenceTransformer model once per process so the router, caches
+and retrievers do not keep separate copies of the same weights in memory.
+"""
+
+import threading
+from typing import Callable, Dict, List
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+# An encoder maps a list of texts to an (n, dim) float32 matrix of L2-normalized rows.
+Encoder = Callable[[List[str]], np.ndarray]
+
+_encoders: Dict[str, Encoder] = {}
+_encoders_lock = threading.Lock()
+
+
+def load_sentence_encoder(model_name: str) -> Encoder:
+    """
+    Returns a process-wide encoder for the given SentenceTransformer model.
+    The model is imported and loaded lazily on the first call.
+    """
+    with _encoders_lock:
+        encoder = _encoders.get(model_name)
+        if encoder is None:
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(model_name)
+
+            def encoder(texts: List[str]) -> np.ndarray:
+                vectors = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+                return np.asarray(vectors, dtype=np.float32)
+
+            _encoders[model_name] = encoder
+            logger.info(f"Sentence encoder loaded: {model_name}")
+        return encoder
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes each row so that dot products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental Indexing for ERP AI Pro
+Keeps a vector store in line with the knowledge base without rebuilding it. Documents
+are keyed on their `id` and fingerprinted by a hash of their content and metadata; a sync
+embeds only new and changed documents, deletes the ones removed from the knowledge base
+and leaves the others untouched. This module holds the bookkeeping; ingestion.py runs
+the sync.
+
+The id -> hash manifest is stored with the index. Its version, a hash of the manifest,
+identifies the indexed corpus: cached answers are keyed on it and KnowledgeAgent reloads
+its indexes when it changes.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import structlog
+
+from erp_ai_pro.cognitive.vector_index import SOURCE_MANIFEST, current_version
+
+logger = structlog.get_logger()
+
+# Stores synced under an older format are re-indexed in full. 2: role fields in the stored metadata.
+# 3: documents with an empty authorized_roles list stored as restricted.
+MANIFEST_FORMAT = 3
+
+# Manifest file -> (modification time, version), so the version can be read per request.
+_version_cache: Dict[str, Tuple[int, str]] = {}
+
+
+def content_hash(content: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps({"content": content, "metadata": metadata or {}}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class KnowledgeDocument:
+    """A knowledge base entry: {"id", "content", "metadata"} in the knowledge base file."""
+    id: str
+    content: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def hash(self) -> str:
+        return content_hash(self.content, self.metadata)
+
+    def stored_metadata(self) -> Dict[str, Any]:
+        # The id travels with the stored chunk, so retrievers and caches can identify it.
+        return {**self.metadata, "id": self.id}
+
+
+@dataclass
+class IndexManifest:
+    """Hashes of the indexed documents, and the embedding model that indexed them."""
+    embedding_model: str = ""
+    documents: Dict[str, str] = field(default_factory=dict)
+    format: int = MANIFEST_FORMAT
+
+    @property
+    def version(self) -> str:
+        payload = json.dumps([self.format, self.embedding_model, sorted(self.documents.items())], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "format": self.format,
+            "version": self.version,
+            "embedding_model": self.embedding_model,
+            "documents": self.documents,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndexManifest":
+        return cls(
+            embedding_model=data.get("embedding_model", ""),
+            documents=dict(data.get("documents", {})),
+            format=data.get("format", 1),
+        )
+
+
+def manifest_file(path: str) -> Path:
+    """The manifest of the index at path: inside the current version for native indexes, else at the root."""
+    version = current_version(path)
+    return Path(path) / version / SOURCE_MANIFEST if version else Path(path) / SOURCE_MANIFEST
+
+
+def load_manifest(path: str) -> Optional[IndexManifest]:
+    try:
+        with open(manifest_file(path), encoding="utf-8") as f:
+            return IndexManifest.from_dict(json.load(f))
+    except FileNotFoundError:
+        return None
+
+
+def save_manifest(path: str, manifest: IndexManifest):
+    """Replaces the root manifest atomically."""
+    root = Path(path)
+    root.mkdir(parents=True, exist_ok=True)
+    temporary = root / f"{SOURCE_MANIFEST}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(manifest.to_dict(), f, ensure_ascii=False)
+    os.replace(temporary, root / SOURCE_MANIFEST)
+
+
+def index_version(path: str) -> Optional[str]:
+    """
+    The version of the corpus indexed at path, or None for stores without a manifest
+    (built before incremental indexing). Cheap enough to call per request: the manifest
+    is only parsed again when its file changes.
+    """
+    file = manifest_file(path)
+    try:
+        modified = file.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _version_cache.get(str(file))
+    if cached and cached[0] == modified:
+        return cached[1]
+    with open(file, encoding="utf-8") as f:
+        data = json.load(f)
+    version = data.get("version") or IndexManifest.from_dict(data).version
+    _version_cache[str(file)] = (modified, version)
+    return version
+
+
+class SyncPlanner:
+    """
+    Compares knowledge base documents with the manifest of the previous sync, one document
+    at a time, so a streamed knowledge base is planned without holding it in memory.
+    Everything is re-embedded when full is set or the embedding model or manifest format changed.
+    """
+
+    def __init__(self, manifest: Optional[IndexManifest], embedding_model: str, full: bool = False):
+        self.previous = manifest.documents if manifest else {}
+        current = manifest is not None and manifest.format == MANIFEST_FORMAT and manifest.embedding_model == embedding_model
+        self.reusable = self.previous if current and not full else {}
+        # The manifest of the knowledge base as seen so far.
+        self.manifest = IndexManifest(embedding_model)
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    def needs_embedding(self, document: KnowledgeDocument) -> bool:
+        """Records the document; True if it is new or changed, False if its stored vector is still valid."""
+        if document.id in self.manifest.documents:
+            raise ValueError(f"Duplicate document id '{document.id}' in the knowledge base.")
+        document_hash = document.hash
+        self.manifest.documents[document.id] = document_hash
+        if self.reusable.get(document.id) == document_hash:
+            self.unchanged += 1
+            return False
+        if document.id in self.previous:
+            self.updated += 1
+        else:
+            self.added += 1
+        return True
+
+    def deletes(self, stored_ids: Iterable[str] = ()) -> List[str]:
+        """
+        Ids to delete once every document was seen: those of the previous manifest, or
+        actually in the store (stored_ids), that are no longer in the knowledge base.
+        """
+        return sorted((set(self.previous) | set(stored_ids)) - set(self.manifest.documents))
@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+"""
+Knowledge Base Ingestion for ERP AI Pro
+A streaming pipeline that syncs the knowledge base into the vector store:
+
+    read (JSONL, lazily) -> chunk -> plan (skip unchanged) -> embed (process pool) -> write (bulk)
+
+Documents longer than chunk_tokens words are split into overlapping chunks, each indexed
+as its own document ("<id>#<n>"). Chunks that need embedding are grouped in batches of
+batch_size and embedded by a pool of worker processes, each loading the embedding model
+once; batches are kept in flight a few at a time and written in order.
+
+Native index: chunks are streamed into the documents of a new version as they come, and
+embedded batches are staged in the checkpoint directory. Once the stream ends the version's
+memory-mapped vector matrix is filled from the staged batches (re-embedding any that went
+missing) and the stored vectors of unchanged chunks, and the version is published by
+atomically replacing CURRENT (see vector_index.py). Chroma: each batch is
+upserted with its precomputed embeddings, so every document is seen either before or
+after its update, and removed ids are deleted at the end.
+
+Finished batches are recorded in the checkpoint under a fingerprint of their content, so
+after a crash a rerun only embeds the batches that were not done. Throughput (items and
+tokens per second) is reported per stage.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import structlog
+from prometheus_client import Counter
+
+from erp_ai_pro.cognitive.embeddings import Encoder, load_sentence_encoder
+from erp_ai_pro.cognitive.rbac import role_metadata_fields
+from erp_ai_pro.cognitive.indexing import KnowledgeDocument, SyncPlanner, content_hash, load_manifest, save_manifest
+from erp_ai_pro.cognitive.vector_index import IndexWriter, VectorIndex, current_version
+
+logger = structlog.get_logger()
+
+# Metrics
+indexed_documents = Counter('erp_ai_indexed_documents_total', 'Knowledge base chunks by sync action', ['action'])
+ingested_items = Counter('erp_ai_ingested_items_total', 'Items processed by ingestion stage', ['stage'])
+ingested_tokens = Counter('erp_ai_ingested_tokens_total', 'Tokens processed by ingestion stage', ['stage'])
+
+_WORD_PATTERN = re.compile(r"\S+")
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def count_tokens(text: str) -> int:
+    """Whitespace-delimited words; the throughput figures use this as their token count."""
+    return len(_WORD_PATTERN.findall(text))
+
+
+def read_knowledge_base(path: str) -> Iterator[KnowledgeDocument]:
+    """
+    Yields the documents of a knowledge base file: JSON Lines (.jsonl, read one line at a
+    time) or a JSON list (read whole). Entries are {"id", "content", "metadata"}; entries
+    without an id are keyed on their content hash, so editing one shows up as a removal
+    plus an addition.
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            items: Iterable[Dict[str, Any]] = (json.loads(line) for line in f if line.strip())
+        else:
+            items = json.load(f)
+        for item in items:
+            metadata = item.get("metadata") or {}
+            yield KnowledgeDocument(str(item.get("id") or content_hash(item["content"], metadata)), item["content"], metadata)
+
+
+def chunk_document(document: KnowledgeDocument, chunk_tokens: int = 200, overlap: int = 40) -> List[KnowledgeDocument]:
+    """
+    Splits a document into windows of at most chunk_tokens words that overlap by overlap
+    words, keeping the original text between them. A document that fits is returned as
+    it is, so its id and hash do not change when chunking is introduced.
+    """
+    words = list(_WORD_PATTERN.finditer(document.content))
+    if chunk_tokens <= 0 or len(words) <= chunk_tokens:
+        return [document]
+    step = max(1, chunk_tokens - overlap)
+    chunks = []
+    for number, start in enumerate(range(0, len(words), step)):
+        window = words[start:start + chunk_tokens]
+        chunks.append(KnowledgeDocument(
+            f"{document.id}#{number}",
+            document.content[window[0].start():window[-1].end()],
+            {**document.metadata, "source_id": document.id, "chunk": number},
+        ))
+        if start + chunk_tokens >= len(words):
+            break
+    return chunks
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    tokens: int = 0
+    seconds: float = 0.0
+
+    def add(self, items: int, tokens: int, seconds: float):
+        self.items += items
+        self.tokens += tokens
+        self.seconds += seconds
+        ingested_items.labels(stage=self.name).inc(items)
+        ingested_tokens.labels(stage=self.name).inc(tokens)
+
+    def __str__(self) -> str:
+        seconds = self.seconds or float("inf")
+        return (f"{self.name}: {self.items} items, {self.tokens} tokens in {self.seconds:.2f}s "
+                f"({self.items / seconds:.1f} items/s, {self.tokens / seconds:.0f} tokens/s)")
+
+
+@dataclass
+class SyncReport:
+    version: str
+    added: int
+    updated: int
+    deleted: int
+    unchanged: int
+    seconds: float
+    # Per-stage throughput: read (documents), chunk, embed and write (chunks).
+    stages: List[StageStats] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return (f"version {self.version}: {self.added} added, {self.updated} updated, {self.deleted} deleted, "
+                f"{self.unchanged} unchanged in {self.seconds:.1f}s")
+
+
+class Checkpoint:
+    """
+    Batches finished by an interrupted sync, by fingerprint, with the file their vectors
+    were staged in (native index) or "" (already written to the store).
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        try:
+            with open(directory / CHECKPOINT_FILE, encoding="utf-8") as f:
+                self.batches: Dict[str, str] = json.load(f)["batches"]
+        except (FileNotFoundError, ValueError, KeyError):
+            self.batches = {}
+        if self.batches:
+            logger.info(f"Resuming ingestion: {len(self.batches)} batches already done in {directory}.")
+
+    @staticmethod
+    def fingerprint(model_name: str, batch: List[KnowledgeDocument]) -> str:
+        digest = hashlib.sha256(model_name.encode("utf-8"))
+        for document in batch:
+            digest.update(f"\x00{document.id}\x00{document.hash}".encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    def stage(self, fingerprint: str, vectors: np.ndarray) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        file = f"batch-{fingerprint}.npy"
+        np.save(self.directory / file, vectors)
+        return file
+
+    def load(self, file: str) -> Optional[np.ndarray]:
+        """The staged vectors, memory-mapped; None when the file is missing or corrupt."""
+        try:
+            return np.load(self.directory / file, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def mark(self, fingerprint: str, file: str = ""):
+        self.batches[fingerprint] = file
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = self.directory / f"{CHECKPOINT_FILE}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"batches": self.batches}, f)
+        os.replace(temporary, self.directory / CHECKPOINT_FILE)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.batches = {}
+
+
+# The encoder of a pool worker process, loaded once by _init_worker.
+_worker_encoder: Optional[Encoder] = None
+
+
+def _init_worker(encoder_factory: Callable[[], Encoder]):
+    global _worker_encoder
+    _worker_encoder = encoder_factory()
+
+
+def _embed_in_worker(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_encoder(texts), dtype=np.float32)
+
+
+@dataclass
+class _Batch:
+    number: int
+    documents: List[KnowledgeDocument]
+    fingerprint: str
+    vectors: Optional[np.ndarray] = None
+    # Staged file of the vectors, for batches restored from the checkpoint.
+    file: Optional[str] = None
+
+
+class IngestionPipeline:
+    """
+    Syncs documents into a native index or a Chroma collection. encoder_factory builds the
+    encoder in each of the workers processes (it must be picklable then); with workers=0
+    embedding runs in this process.
+    """
+
+    def __init__(
+        self,
+        encoder_factory: Callable[[], Encoder],
+        model_name: str = "",
+        workers: int = 0,
+        batch_size: int = 256,
+        chunk_tokens: int = 200,
+        chunk_overlap: int = 40,
+    ):
+        self.encoder_factory = encoder_factory
+        self.model_name = model_name
+        self.workers = workers
+        self.batch_size = batch_size
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        # Batches embedded concurrently, so workers never wait for the reader.
+        self.max_pending = 2 * max(0, workers)
+
+    def sync_native(
+        self,
+        path: str,
+        documents: Iterable[KnowledgeDocument],
+        dtype: str = "int8",
+        index_type: str = "flat",
+        nlist: int = 0,
+        full: bool = False,
+    ) -> SyncReport:
+        """
+        Syncs the native index at path. Unchanged chunks keep their stored vectors (float16
+        for float16 and int8 indexes; use full to re-embed them all), and no version is
+        written when nothing changed.
+        """
+        started = time.perf_counter()
+        index = VectorIndex(path) if current_version(path) else None
+        planner = SyncPlanner(load_manifest(path) if index else None, self.model_name, full)
+        stored_rows = {document["id"]: row for row, document in enumerate(index.documents)} if index else {}
+        checkpoint = Checkpoint(Path(path) / "ingest")
+        # Chunks are written to the new version as they stream by; only where each one's
+        # vector comes from is kept: a stored row, or a staged batch.
+        writer = IndexWriter(path, dtype=dtype, index_type=index_type, nlist=nlist, model_name=self.model_name)
+        kept: List[Tuple[int, int]] = []
+        staged: List[Tuple[str, List[int]]] = []
+
+        def keep(document: KnowledgeDocument):
+            kept.append((writer.add(document.id, document.content, document.stored_metadata()), stored_rows[document.id]))
+
+        def write(batch: _Batch, stats: StageStats):
+            start = time.perf_counter()
+            if batch.file is None:
+                batch.file = checkpoint.stage(batch.fingerprint, batch.vectors)
+                checkpoint.mark(batch.fingerprint, batch.file)
+            rows = [writer.add(document.id, document.content, document.stored_metadata()) for document in batch.documents]
+            staged.append((batch.file, rows))
+            batch.vectors = None
+            stats.add(len(batch.documents), sum(count_tokens(document.content) for document in batch.documents),
+                      time.perf_counter() - start)
+
+        try:
+            stages = self._run(documents, planner, checkpoint, keep, write)
+            deletes = planner.deletes(stored_rows)
+            if index is None or planner.added or planner.updated or deletes:
+                write_stats = stages[-1]
+                start = time.perf_counter()
+                self._assemble(writer, index, kept, staged, checkpoint)
+                writer.finish(planner.manifest.to_dict())
+                write_stats.seconds += time.perf_counter() - start
+            else:
+                writer.abort()
+        except BaseException:
+            writer.abort()
+            raise
+        checkpoint.clear()
+        return self._report(planner, len(deletes), stages, started)
+
+    def _assemble(self, writer: IndexWriter, index: Optional[VectorIndex], kept: List[Tuple[int, int]],
+                  staged: List[Tuple[str, List[int]]], checkpoint: Checkpoint):
+        """Fills the writer's vectors: new chunks from their staged batches, unchanged ones from the stored rows."""
+        if not writer.count:
+            return
+        vectors = None
+        encoder = None
+        for file, rows in staged:
+            batch_vectors = checkpoint.load(file)
+            if batch_vectors is None or len(batch_vectors) != len(rows):
+                # Lost or corrupted since it was staged: the batch is not done, embed it again.
+                logger.warning(f"Staged batch {file} is missing or corrupt, embedding it again.")
+                encoder = encoder or self.encoder_factory()
+                batch_vectors = np.asarray(encoder([writer.document(row)["page_content"] for row in rows]), dtype=np.float32)
+            if vectors is None:
+                vectors = writer.allocate(batch_vectors.shape[1])
+            vectors[rows] = batch_vectors
+        if vectors is None:
+            vectors = writer.allocate(index.vectors.shape[1])
+        for start in range(0, len(kept), self.batch_size):
+            positions, rows = zip(*kept[start:start + self.batch_size])
+            vectors[list(positions)] = index.vectors[list(rows)]
+
+    def sync_chroma(self, collection: Any, path: str, documents: Iterable[KnowledgeDocument], full: bool = False) -> SyncReport:
+        """
+        Syncs a chromadb collection persisted at path. Ids in the collection that are not in
+        the knowledge base, including the random ids of stores built by the old
+        from-scratch script, are deleted.
+        """
+        started = time.perf_counter()
+        previous = load_manifest(path)
+        planner = SyncPlanner(previous, self.model_name, full)
+        checkpoint = Checkpoint(Path(path) / "ingest")
+
+        def write(batch: _Batch, stats: StageStats):
+            start = time.perf_counter()
+            if batch.vectors is not None:
+                collection.upsert(
+                    ids=[document.id for document in batch.documents],
+                    embeddings=batch.vectors.tolist(),
+                    documents=[document.content for document in batch.documents],
+                    metadatas=[_chroma_metadata(document) for document in batch.documents],
+                )
+                checkpoint.mark(batch.fingerprint)
+            stats.add(len(batch.documents), sum(count_tokens(document.content) for document in batch.documents),
+                      time.perf_counter() - start)
+
+        stages = self._run(documents, planner, checkpoint, lambda document: None, write)
+        deletes = planner.deletes(collection.get(include=[])["ids"])
+        for start in range(0, len(deletes), self.batch_size):
+            collection.delete(ids=deletes[start:start + self.batch_size])
+        if previous is None or previous.version != planner.manifest.version:
+            save_manifest(path, planner.manifest)
+        checkpoint.clear()
+        return self._report(planner, len(deletes), stages, started)
+
+    def _run(
+        self,
+        documents: Iterable[KnowledgeDocument],
+        planner: SyncPlanner,
+        checkpoint: Checkpoint,
+        keep: Callable[[KnowledgeDocument], None],
+        write: Callable[[_Batch, StageStats], None],
+    ) -> List[StageStats]:
+        """Streams documents through chunking, planning, embedding and write; returns the stage stats."""
+        read, chunk, embed, written = StageStats("read"), StageStats("chunk"), StageStats("embed"), StageStats("write")
+
+        def batches() -> Iterator[_Batch]:
+            pending: List[KnowledgeDocument] = []
+            number = 0
+            iterator = iter(documents)
+            while True:
+                start = time.perf_counter()
+                document = next(iterator, None)
+                if document is None:
+                    break
+                read.add(1, count_tokens(document.content), time.perf_counter() - start)
+                start = time.perf_counter()
+                pieces = chunk_document(document, self.chunk_tokens, self.chunk_overlap)
+                chunk.add(len(pieces), sum(count_tokens(piece.content) for piece in pieces), time.perf_counter() - start)
+                for piece in pieces:
+                    if not planner.needs_embedding(piece):
+                        keep(piece)
+                        continue
+                    pending.append(piece)
+                    if len(pending) == self.batch_size:
+                        yield self._batch(number, pending, checkpoint)
+                        number, pending = number + 1, []
+            if pending:
+                yield self._batch(number, pending, checkpoint)
+
+        for batch in self._embed(batches(), embed):
+            write(batch, written)
+        return [read, chunk, embed, written]
+
+    def _batch(self, number: int, documents: List[KnowledgeDocument], checkpoint: Checkpoint) -> _Batch:
+        fingerprint = Checkpoint.fingerprint(self.model_name, documents)
+        batch = _Batch(number, documents, fingerprint)
+        if fingerprint in checkpoint.batches:
+            # Done before an interruption: native batches reuse the staged vectors, Chroma ones are already written.
+            file = checkpoint.batches[fingerprint]
+            if not file or checkpoint.load(file) is not None:
+                batch.file = file
+        return batch
+
+    def _embed(self, batches: Iterator[_Batch], stats: StageStats) -> Iterator[_Batch]:
+        """Embeds the batches that are not done yet, at most max_pending at a time, and yields all batches in order."""
+        encoder = self.encoder_factory() if self.workers <= 0 else None
+        executor = None
+        if self.workers > 0:
+            # spawn: forked workers would inherit the parent's model and thread state.
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.encoder_factory,),
+            )
+        pending: Deque[Tuple[_Batch, Any]] = deque()
+        started: Optional[float] = None
+
+        def finish(batch: _Batch, result: Any) -> _Batch:
+            if result is not None:
+                batch.vectors = result.result() if executor else result
+                stats.add(len(batch.documents), sum(count_tokens(document.content) for document in batch.documents), 0.0)
+            return batch
+
+        try:
+            for batch in batches:
+                if batch.file is not None:
+                    pending.append((batch, None))
+                else:
+                    started = started or time.perf_counter()
+                    texts = [document.content for document in batch.documents]
+                    if executor:
+                        pending.append((batch, executor.submit(_embed_in_worker, texts)))
+                    else:
+                        start = time.perf_counter()
+                        pending.append((batch, np.asarray(encoder(texts), dtype=np.float32)))
+                        stats.seconds += time.perf_counter() - start
+                while len(pending) > self.max_pending or (pending and pending[0][1] is None):
+                    yield finish(*pending.popleft())
+            while pending:
+                yield finish(*pending.popleft())
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+                if started is not None:
+                    # With workers the stage runs alongside the others; report its wall time.
+                    stats.seconds = time.perf_counter() - started
+
+    @staticmethod
+    def _report(planner: SyncPlanner, deleted: int, stages: List[StageStats], started: float) -> SyncReport:
+        report = SyncReport(
+            version=planner.manifest.version,
+            added=planner.added,
+            updated=planner.updated,
+            deleted=deleted,
+            unchanged=planner.unchanged,
+            seconds=time.perf_counter() - started,
+            stages=stages,
+        )
+        for action in ("added", "updated", "deleted", "unchanged"):
+            indexed_documents.labels(action=action).inc(getattr(report, action))
+        logger.info(f"Vector store synced, {report}; " + "; ".join(str(stage) for stage in stages))
+        return report
+
+
+def _chroma_metadata(document: KnowledgeDocument) -> Dict[str, Any]:
+    # Chroma only stores scalar metadata values; authorized_roles is stored as role fields
+    # for the retrieval filter.
+    metadata = {key: value for key, value in document.stored_metadata().items() if isinstance(value, (str, int, float, bool))}
+    metadata.update(role_metadata_fields(document.metadata))
+    return metadata
+
+
+def sync_vector_store(config: Any, documents: Iterable[KnowledgeDocument], full: bool = False) -> SyncReport:
+    """Syncs the vector store KnowledgeAgent reads (config.vector_store_backend) with documents."""
+    pipeline = IngestionPipeline(
+        partial(load_sentence_encoder, config.embedding_model_name),
+        model_name=config.embedding_model_name,
+        workers=config.ingest_workers,
+        batch_size=config.ingest_batch_size,
+        chunk_tokens=config.ingest_chunk_tokens,
+        chunk_overlap=config.ingest_chunk_overlap,
+    )
+    if config.vector_store_backend == "native":
+        return pipeline.sync_native(
+            config.native_index_path, documents, dtype=config.native_index_dtype,
+            index_type=config.native_index_type, full=full,
+        )
+    import chromadb
+
+    client = chromadb.PersistentClient(path=config.vector_store_path)
+    collection = client.get_or_create_collection(config.collection_name)
+    return pipeline.sync_chroma(collection, config.vector_store_path, documents, full=full)
@@ -1,11 +1,442 @@
+# -*- coding: utf-8 -*-
+"""
+LLM Providers for ERP AI Pro
+A single async interface (generate, generate_batch, stream) over the supported
+language model backends, so agents never call a model synchronously.
+The fake backend answers deterministically without loading a model.
+"""
+
 import asyncio
-from typing import Any, Dict
+import json
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import structlog
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.cache import extract_entities
+
+logger = structlog.get_logger()
+
+
+class LLMProvider:
+    """
+    Base class for language model backends.
+
+    Common generation parameters:
+        max_tokens: Maximum number of new tokens.
+        temperature: Sampling temperature; 0 means greedy decoding.
+        top_p: Nucleus sampling threshold.
+        json_schema: Constrain the output to this JSON schema where the backend supports it.
+    """
+
+    name = "base"
+    # Tokens generated so far, for backends that report them (0 otherwise).
+    completion_tokens = 0
+
+    async def generate(self, prompt: str, **params) -> str:
+        """Returns the completion for one prompt (without the prompt)."""
+        raise NotImplementedError
+
+    async def generate_batch(self, prompts: List[str], **params) -> List[str]:
+        """Returns the completions for several prompts with the same parameters."""
+        return list(await asyncio.gather(*(self.generate(prompt, **params) for prompt in prompts)))
+
+    async def stream(self, prompt: str, **params) -> AsyncIterator[str]:
+        """Yields the completion in text chunks as they are produced."""
+        yield await self.generate(prompt, **params)
+
+    async def score_continuations(self, candidates: List[Tuple[str, str]]) -> List[float]:
+        """Returns the summed log-probability of each continuation given its prompt."""
+        raise NotImplementedError(f"{self.name} does not support continuation scoring.")
+
+
+class VLLMProvider(LLMProvider):
+    """
+    vLLM backend built on AsyncLLMEngine. Concurrent requests are merged by the engine's
+    continuous batching, so callers simply await their own request.
+    """
+
+    name = "vllm"
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._tokenizer = None
+
+    @classmethod
+    def from_config(cls, config: SystemConfig) -> "VLLMProvider":
+        import torch
+        from vllm import AsyncEngineArgs, AsyncLLMEngine
+
+        engine_args = AsyncEngineArgs(
+            model=config.base_model_name,
+            tensor_parallel_size=torch.cuda.device_count() if torch.cuda.is_available() else 1,
+            gpu_memory_utilization=config.gpu_memory_utilization,
+            enable_prefix_caching=True,
+        )
+        return cls(AsyncLLMEngine.from_engine_args(engine_args))
+
+    def _sampling_params(self, max_tokens: int = 256, temperature: float = 0.0, top_p: float = 1.0,
+                         json_schema: Optional[Dict[str, Any]] = None, **extra):
+        from vllm import SamplingParams
+        if json_schema is not None:
+            from vllm.sampling_params import GuidedDecodingParams
+            extra["guided_decoding"] = GuidedDecodingParams(json=json_schema)
+        return SamplingParams(max_tokens=max_tokens, temperature=temperature, top_p=top_p, **extra)
+
+    async def _final_output(self, prompt: str, sampling_params):
+        final = None
+        async for output in self.engine.generate(prompt, sampling_params, request_id=uuid.uuid4().hex):
+            final = output
+        return final
+
+    async def generate(self, prompt: str, **params) -> str:
+        output = await self._final_output(prompt, self._sampling_params(**params))
+        self.completion_tokens += len(output.outputs[0].token_ids)
+        return output.outputs[0].text.strip()
+
+    async def stream(self, prompt: str, **params) -> AsyncIterator[str]:
+        sent = 0
+        output = None
+        async for output in self.engine.generate(prompt, self._sampling_params(**params), request_id=uuid.uuid4().hex):
+            text = output.outputs[0].text
+            if len(text) > sent:
+                yield text[sent:]
+                sent = len(text)
+        if output is not None:
+            self.completion_tokens += len(output.outputs[0].token_ids)
+
+    async def score_continuations(self, candidates: List[Tuple[str, str]]) -> List[float]:
+        if self._tokenizer is None:
+            self._tokenizer = await self.engine.get_tokenizer()
+        sampling_params = self._sampling_params(max_tokens=1, prompt_logprobs=0)
+        outputs = await asyncio.gather(*(
+            self._final_output(prompt + continuation, sampling_params) for prompt, continuation in candidates
+        ))
+        return [self._continuation_logprob(prompt, output) for (prompt, _), output in zip(candidates, outputs)]
+
+    def _continuation_logprob(self, prompt: str, output) -> float:
+        """Sums the prompt logprobs of the tokens after the prompt prefix."""
+        prefix_length = len(self._tokenizer(prompt).input_ids)
+        token_ids = output.prompt_token_ids
+        total = 0.0
+        for position in range(prefix_length, len(token_ids)):
+            total += output.prompt_logprobs[position][token_ids[position]].logprob
+        return total
+
+
+class VLLMOfflineProvider(VLLMProvider):
+    """
+    vLLM offline backend built on vllm.LLM, for bulk jobs rather than serving. Each
+    generate_batch call hands its whole prompt list to LLM.generate, which schedules it in
+    batches as large as GPU memory allows. Calls run one at a time on a dedicated thread.
+    Streaming yields the full answer in one chunk.
+    """
+
+    name = "vllm_offline"
+
+    def __init__(self, llm):
+        self.llm = llm
+        self._tokenizer = llm.get_tokenizer()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vllm-offline")
+
+    @classmethod
+    def from_config(cls, config: SystemConfig) -> "VLLMOfflineProvider":
+        import torch
+        from vllm import LLM
+
+        return cls(LLM(
+            model=config.base_model_name,
+            tensor_parallel_size=torch.cuda.device_count() if torch.cuda.is_available() else 1,
+            gpu_memory_utilization=config.gpu_memory_utilization,
+            enable_prefix_caching=True,
+        ))
+
+    async def _run_generate(self, prompts: List[str], sampling_params) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: self.llm.generate(prompts, sampling_params, use_tqdm=False)
+        )
+
+    async def generate(self, prompt: str, **params) -> str:
+        return (await self.generate_batch([prompt], **params))[0]
+
+    async def generate_batch(self, prompts: List[str], **params) -> List[str]:
+        outputs = await self._run_generate(prompts, self._sampling_params(**params))
+        self.completion_tokens += sum(len(output.outputs[0].token_ids) for output in outputs)
+        return [output.outputs[0].text.strip() for output in outputs]
+
+    async def stream(self, prompt: str, **params) -> AsyncIterator[str]:
+        yield await self.generate(prompt, **params)
+
+    async def score_continuations(self, candidates: List[Tuple[str, str]]) -> List[float]:
+        sampling_params = self._sampling_params(max_tokens=1, prompt_logprobs=0)
+        outputs = await self._run_generate([prompt + continuation for prompt, continuation in candidates], sampling_params)
+        return [self._continuation_logprob(prompt, output) for (prompt, _), output in zip(candidates, outputs)]
 
-class HuggingFaceLLMProvider:
-    def __init__(self, hf_pipeline):
+
+class HuggingFaceLLMProvider(LLMProvider):
+    """
+    Hugging Face pipeline backend. Generation is synchronous, so it runs on a dedicated,
+    bounded thread pool; at most max_workers + max_queue_size calls are in flight and
+    further callers wait without blocking the event loop.
+    """
+
+    name = "huggingface"
+
+    def __init__(self, hf_pipeline, max_workers: int = 1, max_queue_size: int = 64):
         self.hf_pipeline = hf_pipeline
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hf-llm")
+        self._slots = asyncio.Semaphore(max_workers + max_queue_size)
+
+    @classmethod
+    def from_config(cls, config: SystemConfig) -> "HuggingFaceLLMProvider":
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+
+        tokenizer = AutoTokenizer.from_pretrained(config.base_model_name)
+        model = AutoModelForCausalLM.from_pretrained(
+            config.base_model_name,
+            torch_dtype=torch.float16,
+            device_map="auto"
+        )
+        hf_pipeline = pipeline(
+            "text-generation",
+            model=model,
+            tokenizer=tokenizer,
+            torch_dtype=torch.float16,
+            device_map="auto",
+        )
+        return cls(hf_pipeline, max_workers=config.hf_max_workers, max_queue_size=config.hf_max_queue_size)
+
+    async def _run(self, fn, *args):
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _generation_kwargs(self, max_tokens: int = 256, temperature: float = 0.0, top_p: float = 1.0,
+                           json_schema: Optional[Dict[str, Any]] = None, **extra) -> Dict[str, Any]:
+        # The pipeline has no guided decoding; callers parse and validate JSON output themselves.
+        kwargs = {"max_new_tokens": max_tokens, "return_full_text": False, **extra}
+        if temperature > 0:
+            kwargs.update(do_sample=True, temperature=temperature, top_p=top_p)
+        else:
+            kwargs["do_sample"] = False
+        return kwargs
+
+    async def generate(self, prompt: str, **params) -> str:
+        return (await self.generate_batch([prompt], **params))[0]
+
+    async def generate_batch(self, prompts: List[str], **params) -> List[str]:
+        kwargs = self._generation_kwargs(**params)
+        outputs = await self._run(lambda: self.hf_pipeline(prompts, **kwargs))
+        return [output[0]["generated_text"].strip() for output in outputs]
+
+    async def stream(self, prompt: str, **params) -> AsyncIterator[str]:
+        from transformers import TextStreamer
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        end_of_stream = object()
+
+        class QueueStreamer(TextStreamer):
+            def on_finalized_text(self, text: str, stream_end: bool = False):
+                if text:
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+                if stream_end:
+                    loop.call_soon_threadsafe(queue.put_nowait, end_of_stream)
+
+        streamer = QueueStreamer(self.hf_pipeline.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        kwargs = self._generation_kwargs(**params)
+        generation = asyncio.ensure_future(self._run(lambda: self.hf_pipeline(prompt, streamer=streamer, **kwargs)))
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, generation}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    # Generation finished (or failed) without signalling the end of the stream.
+                    generation.result()
+                    break
+                chunk = getter.result()
+                if chunk is end_of_stream:
+                    break
+                yield chunk
+            await generation
+        finally:
+            if not generation.done():
+                generation.cancel()
+
+    async def score_continuations(self, candidates: List[Tuple[str, str]]) -> List[float]:
+        return await self._run(self._score_continuations_sync, candidates)
+
+    def _score_continuations_sync(self, candidates: List[Tuple[str, str]]) -> List[float]:
+        """Runs one forward pass over all candidates and sums the continuation token logprobs."""
+        import torch
+        model, tokenizer = self.hf_pipeline.model, self.hf_pipeline.tokenizer
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "right"
+
+        prefix_lengths = [len(tokenizer(prompt).input_ids) for prompt, _ in candidates]
+        encoded = tokenizer([prompt + continuation for prompt, continuation in candidates], return_tensors="pt", padding=True)
+        encoded = {key: value.to(model.device) for key, value in encoded.items()}
+        with torch.no_grad():
+            logits = model(**encoded).logits
+        logprobs = torch.log_softmax(logits.float(), dim=-1)
+
+        scores = []
+        for row, prefix_length in enumerate(prefix_lengths):
+            length = int(encoded["attention_mask"][row].sum())
+            targets = encoded["input_ids"][row, prefix_length:length]
+            # The logits at position i predict the token at position i + 1.
+            predicted = logprobs[row, prefix_length - 1:length - 1]
+            scores.append(float(predicted.gather(1, targets.unsqueeze(1)).sum()))
+        return scores
+
+
+class FakeLLMProvider(LLMProvider):
+    """
+    Deterministic backend that loads no model, for load tests and CI. Every call waits
+    latency_ms plus the time to emit its output at tokens_per_second, so the cost of
+    orchestration can be measured independently of model speed.
+
+    Routing prompts are recognised by their "User Query" line and answered from keyword
+    routes: (pattern, agent, tool). Plans use the first matching route that the plan's
+    JSON schema allows and fill the tool arguments from the entity IDs in the question.
+    """
+
+    name = "fake"
+
+    DEFAULT_ROUTES: List[Tuple[str, str, Optional[str]]] = [
+        (r"project|dự án|PROJ-", "LiveERPAgent", "get_tasks_by_project"),
+        (r"task|công việc", "LiveERPAgent", "get_tasks_by_assignee"),
+        (r"calculate|tính", "LiveERPAgent", "perform_calculation"),
+        (r"date|ngày", "LiveERPAgent", "get_current_date"),
+        (r"forecast|revenue|churn|best-selling|dự báo|doanh thu|doanh số", "BusinessIntelligenceAgent", None),
+        (r"^\W*(hi|hello|xin chào)\b", "FallbackAgent", None),
+        (r".", "KnowledgeAgent", None),
+    ]
+
+    _QUESTION_PATTERN = re.compile(r'User Query: "(.*)"', re.DOTALL)
+    _ANSWER_WORDS = "This is a deterministic answer from the fake language model backend .".split()
+
+    def __init__(self, latency_ms: float = 50.0, tokens_per_second: float = 100.0, answer_tokens: int = 64,
+                 routes: Optional[List[Tuple[str, str, Optional[str]]]] = None):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.routes = [(re.compile(pattern, re.IGNORECASE), agent, tool) for pattern, agent, tool in (routes or self.DEFAULT_ROUTES)]
+
+    @classmethod
+    def from_config(cls, config: SystemConfig) -> "FakeLLMProvider":
+        return cls(
+            latency_ms=config.fake_llm_latency_ms,
+            tokens_per_second=config.fake_llm_tokens_per_second,
+            answer_tokens=config.fake_llm_answer_tokens,
+        )
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _tokens(self, prompt: str, max_tokens: int = 256, json_schema: Optional[Dict[str, Any]] = None, **_) -> List[str]:
+        match = self._QUESTION_PATTERN.search(prompt)
+        if match is None:
+            count = min(self.answer_tokens, max_tokens)
+            return [self._ANSWER_WORDS[i % len(self._ANSWER_WORDS)] for i in range(count)]
+        question = match.group(1)
+        if json_schema is not None:
+            return [json.dumps(self._plan(question, json_schema), ensure_ascii=False)]
+        return [self._route(question)[0]]
+
+    def _route(self, question: str) -> Tuple[str, Optional[str]]:
+        for pattern, agent, tool in self.routes:
+            if pattern.search(question):
+                return agent, tool
+        return "FallbackAgent", None
+
+    def _plan(self, question: str, json_schema: Dict[str, Any]) -> Dict[str, Any]:
+        branches = json_schema.get("anyOf", [json_schema])
+        entities = extract_entities(question)
+        for pattern, agent, tool in self.routes:
+            if not pattern.search(question):
+                continue
+            for branch in branches:
+                properties = branch["properties"]
+                if tool is not None and properties["tool"].get("const") == tool:
+                    arguments = {
+                        name: entities[0] if entities else question
+                        for name in properties["arguments"].get("required", [])
+                    }
+                    return {"agent": agent, "tool": tool, "arguments": arguments}
+                if tool is None and agent in properties["agent"].get("enum", []):
+                    return {"agent": agent, "tool": None, "arguments": {}}
+        # No route fits the schema: take its first branch.
+        properties = branches[0]["properties"]
+        agent = properties["agent"].get("const") or properties["agent"]["enum"][-1]
+        tool = properties["tool"].get("const")
+        return {"agent": agent, "tool": tool, "arguments": {}}
+
+    async def generate(self, prompt: str, **params) -> str:
+        tokens = self._tokens(prompt, **params)
+        await asyncio.sleep(self.latency_ms / 1000 + len(tokens) * self._token_delay())
+        self.completion_tokens += len(tokens)
+        return " ".join(tokens)
+
+    async def stream(self, prompt: str, **params) -> AsyncIterator[str]:
+        tokens = self._tokens(prompt, **params)
+        self.completion_tokens += len(tokens)
+        await asyncio.sleep(self.latency_ms / 1000)
+        for position, token in enumerate(tokens):
+            await asyncio.sleep(self._token_delay())
+            yield token if position == 0 else " " + token
+
+    async def score_continuations(self, candidates: List[Tuple[str, str]]) -> List[float]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        scores = []
+        for prompt, continuation in candidates:
+            match = self._QUESTION_PATTERN.search(prompt)
+            agent = self._route(match.group(1))[0] if match else None
+            scores.append(0.0 if continuation == agent else -10.0)
+        return scores
+
+
+def create_llm_provider(config: SystemConfig) -> Optional[LLMProvider]:
+    """
+    Loads the model for config.llm_backend. With "auto", vLLM is preferred and Hugging Face
+    transformers is the fallback. Returns None when no backend can be loaded.
+    """
+    if config.llm_backend == "fake":
+        logger.info("Using the fake LLM backend; no model is loaded.")
+        return FakeLLMProvider.from_config(config)
+    if config.llm_backend == "vllm_offline":
+        try:
+            provider = VLLMOfflineProvider.from_config(config)
+            logger.info(f"VLLM offline model loaded successfully: {config.base_model_name}")
+            return provider
+        except Exception as e:
+            logger.error(f"VLLM offline engine failed to load: {e}")
+            return None
+    if config.llm_backend not in ("auto", "vllm", "hf"):
+        logger.error(f"Unknown llm_backend: '{config.llm_backend}'")
+        return None
 
-    async def generate(self, prompt: str, **kwargs) -> str:
-        # Assuming the pipeline returns a list of dicts, or a single dict
-        result = self.hf_pipeline(prompt, **kwargs)
-        return result[0]['generated_text'] if isinstance(result, list) else result['generated_text']
\ No newline at end of file
+    if config.llm_backend in ("auto", "vllm"):
+        try:
+            provider = VLLMProvider.from_config(config)
+            logger.info(f"VLLM model loaded successfully: {config.base_model_name}")
+            return provider
+        except Exception as e:
+            if config.llm_backend == "vllm":
+                logger.error(f"VLLM failed to load: {e}")
+                return None
+            logger.warning(f"VLLM failed, falling back to Hugging Face transformers: {e}")
+    try:
+        provider = HuggingFaceLLMProvider.from_config(config)
+        logger.info(f"Successfully loaded model '{config.base_model_name}' with Hugging Face transformers.")
+        return provider
+    except Exception as hf_e:
+        logger.error(f"Hugging Face transformers failed to load: {hf_e}")
+        return None
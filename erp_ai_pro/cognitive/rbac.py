@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 """
 Role-Based Access Control (RBAC) for ERP AI Pro
-This file defines the mapping between user roles and the tools they are allowed to access.
+This file defines the mapping between user roles and the tools they are allowed to access,
+and which knowledge documents each role may read.
 """
+from typing import Any, Dict, List, Optional
 
 # Defines which tools are accessible to which user roles.
 # Keys are roles, values are lists of tool names (as strings).
@@ -106,3 +108,53 @@ def get_allowed_tools_for_role(role: str) -> list[str]:
     Falls back to the 'default' role if the specific role is not found.
     """
     return ROLE_TOOL_MAPPING.get(role, ROLE_TOOL_MAPPING.get("default", []))
+
+
+# --- Knowledge document access ---
+# A knowledge document lists the roles that may read it in metadata.authorized_roles;
+# documents without the field are readable by every role, and an empty list leaves them
+# to the roles below only. These roles read everything.
+UNRESTRICTED_DOCUMENT_ROLES = {"admin"}
+
+# Chroma only stores scalar metadata, so authorized_roles is also stored flattened:
+# role_<name> = True per authorized role, and visible_to_all = True for public documents
+# or False for restricted ones.
+ROLE_FIELD_PREFIX = "role_"
+PUBLIC_DOCUMENT_FIELD = "visible_to_all"
+
+def document_roles(metadata: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    The roles that may read a document, from its authorized_roles list or the flattened
+    role fields; None when every role may read it. Only a document without either is
+    public: an empty authorized_roles list means no role besides UNRESTRICTED_DOCUMENT_ROLES.
+    """
+    if "authorized_roles" in metadata:
+        roles = metadata["authorized_roles"]
+        if isinstance(roles, str):
+            roles = [roles]
+        return list(roles or [])
+    if metadata.get(PUBLIC_DOCUMENT_FIELD):
+        return None
+    flattened = [key[len(ROLE_FIELD_PREFIX):] for key, value in metadata.items() if key.startswith(ROLE_FIELD_PREFIX) and value is True]
+    if flattened or PUBLIC_DOCUMENT_FIELD in metadata:
+        return flattened
+    return None
+
+def role_metadata_fields(metadata: Dict[str, Any]) -> Dict[str, bool]:
+    """The flattened role fields of a document, for stores without list-valued metadata."""
+    roles = document_roles(metadata)
+    if roles is None:
+        return {PUBLIC_DOCUMENT_FIELD: True}
+    return {PUBLIC_DOCUMENT_FIELD: False, **{f"{ROLE_FIELD_PREFIX}{role}": True for role in roles}}
+
+def can_read_document(role: Optional[str], metadata: Dict[str, Any]) -> bool:
+    if role is None or role in UNRESTRICTED_DOCUMENT_ROLES:
+        return True
+    roles = document_roles(metadata)
+    return roles is None or role in roles
+
+def document_filter(role: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The Chroma `where` filter selecting the documents the role may read; None for no filter."""
+    if role is None or role in UNRESTRICTED_DOCUMENT_ROLES:
+        return None
+    return {"$or": [{f"{ROLE_FIELD_PREFIX}{role}": True}, {PUBLIC_DOCUMENT_FIELD: True}]}
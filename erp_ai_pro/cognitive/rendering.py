@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Response Rendering for ERP AI Pro
+Turns the structured outputs of LiveERPAgent tools into answers in the user's language
+(Vietnamese or English) through per-tool templates that are compiled and checked against
+the tools' output models at import time. Simple ERP lookups and updates are therefore
+answered with zero generated tokens; the LLM only phrases results that combine several
+tool calls, and only when one is configured for it.
+"""
+
+import json
+import re
+import string
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import structlog
+from pydantic import BaseModel
+from prometheus_client import Counter
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.cache import fold_diacritics
+from erp_ai_pro.cognitive.llm_providers import LLMProvider
+from erp_ai_pro.cognitive.tracing import span
+from erp_ai_pro.tools import tools
+
+logger = structlog.get_logger()
+
+# Metrics
+responses_rendered = Counter('erp_ai_responses_rendered_total', 'Tool answers by how they were rendered', ['method'])
+
+LANGUAGES = ("vi", "en")
+
+# Unaccented Vietnamese words common in ERP questions, for questions typed without diacritics.
+# Words that are also English or Latin ("an", "la", "du", "ton", "cap") are left out.
+_VIETNAMESE_WORDS = {
+    "toi", "cua", "cong", "viec", "nhiem", "vu", "hom", "nay", "ngay", "bao", "nhieu",
+    "tao", "nhat", "trang", "thai", "tinh", "cho", "cac", "nhung", "gi", "xem", "kho",
+}
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Task statuses are stored in Vietnamese.
+_STATUS_EN = {"Mới tạo": "New", "Đang làm": "In progress", "Hoàn thành": "Done", "Tạm dừng": "On hold"}
+_MISSING = {"vi": "chưa có", "en": "none"}
+
+
+def detect_language(question: str) -> str:
+    """'vi' for questions with Vietnamese diacritics or at least two common unaccented Vietnamese words, else 'en'."""
+    if fold_diacritics(question) != question:
+        return "vi"
+    words = _WORD_PATTERN.findall(question.casefold())
+    return "vi" if sum(word in _VIETNAMESE_WORDS for word in words) >= 2 else "en"
+
+
+@dataclass(frozen=True)
+class ToolTemplate:
+    """
+    Answer patterns of one tool in one language, in str.format syntax over the fields of
+    the tool's output model. Outputs with a list field (items_field) render `item` once
+    per element into {items}, with {count} set, or `empty` when the list is empty.
+    """
+    text: str
+    item: str = ""
+    empty: str = ""
+    items_field: str = ""
+
+
+TEMPLATES: Dict[str, Dict[str, ToolTemplate]] = {
+    "get_current_date": {
+        "vi": ToolTemplate("Hôm nay là ngày {date}."),
+        "en": ToolTemplate("Today's date is {date}."),
+    },
+    "perform_calculation": {
+        "vi": ToolTemplate("Kết quả của {expression} là {result}."),
+        "en": ToolTemplate("{expression} = {result}."),
+    },
+    "create_task": {
+        "vi": ToolTemplate("Đã tạo công việc {task_id} \"{title}\" và giao cho {assignee_id}."),
+        "en": ToolTemplate("Created task {task_id} \"{title}\" and assigned it to {assignee_id}."),
+    },
+    "update_task_status": {
+        "vi": ToolTemplate("Đã cập nhật công việc {task_id} sang trạng thái \"{new_status}\"."),
+        "en": ToolTemplate("Task {task_id} is now \"{new_status}\"."),
+    },
+    "get_tasks_by_assignee": {
+        "vi": ToolTemplate(
+            "{assignee_id} có {count} công việc:\n{items}",
+            item="- {task_id}: {title} (dự án: {project_id}, trạng thái: {status})",
+            empty="Không tìm thấy công việc nào của {assignee_id}.",
+            items_field="tasks",
+        ),
+        "en": ToolTemplate(
+            "{assignee_id} has {count} task(s):\n{items}",
+            item="- {task_id}: {title} (project: {project_id}, status: {status})",
+            empty="No tasks found for {assignee_id}.",
+            items_field="tasks",
+        ),
+    },
+    "get_tasks_by_project": {
+        "vi": ToolTemplate(
+            "Dự án {project_id} có {count} công việc:\n{items}",
+            item="- {task_id}: {title} (người phụ trách: {assignee_id}, trạng thái: {status})",
+            empty="Dự án {project_id} chưa có công việc nào.",
+            items_field="tasks",
+        ),
+        "en": ToolTemplate(
+            "Project {project_id} has {count} task(s):\n{items}",
+            item="- {task_id}: {title} (assignee: {assignee_id}, status: {status})",
+            empty="No tasks found for project {project_id}.",
+            items_field="tasks",
+        ),
+    },
+}
+
+# Output models of the tools that have templates, to check the templates against.
+_OUTPUT_SCHEMAS: Dict[str, type] = {
+    "get_current_date": tools.CurrentDateOutput,
+    "perform_calculation": tools.CalculationOutput,
+    "create_task": tools.TaskCreatedOutput,
+    "update_task_status": tools.TaskStatusUpdatedOutput,
+    "get_tasks_by_assignee": tools.TasksByAssigneeOutput,
+    "get_tasks_by_project": tools.TasksByProjectOutput,
+}
+
+
+class CompiledTemplate:
+    """A ToolTemplate bound to its output model, with every field reference checked once."""
+
+    def __init__(self, template: ToolTemplate, output_schema: type):
+        self.template = template
+        self.text = self._compile(template.text, output_schema, {"items", "count"} if template.items_field else set())
+        self.empty = self._compile(template.empty, output_schema) if template.empty else None
+        self.item = None
+        if template.items_field:
+            item_schema = output_schema.model_fields[template.items_field].annotation.__args__[0]
+            self.item = self._compile(template.item, item_schema)
+
+    @staticmethod
+    def _compile(pattern: str, schema: type, extra: set = frozenset()) -> Callable[[Dict[str, Any]], str]:
+        fields = {name for _, name, _, _ in string.Formatter().parse(pattern) if name}
+        unknown = fields - set(schema.model_fields) - set(extra)
+        if unknown:
+            raise ValueError(f"Template '{pattern}' refers to unknown fields {sorted(unknown)} of {schema.__name__}.")
+        return pattern.format_map
+
+    def render(self, output: BaseModel, language: str) -> str:
+        values = _display_values(output, language)
+        if not self.template.items_field:
+            return self.text(values)
+        items = getattr(output, self.template.items_field)
+        if not items and self.empty:
+            return self.empty(values)
+        lines = [self.item(_display_values(item, language)) for item in items]
+        return self.text({**values, "items": "\n".join(lines), "count": len(lines)})
+
+
+def _display_values(model: BaseModel, language: str) -> Dict[str, Any]:
+    values = {}
+    for name in type(model).model_fields:
+        value = getattr(model, name)
+        if value is None:
+            value = _MISSING[language]
+        elif language == "en" and name in ("status", "new_status"):
+            value = _STATUS_EN.get(value, value)
+        values[name] = value
+    return values
+
+
+def _compile_templates() -> Dict[Tuple[str, str], CompiledTemplate]:
+    compiled = {}
+    for tool_name, by_language in TEMPLATES.items():
+        for language, template in by_language.items():
+            compiled[(tool_name, language)] = CompiledTemplate(template, _OUTPUT_SCHEMAS[tool_name])
+    return compiled
+
+
+_COMPILED = _compile_templates()
+
+
+def render_tool_output(tool_name: str, output: Any, language: str) -> Optional[str]:
+    """Renders one tool output from its template; None when the tool has no template for it."""
+    if isinstance(output, str):
+        # Tools that still answer in text (the placeholders) are shown as they are.
+        return output
+    compiled = _COMPILED.get((tool_name, language))
+    if compiled is None or not isinstance(output, BaseModel):
+        return None
+    return compiled.render(output, language)
+
+
+class ResponseRenderer:
+    """
+    Renders tool results as the answer to a question. One templated result is rendered
+    directly; several results are phrased together by the LLM when llm is given (the
+    cascade's small model, if any), and otherwise joined from their templates.
+    """
+
+    def __init__(self, config: SystemConfig, llm: Optional[LLMProvider] = None):
+        self.language = config.response_language
+        self.llm = llm if config.response_llm_rendering else None
+        self.max_tokens = config.response_llm_max_tokens
+
+    def language_for(self, question: str) -> str:
+        return self.language if self.language in LANGUAGES else detect_language(question)
+
+    async def render(self, question: str, results: List[Tuple[str, Any]]) -> Tuple[str, str]:
+        """
+        Renders (tool_name, output) results for the question.
+        Returns (answer, method), method being "template", "llm" or "raw".
+        """
+        language = self.language_for(question)
+        texts = [render_tool_output(tool_name, output, language) for tool_name, output in results]
+
+        method = "template" if all(text is not None for text in texts) else "raw"
+        if len(results) > 1 and self.llm is not None:
+            try:
+                with span("render", method="llm", results=len(results)):
+                    answer = await self.llm.generate(
+                        self._build_prompt(question, results, language), temperature=0.2, max_tokens=self.max_tokens
+                    )
+                responses_rendered.labels(method="llm").inc()
+                return answer.strip(), "llm"
+            except Exception as e:
+                logger.warning(f"LLM rendering failed, joining the templated results instead: {e}")
+
+        answer = "\n\n".join(
+            text if text is not None else _raw_text(output) for text, (_, output) in zip(texts, results)
+        )
+        responses_rendered.labels(method=method).inc()
+        return answer, method
+
+    @staticmethod
+    def _build_prompt(question: str, results: List[Tuple[str, Any]], language: str) -> str:
+        data = json.dumps(
+            [{"tool": tool_name, "output": _jsonable(output)} for tool_name, output in results],
+            ensure_ascii=False, default=str,
+        )
+        answer_language = "Vietnamese" if language == "vi" else "English"
+        return (
+            "You are an ERP assistant. Answer the user's question using only the ERP tool results below.\n"
+            f"Tool results (JSON): {data}\n"
+            f"User question: {question}\n"
+            f"Answer briefly in {answer_language}:"
+        )
+
+
+def _jsonable(output: Any) -> Any:
+    return output.model_dump() if isinstance(output, BaseModel) else output
+
+
+def _raw_text(output: Any) -> str:
+    if isinstance(output, BaseModel):
+        return json.dumps(output.model_dump(), ensure_ascii=False, default=str)
+    return str(output)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Cross-Encoder Reranking for ERP AI Pro
+Scores (question, passage) pairs of the retrieved candidates with a cross-encoder in one
+batched forward pass and keeps the best ones, so fewer and more relevant passages reach
+the LLM prompt.
+
+Scores are cached per (normalized question, chunk). Scoring runs on a dedicated thread;
+when the estimated time for a rerank, counting the pairs already queued ahead of it,
+exceeds the latency budget, reranking is skipped and the candidates keep their retrieval
+order. While it is skipped, one rerank with nothing queued ahead is let through every
+probe interval to re-measure, so a single slow batch cannot turn reranking off for good.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import structlog
+from prometheus_client import Counter, Histogram
+
+from erp_ai_pro.cognitive.cache import TTLCache, cache_hits, cache_misses, normalize_question
+from erp_ai_pro.cognitive.retrieval import document_key
+
+logger = structlog.get_logger()
+
+# Metrics
+rerank_outcomes = Counter('erp_ai_rerank_total', 'Rerank requests by outcome', ['outcome'])
+rerank_pairs = Histogram(
+    'erp_ai_rerank_scored_pairs', 'Pairs scored by the cross-encoder per rerank',
+    buckets=(1, 5, 10, 20, 50, 100)
+)
+
+# A scorer maps (question, passage) pairs to relevance scores, higher is more relevant.
+Scorer = Callable[[List[Tuple[str, str]]], List[float]]
+
+
+def load_cross_encoder(model_name: str, batch_size: int = 32) -> Scorer:
+    """Loads a sentence-transformers CrossEncoder and returns a batched scorer for it."""
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(model_name)
+
+    def scorer(pairs: List[Tuple[str, str]]) -> List[float]:
+        return [float(score) for score in model.predict(pairs, batch_size=batch_size, show_progress_bar=False)]
+
+    logger.info(f"Cross-encoder loaded: {model_name}")
+    return scorer
+
+
+class CrossEncoderReranker:
+    """
+    Reorders retrieved documents by cross-encoder relevance. The cost of one pair is
+    tracked as a moving average and drives the latency-budget check.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        scorer: Optional[Scorer] = None,
+        batch_size: int = 32,
+        cache_size: int = 50000,
+        cache_ttl: float = 3600,
+        max_latency_ms: float = 250.0,
+        initial_pair_ms: float = 2.0,
+        probe_interval_seconds: float = 30.0,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.scorer = scorer
+        self.scores = TTLCache(cache_size, cache_ttl)
+        self.max_latency = max_latency_ms / 1000
+        self.pair_seconds = initial_pair_ms / 1000
+        self.probe_interval = probe_interval_seconds
+        # When the cross-encoder last scored pairs; probes are timed from it.
+        self.scored_at = time.monotonic()
+        # Pairs submitted to the scoring thread and not yet scored.
+        self.pending_pairs = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._load_lock = threading.Lock()
+
+    def load(self) -> Scorer:
+        """Loads the cross-encoder on first use; blocking."""
+        with self._load_lock:
+            if self.scorer is None:
+                self.scorer = load_cross_encoder(self.model_name, self.batch_size)
+        return self.scorer
+
+    def estimated_seconds(self, pairs: int) -> float:
+        """Expected time to score this many new pairs behind the ones already queued."""
+        return (self.pending_pairs + pairs) * self.pair_seconds
+
+    async def rerank(self, question: str, documents: List[Dict[str, Any]], top_k: int) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Returns the top_k documents by relevance, and the outcome: "reranked", "cached"
+        (every score came from the cache), "skipped" (over the latency budget), "error",
+        or "trivial" (at most one document, nothing to reorder).
+        Skipped and failed reranks return the first top_k documents in retrieval order.
+        """
+        if len(documents) <= 1:
+            return documents[:top_k], "trivial"
+
+        # Diacritics kept: "giá bán" and "giá bàn" are scored separately.
+        normalized = normalize_question(question, mask_entities=False, fold_accents=False)
+        keys = [f"{normalized}\x00{document_key(document)}" for document in documents]
+        scores: List[Optional[float]] = [self.scores.get(key) for key in keys]
+        missing = [index for index, score in enumerate(scores) if score is None]
+        if len(missing) < len(documents):
+            cache_hits.labels(cache="rerank", tier="local").inc(len(documents) - len(missing))
+        outcome = "cached"
+
+        if missing:
+            cache_misses.labels(cache="rerank").inc(len(missing))
+            expected = self.estimated_seconds(len(missing))
+            if expected > self.max_latency and not self._probe_due():
+                rerank_outcomes.labels(outcome="skipped").inc()
+                logger.info(f"Skipping rerank: {expected * 1000:.0f}ms expected exceeds the {self.max_latency * 1000:.0f}ms budget.")
+                return documents[:top_k], "skipped"
+
+            pairs = [(question, documents[index]["page_content"]) for index in missing]
+            self.pending_pairs += len(pairs)
+            try:
+                loop = asyncio.get_running_loop()
+                new_scores, seconds = await loop.run_in_executor(self._executor, self._score, pairs)
+            except Exception as e:
+                rerank_outcomes.labels(outcome="error").inc()
+                logger.warning(f"Rerank failed, keeping retrieval order: {e}")
+                return documents[:top_k], "error"
+            finally:
+                self.pending_pairs -= len(pairs)
+                self.scored_at = time.monotonic()
+
+            if expected > self.max_latency:
+                # A probe replaces the estimate it was sent to check.
+                self.pair_seconds = seconds / len(pairs)
+            else:
+                self.pair_seconds = 0.8 * self.pair_seconds + 0.2 * seconds / len(pairs)
+            rerank_pairs.observe(len(pairs))
+            for index, score in zip(missing, new_scores):
+                scores[index] = score
+                self.scores.set(keys[index], score)
+            outcome = "reranked"
+
+        rerank_outcomes.labels(outcome=outcome).inc()
+        order = sorted(range(len(documents)), key=lambda index: scores[index], reverse=True)
+        return [documents[index] for index in order[:top_k]], outcome
+
+    def _probe_due(self) -> bool:
+        """True when an over-budget rerank should run anyway to re-measure the pair cost."""
+        return self.pending_pairs == 0 and time.monotonic() - self.scored_at >= self.probe_interval
+
+    def _score(self, pairs: List[Tuple[str, str]]) -> Tuple[List[float], float]:
+        scorer = self.load()
+        start = time.perf_counter()
+        scores = scorer(pairs)
+        return scores, time.perf_counter() - start
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Answer cache for ERP AI Pro.
+Serves repeated questions from a role before any routing, retrieval or generation:
+an exact tier keyed on (knowledge base version, role, normalized question) and a
+semantic tier that maps paraphrases to an exact entry by embedding similarity.
+Entries never cross roles and expire with a per-agent TTL.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import structlog
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.cache import RedisCache, TieredCache, TTLCache, cache_hits, extract_entities, normalize_question
+from erp_ai_pro.cognitive.embeddings import Encoder, load_sentence_encoder, normalize_rows
+
+logger = structlog.get_logger()
+
+
+class SemanticIndex:
+    """
+    In-process embedding index of cached questions, partitioned by role. Each entry points
+    at an exact-tier key, so the answer itself can live in the shared tier.
+    """
+
+    def __init__(self, max_entries_per_role: int = 2000):
+        self.max_entries_per_role = max_entries_per_role
+        # role -> entries of (exact key, entities, expires_at), and their stacked vectors
+        self._entries: Dict[str, List[Tuple[str, List[str], float]]] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+
+    def add(self, role: str, vector: np.ndarray, key: str, entities: List[str], ttl: float):
+        entries = self._entries.setdefault(role, [])
+        vectors = self._vectors.get(role)
+        entries.append((key, entities, time.monotonic() + ttl))
+        vectors = vector[None, :] if vectors is None else np.vstack([vectors, vector])
+        if len(entries) > self.max_entries_per_role:
+            del entries[0]
+            vectors = vectors[1:]
+        self._vectors[role] = vectors
+
+    def search(self, role: str, vector: np.ndarray, entities: List[str], min_similarity: float) -> Optional[str]:
+        """
+        Returns the key of the most similar live entry for this role. Entity IDs must match
+        exactly: "stock of PROD001" and "stock of PROD002" embed almost identically.
+        """
+        vectors = self._vectors.get(role)
+        if vectors is None:
+            return None
+        now = time.monotonic()
+        similarities = vectors @ vector
+        for index in np.argsort(-similarities):
+            if similarities[index] < min_similarity:
+                break
+            key, entry_entities, expires_at = self._entries[role][index]
+            if expires_at > now and entry_entities == entities:
+                return key
+        return None
+
+    def clear(self):
+        self._entries.clear()
+        self._vectors.clear()
+
+
+class ResponseCache:
+    """
+    Caches MainSystem.query results per role.
+
+    Args:
+        config: Cache size, TTLs, similarity threshold and Redis settings.
+        version: Returns the current knowledge base version; changing it invalidates every entry.
+        encoder: Sentence encoder for the semantic tier; defaults to config.embedding_model_name.
+    """
+
+    def __init__(self, config: SystemConfig, version: Callable[[], str] = lambda: "", encoder: Optional[Encoder] = None):
+        self.config = config
+        self.version = version
+        self.agent_ttls = dict(config.response_cache_ttls)
+        shared = None
+        if config.response_cache_shared:
+            shared = RedisCache(config.redis_url, prefix="erp_ai:answer", ttl=config.cache_ttl)
+        self.exact = TieredCache("response", TTLCache(config.response_cache_size, config.cache_ttl), shared)
+        self.semantic = SemanticIndex() if config.response_cache_semantic_enabled else None
+        self._encoder = encoder
+        self._indexed_version: Optional[str] = None
+
+    def _encode(self, question: str) -> Optional[np.ndarray]:
+        try:
+            if self._encoder is None:
+                self._encoder = load_sentence_encoder(self.config.embedding_model_name)
+            return normalize_rows(self._encoder([question]))[0]
+        except Exception as e:
+            logger.warning(f"Semantic answer cache unavailable, using exact matches only: {e}")
+            self.semantic = None
+            return None
+
+    def _current_version(self) -> str:
+        version = self.version()
+        if version != self._indexed_version:
+            # Entries of the previous version are unreachable through their keys;
+            # drop the semantic index that points at them.
+            if self.semantic is not None:
+                self.semantic.clear()
+            self._indexed_version = version
+        return version
+
+    async def get(self, role: str, question: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Returns (response, tier) for a cached answer to this role's question, or None."""
+        version = self._current_version()
+        response = await self.exact.get(self._key(version, role, question))
+        if response is not None:
+            return response, "exact"
+        if self.semantic is None:
+            return None
+
+        loop = asyncio.get_running_loop()
+        vector = await loop.run_in_executor(None, self._encode, question)
+        if vector is None or self.semantic is None:
+            return None
+        key = self.semantic.search(role, vector, extract_entities(question), self.config.response_cache_similarity)
+        if key is None:
+            return None
+        response = self.exact.local.get(key)
+        if response is None and self.exact.shared is not None:
+            response = await self.exact.shared.get(key)
+        if response is None:
+            return None
+        cache_hits.labels(cache="response", tier="semantic").inc()
+        return response, "semantic"
+
+    async def set(self, role: str, question: str, response: Dict[str, Any]):
+        """
+        Stores a successful response if its agent's answers are cacheable. FallbackAgent
+        answers are never stored: they also stand in for routing and agent failures.
+        """
+        agent = response.get("chosen_agent")
+        ttl = self.agent_ttls.get(agent)
+        if not ttl or agent == "FallbackAgent" or "error" in response:
+            return
+        key = self._key(self._current_version(), role, question)
+        await self.exact.set(key, dict(response), ttl)
+        if self.semantic is not None:
+            loop = asyncio.get_running_loop()
+            vector = await loop.run_in_executor(None, self._encode, question)
+            if vector is not None and self.semantic is not None:
+                self.semantic.add(role, vector, key, extract_entities(question), ttl)
+
+    @staticmethod
+    def _key(version: str, role: str, question: str) -> str:
+        # Diacritics change the meaning of Vietnamese words ("mua" buy, "mưa" rain); the
+        # semantic tier is the fuzzy one.
+        return f"{version}:{role}:{normalize_question(question, mask_entities=False, fold_accents=False)}"
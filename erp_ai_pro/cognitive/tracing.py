@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Request Tracing for ERP AI Pro
+Lightweight in-process spans for the stages of a query: cache, routing, retrieval, LLM
+generation and tool execution. Every span feeds the erp_ai_stage_duration_seconds
+histogram; spans opened inside a trace are also collected into it and handed to an
+exporter when the trace ends.
+
+The current trace and span live in context variables, so asyncio tasks started while a
+span is open (speculative retrieval, gathered calls) record into the same trace.
+"""
+
+import json
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+import structlog
+from prometheus_client import Histogram
+
+logger = structlog.get_logger()
+
+# Metrics
+stage_duration = Histogram(
+    'erp_ai_stage_duration_seconds', 'Time spent in one stage of a query', ['stage', 'agent', 'tool'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("erp_ai_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("erp_ai_span", default=None)
+
+
+class Span:
+    """
+    Times one stage. Use as a (synchronous) context manager, also around awaits:
+
+        with span("retrieval", agent="KnowledgeAgent"):
+            documents = await self.retrieve(question, role)
+    """
+
+    def __init__(self, stage: str, agent: str = "", tool: str = "", **attributes: Any):
+        self.stage = stage
+        self.agent = agent
+        self.tool = tool
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id: Optional[str] = None
+        self.start = 0.0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        self._trace: Optional[Trace] = None
+        self._token = None
+
+    def set(self, **attributes: Any):
+        """Adds attributes known only once the stage has run, e.g. the routing method."""
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self._trace = _current_trace.get()
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Closed from another context, e.g. an abandoned async generator being finalized.
+            pass
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        stage_duration.labels(stage=self.stage, agent=self.agent, tool=self.tool).observe(self.duration)
+        if self._trace is not None:
+            self._trace.record(self)
+        return False
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        entry: Dict[str, Any] = {
+            "stage": self.stage,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+        }
+        if self.agent:
+            entry["agent"] = self.agent
+        if self.tool:
+            entry["tool"] = self.tool
+        if self.attributes:
+            entry["attributes"] = self.attributes
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+
+def span(stage: str, agent: str = "", tool: str = "", **attributes: Any) -> Span:
+    return Span(stage, agent=agent, tool=tool, **attributes)
+
+
+class Trace:
+    """The spans of one request, in the order they finished."""
+
+    def __init__(self, name: str, on_end: Optional[Callable[["Trace"], None]] = None, **attributes: Any):
+        self.name = name
+        self.on_end = on_end
+        self.attributes = attributes
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self.start = 0.0
+        self.duration = 0.0
+        self._token = None
+
+    def record(self, finished: Span):
+        self.spans.append(finished)
+
+    def __enter__(self) -> "Trace":
+        self._token = _current_trace.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current_trace.reset(self._token)
+        if self.on_end is not None:
+            self.on_end(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        duration = self.duration or time.perf_counter() - self.start
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "duration_ms": round(duration * 1000, 3),
+            "spans": [finished.to_dict(self.start) for finished in self.spans],
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+# --- Exporters ---
+
+class TraceExporter:
+    """Receives every finished trace. Exporters must not raise."""
+
+    def export(self, trace: Trace):
+        raise NotImplementedError
+
+
+class NullExporter(TraceExporter):
+    """Discards traces; the stage histograms are still recorded."""
+
+    def export(self, trace: Trace):
+        pass
+
+
+class StreamExporter(TraceExporter):
+    """Writes each trace as one JSON line to a text stream (stdout by default)."""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class FileExporter(StreamExporter):
+    """Appends each trace as one JSON line to a local file."""
+
+    def __init__(self, path: str):
+        super().__init__(open(path, "a", encoding="utf-8"))
+        self.path = path
+
+
+def create_trace_exporter(name: str, path: str = "traces.jsonl") -> TraceExporter:
+    """Builds the exporter named by SystemConfig.trace_exporter: "none", "stdout" or "file"."""
+    if name == "stdout":
+        return StreamExporter()
+    if name == "file":
+        return FileExporter(path)
+    if name not in ("", "none"):
+        logger.warning(f"Unknown trace exporter '{name}', traces will not be exported.")
+    return NullExporter()
+
+
+class Tracer:
+    """Starts traces and hands them to the exporter when they end."""
+
+    def __init__(self, exporter: Optional[TraceExporter] = None):
+        self.exporter = exporter or NullExporter()
+
+    def trace(self, name: str, **attributes: Any) -> Trace:
+        """A trace to use as a context manager; spans opened inside it are collected."""
+        return Trace(name, on_end=self.export, **attributes)
+
+    def export(self, trace: Trace):
+        try:
+            self.exporter.export(trace)
+        except Exception as e:
+            logger.warning(f"Trace export failed: {e}")
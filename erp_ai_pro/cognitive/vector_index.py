@@ -0,0 +1,512 @@
+# -*- coding: utf-8 -*-
+"""
+Native Vector Index for ERP AI Pro
+A vector store backend whose embeddings live in memory-mapped .npy files, so every uvicorn
+worker on a host shares one copy through the page cache instead of loading its own index.
+
+Storage is float32, float16 or int8 (per-row symmetric quantization). int8 search scans
+the codes and rescores the best candidates against float16 vectors. The index is either
+flat (exact scan) or IVF: rows are grouped by k-means list and stored contiguously, so a
+search scans only the nprobe lists closest to the query. All scoring is vectorized NumPy
+over fixed-size blocks of rows; vectors are L2-normalized, so scores are cosine similarities.
+
+An index directory holds immutable versions and a CURRENT file naming the active one.
+A new version is written next to the old one and published by atomically replacing
+CURRENT, so readers never see a half-written index. A version may also carry the
+manifest of the knowledge base documents it was built from (see indexing.py).
+
+Each version stores per-role posting lists: the sorted rows every role may read, from the
+documents' authorized_roles (see rbac.py). A search on behalf of a role scans only those
+rows, and an IVF search keeps probing lists until it has enough of them, so narrowly
+scoped roles still get k results.
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from erp_ai_pro.cognitive.embeddings import Encoder, normalize_rows
+from erp_ai_pro.cognitive.rbac import UNRESTRICTED_DOCUMENT_ROLES, document_roles
+
+logger = structlog.get_logger()
+
+INDEX_FORMAT = 1
+DTYPES = ("float32", "float16", "int8")
+INDEX_TYPES = ("flat", "ivf")
+SOURCE_MANIFEST = "index_manifest.json"
+# Posting list of the documents every role may read.
+PUBLIC_ROLE = "*"
+_BLOCK_ROWS = 4096
+# The float32 vectors of a version being written, before they are normalized and stored.
+STAGING_VECTORS = "staging.npy"
+
+
+@dataclass
+class StoredDocument:
+    """A search result, shaped like the LangChain documents the vector store returns."""
+    page_content: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    id: str = ""
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-row symmetric int8 quantization: vectors ~= codes * scales[:, None]."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10, sample_size: int = 100000, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on (a sample of) normalized vectors; returns (nlist, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignment = assign_lists(vectors, centroids)
+        for list_id in range(nlist):
+            members = vectors[assignment == list_id]
+            if len(members):
+                centroids[list_id] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """The nearest centroid of every vector, computed in blocks."""
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + _BLOCK_ROWS], dtype=np.float32)
+        assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def role_postings(metadatas: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Sorted rows per authorized role, and the rows of public documents under PUBLIC_ROLE."""
+    postings: Dict[str, List[int]] = {PUBLIC_ROLE: []}
+    for row, metadata in enumerate(metadatas):
+        roles = document_roles(metadata or {})
+        for role in [PUBLIC_ROLE] if roles is None else roles:
+            postings.setdefault(role, []).append(row)
+    return {role: np.asarray(rows, dtype=np.int32) for role, rows in postings.items()}
+
+
+def write_index(
+    path: str,
+    ids: Sequence[str],
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    vectors: np.ndarray,
+    dtype: str = "int8",
+    index_type: str = "flat",
+    nlist: int = 0,
+    model_name: str = "",
+    keep_versions: int = 2,
+    source_manifest: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Writes a new index version under path from in-memory documents and vectors and makes
+    it the current one; see IndexWriter. Returns the new version name.
+    """
+    if not (len(ids) == len(texts) == len(metadatas) == len(vectors)):
+        raise ValueError("ids, texts, metadatas and vectors must have the same length.")
+    writer = IndexWriter(path, dtype, index_type, nlist, model_name, keep_versions)
+    try:
+        for document_id, text, metadata in zip(ids, texts, metadatas):
+            writer.add(document_id, text, metadata)
+        if len(vectors):
+            vectors = np.asarray(vectors, dtype=np.float32)
+            writer.allocate(vectors.shape[1])[:] = vectors
+        return writer.finish(source_manifest)
+    except BaseException:
+        writer.abort()
+        raise
+
+
+class IndexWriter:
+    """
+    Writes a new index version in a stream. Documents are appended to documents.jsonl as
+    they are added. Once all are added, allocate() maps a float32 staging matrix with a row
+    per document in the version directory, for the caller to fill. finish() normalizes,
+    (for IVF) reorders and stores the vectors block by block, so the whole matrix is never
+    held in memory, then publishes the version. nlist=0 picks about sqrt(n) IVF lists.
+    source_manifest, if given, is stored in the version as SOURCE_MANIFEST and so published
+    together with the vectors. Older versions beyond keep_versions are removed; readers
+    that still map them keep working, as the files stay alive until they are unmapped.
+    """
+
+    def __init__(self, path: str, dtype: str = "int8", index_type: str = "flat", nlist: int = 0,
+                 model_name: str = "", keep_versions: int = 2):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown vector index dtype '{dtype}', expected one of {DTYPES}.")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown vector index type '{index_type}', expected one of {INDEX_TYPES}.")
+        self.root = Path(path)
+        self.dtype = dtype
+        self.index_type = index_type
+        self.nlist = nlist
+        self.model_name = model_name
+        self.keep_versions = keep_versions
+        self.version = f"v{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.directory = self.root / self.version
+        self.directory.mkdir(parents=True)
+        self.count = 0
+        self.vectors: Optional[np.ndarray] = None
+        self._documents = open(self.directory / "documents.jsonl", "wb")
+        # Byte offset of every document line, to read documents back and to reorder them.
+        self._offsets = array("q")
+        self._postings: Dict[str, List[int]] = {PUBLIC_ROLE: []}
+
+    def add(self, document_id: str, text: str, metadata: Optional[Dict[str, Any]]) -> int:
+        """Appends a document and returns its row."""
+        self._offsets.append(self._documents.tell())
+        line = json.dumps({"id": document_id, "page_content": text, "metadata": metadata or {}}, ensure_ascii=False)
+        self._documents.write(line.encode("utf-8") + b"\n")
+        roles = document_roles(metadata or {})
+        for role in [PUBLIC_ROLE] if roles is None else roles:
+            self._postings.setdefault(role, []).append(self.count)
+        self.count += 1
+        return self.count - 1
+
+    def document(self, row: int) -> Dict[str, Any]:
+        """A document added earlier, read back from documents.jsonl."""
+        self._documents.flush()
+        with open(self.directory / "documents.jsonl", "rb") as f:
+            f.seek(self._offsets[row])
+            return json.loads(f.readline())
+
+    def allocate(self, dim: int) -> np.ndarray:
+        """The (count, dim) float32 matrix of the added documents' vectors, memory-mapped."""
+        self.vectors = np.lib.format.open_memmap(
+            self.directory / STAGING_VECTORS, mode="w+", dtype=np.float32, shape=(self.count, dim))
+        return self.vectors
+
+    def finish(self, source_manifest: Optional[Dict[str, Any]] = None) -> str:
+        """Stores the vectors and the manifest, publishes the version and returns its name."""
+        self._documents.close()
+        if self.count and self.vectors is None:
+            raise ValueError("The vectors of the added documents were not allocated.")
+        vectors = self.vectors if self.count else np.zeros((0, 0), dtype=np.float32)
+        for start in range(0, self.count, _BLOCK_ROWS):
+            vectors[start:start + _BLOCK_ROWS] = normalize_rows(vectors[start:start + _BLOCK_ROWS])
+
+        order = np.arange(self.count)
+        manifest: Dict[str, Any] = {
+            "format": INDEX_FORMAT,
+            "count": self.count,
+            "dim": int(vectors.shape[1]) if self.count else 0,
+            "dtype": self.dtype,
+            "index_type": self.index_type,
+            "model_name": self.model_name,
+            "created_at": time.time(),
+        }
+        if self.index_type == "ivf" and self.count:
+            nlist = min(self.nlist or max(1, int(np.sqrt(self.count))), self.count)
+            centroids = kmeans(vectors, nlist)
+            assignment = assign_lists(vectors, centroids)
+            # Rows of one list are stored together, so probing a list reads one contiguous slice.
+            order = np.argsort(assignment, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))]).astype(np.int64)
+            np.save(self.directory / "centroids.npy", centroids)
+            np.save(self.directory / "list_offsets.npy", offsets)
+            manifest["nlist"] = nlist
+            self._reorder_documents(order)
+
+        self._store_vectors(vectors, order)
+        self.vectors = vectors = None
+        (self.directory / STAGING_VECTORS).unlink(missing_ok=True)
+
+        # Posting lists are stored back to back in role_rows.npy; the manifest has each one's range.
+        rows = np.empty(self.count, dtype=np.int64)
+        rows[order] = np.arange(self.count)
+        postings = [np.sort(rows[np.asarray(members, dtype=np.int64)]) for members in self._postings.values()]
+        offsets, start = {}, 0
+        for role, members in zip(self._postings, postings):
+            offsets[role] = [start, start + len(members)]
+            start += len(members)
+        np.save(self.directory / "role_rows.npy", np.concatenate(postings).astype(np.int32))
+        manifest["roles"] = offsets
+        with open(self.directory / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        if source_manifest is not None:
+            with open(self.directory / SOURCE_MANIFEST, "w", encoding="utf-8") as f:
+                json.dump(source_manifest, f, ensure_ascii=False)
+
+        publish_version(self.root, self.version)
+        _remove_old_versions(self.root, self.keep_versions)
+        logger.info(f"Vector index version {self.version} written to {self.root}: {self.count} vectors, "
+                    f"{self.dtype}, {self.index_type}.")
+        return self.version
+
+    def abort(self):
+        """Drops the unpublished version."""
+        self._documents.close()
+        self.vectors = None
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _store_vectors(self, vectors: np.ndarray, order: np.ndarray):
+        if not self.count:
+            # An empty .npy cannot be memory-mapped.
+            np.save(self.directory / "vectors.npy", vectors.astype(np.float32 if self.dtype == "float32" else np.float16))
+            if self.dtype == "int8":
+                np.save(self.directory / "codes.npy", np.zeros((0, 0), dtype=np.int8))
+                np.save(self.directory / "scales.npy", np.zeros(0, dtype=np.float32))
+            return
+        shape = vectors.shape
+        # int8 indexes keep float16 vectors for the rescoring pass.
+        stored = np.lib.format.open_memmap(self.directory / "vectors.npy", mode="w+",
+                                           dtype=np.float32 if self.dtype == "float32" else np.float16, shape=shape)
+        codes = scales = None
+        if self.dtype == "int8":
+            codes = np.lib.format.open_memmap(self.directory / "codes.npy", mode="w+", dtype=np.int8, shape=shape)
+            scales = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, _BLOCK_ROWS):
+            rows = order[start:start + _BLOCK_ROWS]
+            block = vectors[rows] if self.index_type == "ivf" else vectors[start:start + len(rows)]
+            stored[start:start + len(rows)] = block
+            if codes is not None:
+                codes[start:start + len(rows)], scales[start:start + len(rows)] = quantize_int8(block)
+        stored.flush()
+        if codes is not None:
+            codes.flush()
+            np.save(self.directory / "scales.npy", scales)
+
+    def _reorder_documents(self, order: np.ndarray):
+        source = self.directory / "documents.jsonl"
+        reordered = self.directory / "documents.jsonl.tmp"
+        with open(source, "rb") as f, open(reordered, "wb") as out:
+            for row in order:
+                f.seek(self._offsets[row])
+                out.write(f.readline())
+        os.replace(reordered, source)
+
+
+def current_version(path: str) -> Optional[str]:
+    try:
+        return (Path(path) / "CURRENT").read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_version(root: Path, version: str):
+    """Points CURRENT at version; os.replace makes the switch atomic for readers."""
+    pointer = root / f"CURRENT.{uuid.uuid4().hex[:8]}.tmp"
+    pointer.write_text(version, encoding="utf-8")
+    os.replace(pointer, root / "CURRENT")
+
+
+def _remove_old_versions(root: Path, keep_versions: int):
+    versions = sorted((entry for entry in root.iterdir() if entry.is_dir() and entry.name.startswith("v")),
+                      key=lambda entry: entry.stat().st_mtime)
+    active = current_version(str(root))
+    for entry in versions[:-keep_versions]:
+        if entry.name != active:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+class VectorIndex:
+    """One opened index version. Arrays are memory-mapped read-only; documents are loaded."""
+
+    def __init__(self, path: str, version: Optional[str] = None):
+        self.path = path
+        self.version = version or current_version(path)
+        if self.version is None:
+            raise FileNotFoundError(f"No vector index at '{path}'.")
+        directory = Path(path) / self.version
+        with open(directory / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.count = self.manifest["count"]
+        self.dtype = self.manifest["dtype"]
+        self.index_type = self.manifest["index_type"]
+        self.vectors = self._load(directory / "vectors.npy")
+        self.codes = self._load(directory / "codes.npy") if self.dtype == "int8" else None
+        self.scales = np.load(directory / "scales.npy") if self.dtype == "int8" else None
+        self.centroids = np.load(directory / "centroids.npy") if self.index_type == "ivf" and self.count else None
+        self.list_offsets = np.load(directory / "list_offsets.npy") if self.centroids is not None else None
+        with open(directory / "documents.jsonl", encoding="utf-8") as f:
+            self.documents = [json.loads(line) for line in f]
+        if "roles" in self.manifest:
+            role_rows = np.load(directory / "role_rows.npy")
+            self.postings = {role: role_rows[start:end] for role, (start, end) in self.manifest["roles"].items()}
+        else:
+            # Versions written before posting lists were stored.
+            self.postings = role_postings([document["metadata"] for document in self.documents])
+        self._allowed_rows: Dict[str, Optional[np.ndarray]] = {}
+
+    def allowed_rows(self, role: Optional[str]) -> Optional[np.ndarray]:
+        """Sorted rows the role may read, or None when it may read every row."""
+        if role is None or role in UNRESTRICTED_DOCUMENT_ROLES:
+            return None
+        if role not in self._allowed_rows:
+            rows = np.union1d(self.postings.get(role, np.zeros(0, dtype=np.int32)), self.postings[PUBLIC_ROLE])
+            self._allowed_rows[role] = None if len(rows) == self.count else rows.astype(np.int64)
+        return self._allowed_rows[role]
+
+    def _load(self, file: Path) -> np.ndarray:
+        # An empty .npy cannot be memory-mapped.
+        return np.load(file, mmap_mode="r" if self.count else None)
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        nprobe: int = 8,
+        rescore_factor: int = 4,
+        rows: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        The k best (row, score) pairs for a normalized float32 query vector, among the
+        sorted rows given (see allowed_rows), or all rows.
+        """
+        if self.count == 0 or k <= 0 or (rows is not None and len(rows) == 0):
+            return []
+        query = np.asarray(query, dtype=np.float32).ravel()
+        # int8 scores are approximate; keep more candidates and rescore them in float.
+        candidates_k = k * max(1, rescore_factor) if self.codes is not None else k
+
+        segments: List[Any] = [(0, self.count)] if rows is None else [rows]
+        if self.centroids is not None:
+            segments = self._probe(query, nprobe, candidates_k, rows)
+
+        found_rows, scores = self._scan(query, segments, candidates_k)
+        if self.codes is not None and len(found_rows):
+            found_rows = np.sort(found_rows)
+            scores = np.asarray(self.vectors[found_rows], dtype=np.float32) @ query
+        best = _top(scores, k)
+        return [(int(found_rows[i]), float(scores[i])) for i in best]
+
+    def _probe(self, query: np.ndarray, nprobe: int, candidates_k: int, rows: Optional[np.ndarray]) -> List[Any]:
+        """
+        Segments of the IVF lists closest to the query: nprobe lists, or with rows given,
+        as many more as it takes to reach candidates_k of those rows.
+        """
+        order = np.argsort(self.centroids @ query)[::-1]
+        if rows is None:
+            probed = np.sort(order[:max(1, nprobe)])
+            return [(int(self.list_offsets[c]), int(self.list_offsets[c + 1])) for c in probed]
+        segments, found = [], 0
+        for probes, list_id in enumerate(order, start=1):
+            start, end = np.searchsorted(rows, self.list_offsets[list_id:list_id + 2])
+            if end > start:
+                segments.append(rows[start:end])
+                found += end - start
+            if probes >= nprobe and found >= candidates_k:
+                break
+        return segments
+
+    def _scan(self, query: np.ndarray, segments: List[Any], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k rows of the segments: (start, end) row ranges, read as slices, or arrays of rows."""
+        found_rows, found_scores = [], []
+        for segment in segments:
+            ranged = isinstance(segment, tuple)
+            first, last = segment if ranged else (0, len(segment))
+            for start in range(first, last, _BLOCK_ROWS):
+                end = min(start + _BLOCK_ROWS, last)
+                selection = slice(start, end) if ranged else segment[start:end]
+                if self.codes is not None:
+                    scores = (np.asarray(self.codes[selection], dtype=np.float32) @ query) * self.scales[selection]
+                else:
+                    scores = np.asarray(self.vectors[selection], dtype=np.float32) @ query
+                best = _top(scores, k)
+                found_rows.append(best + start if ranged else selection[best])
+                found_scores.append(scores[best])
+        if not found_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows, scores = np.concatenate(found_rows), np.concatenate(found_scores)
+        best = _top(scores, k)
+        return rows[best], scores[best]
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first."""
+    if len(scores) > k:
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+class NativeVectorStore:
+    """
+    The vector-store interface KnowledgeAgent uses (similarity_search, get) over a
+    VectorIndex. Queries are embedded with encoder.
+    """
+
+    def __init__(self, path: str, encoder: Encoder, nprobe: int = 8, rescore_factor: int = 4):
+        self.path = path
+        self.encoder = encoder
+        self.nprobe = nprobe
+        self.rescore_factor = rescore_factor
+        self.index = VectorIndex(path)
+        logger.info(f"Native vector index {self.index.version} opened: {self.index.count} vectors, "
+                    f"{self.index.dtype}, {self.index.index_type}.")
+
+    def reload(self) -> bool:
+        """
+        Opens the current version if it changed. Searches already running finish on the
+        index they started with. Returns whether a new version was opened.
+        """
+        version = current_version(self.path)
+        if version is None or version == self.index.version:
+            return False
+        self.index = VectorIndex(self.path, version)
+        logger.info(f"Native vector index reloaded: version {version}, {self.index.count} vectors.")
+        return True
+
+    @classmethod
+    def from_texts(
+        cls,
+        path: str,
+        texts: Sequence[str],
+        encoder: Encoder,
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[str]] = None,
+        batch_size: int = 256,
+        **options: Any,
+    ) -> "NativeVectorStore":
+        """Embeds texts, writes them as a new index version and opens it. options go to write_index."""
+        vectors = [encoder(list(texts[start:start + batch_size])) for start in range(0, len(texts), batch_size)]
+        write_index(
+            path,
+            ids=list(ids) if ids is not None else [str(position) for position in range(len(texts))],
+            texts=list(texts),
+            metadatas=list(metadatas) if metadatas is not None else [{} for _ in texts],
+            vectors=np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32),
+            **options,
+        )
+        return cls(path, encoder)
+
+    def similarity_search(self, query: str, k: int = 4, role: Optional[str] = None) -> List[StoredDocument]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, role)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, role: Optional[str] = None) -> List[Tuple[StoredDocument, float]]:
+        """The k most similar documents that role may read (all documents when role is None)."""
+        # Rows are only meaningful in the version they were found in; reload() may swap self.index.
+        index = self.index
+        vector = self.encoder([query])[0]
+        hits = index.search(vector, k, nprobe=self.nprobe, rescore_factor=self.rescore_factor, rows=index.allowed_rows(role))
+        return [(self._document(index, row), score) for row, score in hits]
+
+    def get(self, include: Optional[List[str]] = None) -> Dict[str, List[Any]]:
+        """All stored chunks, in the same shape as Chroma's get()."""
+        documents = self.index.documents
+        return {
+            "ids": [document["id"] for document in documents],
+            "documents": [document["page_content"] for document in documents],
+            "metadatas": [document["metadata"] for document in documents],
+        }
+
+    @staticmethod
+    def _document(index: VectorIndex, row: int) -> StoredDocument:
+        document = index.documents[row]
+        return StoredDocument(page_content=document["page_content"], metadata=document["metadata"], id=document["id"])
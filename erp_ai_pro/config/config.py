@@ -4,7 +4,9 @@ Centralized Configuration for ERP AI Pro
 This file breaks the circular import dependency.
 """
 
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List
 
 @dataclass
 class SystemConfig:
@@ -14,16 +16,174 @@ class SystemConfig:
     vision_model_name: str = "Salesforce/blip-image-captioning-base"
     clip_model_name: str = "openai/clip-vit-base-patch32"
     embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # LLM backend: "auto" tries vLLM, then Hugging Face transformers; "vllm" and "hf" use
+    # only that backend; "vllm_offline" runs vLLM's offline batched engine for bulk jobs
+    # (scripts/bulk_query.py); "fake" loads no model and answers deterministically (load tests, CI).
+    llm_backend: str = os.getenv("LLM_BACKEND", "auto")
+    # Fake backend timing: fixed latency per call plus generation at tokens_per_second.
+    fake_llm_latency_ms: float = float(os.getenv("FAKE_LLM_LATENCY_MS", 50))
+    fake_llm_tokens_per_second: float = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", 100))
+    fake_llm_answer_tokens: int = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", 64))
+    # Fraction of GPU memory each vLLM engine may claim.
+    gpu_memory_utilization: float = 0.8
+    # Model cascade: a small model routes and answers simple questions, and the large model
+    # (base_model_name) takes low-confidence or invalid routes, long or reasoning questions
+    # and weak small-model answers. Off while small_model_name is empty
+    # (e.g. SMALL_MODEL_NAME=Qwen/Qwen2.5-1.5B-Instruct).
+    small_model_name: str = os.getenv("SMALL_MODEL_NAME", "")
+    small_llm_backend: str = os.getenv("SMALL_LLM_BACKEND", "")  # default: llm_backend
+    small_gpu_memory_utilization: float = 0.1
+    cascade_routing_min_confidence: float = 0.7
+    cascade_small_max_question_words: int = 30
+    cascade_small_max_context_chars: int = 3000
+    cascade_min_answer_chars: int = 2
+    # The Hugging Face fallback runs generation on a bounded thread pool.
+    hf_max_workers: int = 1
+    hf_max_queue_size: int = 64
+
+    # Agents
+    # Heavy agents are built on first use; these are warmed in the background at startup
+    # (comma-separated in PRELOAD_AGENTS; empty for fully on-demand initialization).
+    preload_agents: List[str] = field(default_factory=lambda: [
+        name for name in os.getenv("PRELOAD_AGENTS", "KnowledgeAgent,BusinessIntelligenceAgent").split(",") if name
+    ])
 
     # Vector Database
     vector_db_type: str = "qdrant"
     vector_db_url: str = "http://localhost:6333"
     collection_name: str = "erp_knowledge_enhanced"
+    vector_store_path: str = "data_preparation/vector_store"
+    # KnowledgeAgent's vector store: "chroma" (at vector_store_path) or "native", the
+    # memory-mapped index at native_index_path shared by all workers on a host. The dtype
+    # (float32, float16 or int8 with a float16 rescoring pass over rescore_factor * k
+    # candidates) and type (flat, or ivf probing native_index_nprobe lists) are fixed when
+    # the index is built.
+    vector_store_backend: str = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+    native_index_path: str = os.getenv("NATIVE_INDEX_PATH", "data_preparation/native_index")
+    native_index_dtype: str = "int8"
+    native_index_type: str = "flat"
+    native_index_nprobe: int = 8
+    native_index_rescore_factor: int = 4
+    # scripts/run_create_vector_store.py syncs the store incrementally and records a version
+    # of the indexed corpus; KnowledgeAgent checks for a new one every index_refresh_seconds.
+    index_refresh_seconds: float = float(os.getenv("INDEX_REFRESH_SECONDS", 10))
 
     # Caching
     redis_url: str = "redis://localhost:6379"
     cache_ttl: int = 3600
 
+    # Answer cache in front of MainSystem.query: exact (role, normalized question) matches
+    # plus paraphrases above response_cache_similarity, per role. Entries expire after the
+    # chosen agent's TTL; agents without a TTL (live ERP data, images) are never cached,
+    # and neither are failures or FallbackAgent answers (routing or agent failures).
+    # The Redis tier at redis_url is skipped while unreachable.
+    response_cache_enabled: bool = True
+    response_cache_size: int = 10000
+    response_cache_shared: bool = True
+    response_cache_semantic_enabled: bool = True
+    response_cache_similarity: float = 0.92
+    response_cache_ttls: Dict[str, int] = field(default_factory=lambda: {
+        "KnowledgeAgent": 3600,
+        "BusinessIntelligenceAgent": 900,
+    })
+    # Cached answers are keyed on this version; when empty, the version of the indexed
+    # corpus (or, for stores without one, their last modification time) is used, so
+    # re-indexing invalidates them.
+    knowledge_base_version: str = os.getenv("KNOWLEDGE_BASE_VERSION", "")
+
     # Performance
     retrieval_k: int = 10
     rerank_k: int = 5
+    # Hybrid retrieval: a BM25 index over the stored chunks runs next to the vector search
+    # and the two lists are fused with reciprocal rank fusion (constant hybrid_rrf_k).
+    # Each retriever returns hybrid_candidates_k results; retrieval_k fused ones are kept.
+    hybrid_retrieval_enabled: bool = True
+    hybrid_candidates_k: int = 20
+    hybrid_rrf_k: int = 60
+    # Cross-encoder reranking: the retrieval_k candidates are scored against the question in
+    # one batched pass and the best rerank_k go into the prompt. Scores are cached per
+    # (question, chunk). Reranking is skipped, keeping the first
+    # rerank_k in retrieval order, when the expected scoring time including queued reranks
+    # exceeds rerank_max_latency_ms; while skipped, one rerank every
+    # rerank_probe_interval_seconds re-measures the cost. For mostly Vietnamese content a multilingual
+    # cross-encoder (e.g. BAAI/bge-reranker-v2-m3) ranks better than the English default.
+    rerank_enabled: bool = True
+    reranker_model_name: str = os.getenv("RERANKER_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    rerank_batch_size: int = 32
+    rerank_cache_size: int = 50000
+    rerank_max_latency_ms: float = float(os.getenv("RERANK_MAX_LATENCY_MS", 250))
+    rerank_probe_interval_seconds: float = float(os.getenv("RERANK_PROBE_INTERVAL_SECONDS", 30))
+    # Start side-effect-free agent work (knowledge retrieval) while routing is in flight
+    # and keep it when the route matches.
+    speculative_execution: bool = False
+    # Concurrent identical queries (same role, normalized question and image) share one
+    # routing and generation run instead of each starting their own.
+    coalesce_queries: bool = True
+    # Compound questions are split into sub-intents at conjunctions joining clauses that
+    # each name their own request or entity ("Show my tasks and what is the return policy",
+    # not "Show sales and profit for Q3"). When the parts route to different agents (or
+    # tools) they run concurrently, each bounded by its agent's timeout in
+    # multi_intent_timeouts (default multi_intent_default_timeout seconds), and their
+    # answers are merged into one response.
+    multi_intent_enabled: bool = True
+    multi_intent_max_intents: int = 4
+    multi_intent_timeouts: Dict[str, float] = field(default_factory=lambda: {
+        "LiveERPAgent": 5.0,
+        "KnowledgeAgent": 20.0,
+        "BusinessIntelligenceAgent": 30.0,
+    })
+    multi_intent_default_timeout: float = 20.0
+    # Per-stage spans of every query feed erp_ai_stage_duration_seconds; whole traces go to
+    # the exporter: "none", "stdout" or "file" (JSON lines appended to trace_file_path).
+    trace_exporter: str = os.getenv("TRACE_EXPORTER", "none")
+    trace_file_path: str = os.getenv("TRACE_FILE", "traces.jsonl")
+    # POST /query/batch: at most batch_max_items per request; KnowledgeAgent answers are
+    # generated batch_generation_size prompts per LLM call, and other agents run at most
+    # batch_max_concurrency items at a time.
+    batch_max_items: int = 1000
+    batch_generation_size: int = 16
+    batch_max_concurrency: int = 32
+    # LiveERPAgent answers are rendered from per-tool templates in response_language
+    # ("auto" follows the question, or "vi" / "en"). Results of several tool calls are
+    # phrased by the LLM (the cascade's small model, if any) when response_llm_rendering is on.
+    response_language: str = os.getenv("RESPONSE_LANGUAGE", "auto")
+    response_llm_rendering: bool = True
+    response_llm_max_tokens: int = 256
+
+    # Routing
+    # The semantic router answers from embedded example utterances and only defers
+    # to the LLM when the best agent is not a clear winner.
+    semantic_routing_enabled: bool = True
+    semantic_routing_min_score: float = 0.55
+    semantic_routing_min_margin: float = 0.08
+    # "plan" emits agent, tool and tool arguments as one JSON-schema constrained generation;
+    # "generate" decodes a free-text agent name; "logprob" scores every agent name as a
+    # continuation of the prompt in one prefill and picks the most likely one.
+    # The latter two add a tool-only plan when they choose the LiveERPAgent.
+    routing_mode: str = "plan"
+    # Routing decisions are cached per (role, normalized question) for cache_ttl seconds.
+    # The Redis tier at redis_url is shared across workers and is opt-in.
+    routing_cache_enabled: bool = True
+    routing_cache_size: int = 10000
+    routing_cache_shared: bool = False
+    # Concurrent LLM routing prompts are coalesced into one generate call.
+    routing_batch_max_size: int = 16
+    routing_batch_max_wait_ms: float = 5.0
+
+    # Admission control
+    # At most admission_max_concurrency queries run at once; the rest wait in priority
+    # classes (highest first; roles not listed fall in the last class). A request is
+    # rejected with 503 and Retry-After when its expected wait exceeds its class's SLO,
+    # or when it is still queued once the SLO has passed.
+    admission_enabled: bool = True
+    admission_max_concurrency: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 8))
+    admission_priority_classes: Dict[str, List[str]] = field(default_factory=lambda: {
+        "executive": ["ceo", "admin", "finance_manager"],
+        "manager": ["sales_manager", "warehouse_manager", "project_manager", "hr_manager", "analyst"],
+        "standard": [],
+    })
+    admission_slo_seconds: Dict[str, float] = field(default_factory=lambda: {
+        "executive": 30.0,
+        "manager": 15.0,
+        "standard": 10.0,
+    })
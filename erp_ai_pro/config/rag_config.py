@@ -20,11 +20,38 @@ class RAGConfig:
     # Name of the ChromaDB collection
     collection_name: str = os.getenv("CHROMA_COLLECTION_NAME", "erp_knowledge")
 
+    # Vector store backend: "chroma", or "native" (memory-mapped index, see cognitive/vector_index.py)
+    vector_store_backend: str = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+    native_index_path: str = os.getenv("NATIVE_INDEX_PATH", "data_preparation/native_index")
+    native_index_dtype: str = os.getenv("NATIVE_INDEX_DTYPE", "int8")
+    native_index_type: str = os.getenv("NATIVE_INDEX_TYPE", "flat")
+    native_index_nprobe: int = int(os.getenv("NATIVE_INDEX_NPROBE", 8))
+    native_index_rescore_factor: int = int(os.getenv("NATIVE_INDEX_RESCORE_FACTOR", 4))
+
+    # How often KnowledgeAgent checks for a new index version written by an incremental sync
+    # (scripts/run_create_vector_store.py) and reloads it.
+    index_refresh_seconds: float = float(os.getenv("INDEX_REFRESH_SECONDS", 10))
+
+    # Ingestion (see cognitive/ingestion.py): documents longer than ingest_chunk_tokens words
+    # are split into chunks overlapping by ingest_chunk_overlap words, and chunks are embedded
+    # ingest_batch_size at a time by ingest_workers processes, each with its own copy of the
+    # embedding model (0 embeds in the calling process).
+    ingest_chunk_tokens: int = int(os.getenv("INGEST_CHUNK_TOKENS", 200))
+    ingest_chunk_overlap: int = int(os.getenv("INGEST_CHUNK_OVERLAP", 40))
+    ingest_batch_size: int = int(os.getenv("INGEST_BATCH_SIZE", 256))
+    ingest_workers: int = int(os.getenv("INGEST_WORKERS", 2))
+
     # Sentence Transformer model for creating embeddings
     embedding_model_name: str = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
 
     # Number of search results to retrieve from the vector store
-    retrieval_k: int = int(os.getenv("RETRIEVAL_K", 3))
+    retrieval_k: int = int(os.getenv("RETRIEVAL_K", 10))
+
+    # Hybrid retrieval: BM25 over the stored chunks next to the vector search, fused with
+    # reciprocal rank fusion. Each retriever returns hybrid_candidates_k results.
+    hybrid_retrieval_enabled: bool = os.getenv("HYBRID_RETRIEVAL_ENABLED", "true").lower() == "true"
+    hybrid_candidates_k: int = int(os.getenv("HYBRID_CANDIDATES_K", 20))
+    hybrid_rrf_k: int = int(os.getenv("HYBRID_RRF_K", 60))
 
     # --- LLM Configuration ---
     # This section is designed to be compatible with a future Model Registry.
@@ -38,7 +65,18 @@ class RAGConfig:
     finetuned_model_path: str = os.getenv("FINETUNED_MODEL_PATH", "path/to/your/finetuned_erp_model") # Placeholder path
 
     # --- Re-ranker Configuration ---
+    # The retrieval_k candidates are reranked by the cross-encoder and the best rerank_k kept;
+    # reranking is skipped while its expected latency exceeds rerank_max_latency_ms, except
+    # for one rerank every rerank_probe_interval_seconds that re-measures it. It is
+    # off when rerank_k >= retrieval_k, as it would filter nothing; without it the prompt
+    # gets the first rerank_k results.
+    rerank_enabled: bool = os.getenv("RERANK_ENABLED", "true").lower() == "true"
     reranker_model_name: str = os.getenv("RERANKER_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2") # Example re-ranker model
+    rerank_k: int = int(os.getenv("RERANK_K", 5))
+    rerank_batch_size: int = int(os.getenv("RERANK_BATCH_SIZE", 32))
+    rerank_cache_size: int = int(os.getenv("RERANK_CACHE_SIZE", 50000))
+    rerank_max_latency_ms: float = float(os.getenv("RERANK_MAX_LATENCY_MS", 250))
+    rerank_probe_interval_seconds: float = float(os.getenv("RERANK_PROBE_INTERVAL_SECONDS", 30))
 
     # --- Neo4j Configuration ---
     neo4j_uri: str = os.getenv("NEO4J_URI", "bolt://localhost:7687")
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Admission Control for ERP AI Pro
+Bounds the number of queries running at once. Requests beyond the limit wait in per-role
+priority classes and are shed with 503 + Retry-After when they would wait longer than
+their class's SLO, instead of piling onto the model and slowing everyone down.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List
+
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = structlog.get_logger()
+
+# Metrics
+admission_in_flight = Gauge('erp_ai_admission_in_flight', 'Admitted queries currently running')
+admission_queue_depth = Gauge('erp_ai_admission_queue_depth', 'Queries waiting for admission', ['priority'])
+admission_wait = Histogram(
+    'erp_ai_admission_wait_seconds', 'Time a query waited before it was admitted', ['priority'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+admission_shed = Counter('erp_ai_admission_shed_total', 'Queries rejected by admission control', ['priority', 'reason'])
+
+
+class Overloaded(Exception):
+    """Raised when a query is shed; the API answers 503 with a Retry-After header."""
+
+    def __init__(self, priority: str, retry_after: float, reason: str):
+        super().__init__(f"Server overloaded ({reason}) for priority class '{priority}'. Retry after {retry_after:.0f}s.")
+        self.priority = priority
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class Ticket:
+    """A granted admission slot. Releasing it more than once has no effect."""
+
+    def __init__(self, priority: str):
+        self.priority = priority
+        self.admitted_at = time.perf_counter()
+        self.released = False
+
+
+class AdmissionController:
+    """
+    Grants up to max_concurrency slots. Waiting requests are served strictly by priority
+    class, FIFO within a class; lower classes are protected from starving indefinitely
+    only by their SLO, after which they are shed.
+
+    The expected wait of a new request is estimated from the number of requests queued at
+    or above its priority and a moving average of how long admitted queries run.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        priority_classes: Dict[str, List[str]],
+        slo_seconds: Dict[str, float],
+        initial_service_seconds: float = 1.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        # Class names in priority order, highest first; the last one is the default.
+        self.classes = list(priority_classes) or ["standard"]
+        self.class_of_role = {role: name for name, roles in priority_classes.items() for role in roles}
+        self.slo_seconds = slo_seconds
+        self.service_seconds = initial_service_seconds
+        self.active = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {name: deque() for name in self.classes}
+        for name in self.classes:
+            admission_queue_depth.labels(priority=name).set(0)
+
+    def priority_class(self, role: str) -> str:
+        return self.class_of_role.get(role, self.classes[-1])
+
+    def expected_wait(self, priority: str) -> float:
+        """Estimated queueing time for a request of this class arriving now."""
+        if self.active < self.max_concurrency and not self._waiting():
+            return 0.0
+        rank = self.classes.index(priority)
+        ahead = sum(len(self._queues[name]) for name in self.classes[:rank + 1])
+        return (ahead + 1) / self.max_concurrency * self.service_seconds
+
+    async def acquire(self, role: str) -> Ticket:
+        """Waits for a slot, or raises Overloaded if the wait would exceed the class's SLO."""
+        priority = self.priority_class(role)
+        slo = self.slo_seconds.get(priority, math.inf)
+        if self.active < self.max_concurrency and not self._waiting():
+            self.active += 1
+            admission_in_flight.set(self.active)
+            admission_wait.labels(priority=priority).observe(0.0)
+            return Ticket(priority)
+
+        expected = self.expected_wait(priority)
+        if expected > slo:
+            admission_shed.labels(priority=priority, reason="expected_wait").inc()
+            logger.warning(f"Shedding a '{priority}' query: expected wait {expected:.2f}s exceeds its {slo:.2f}s SLO.")
+            raise Overloaded(priority, expected, "expected_wait")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues[priority]
+        queue.append(future)
+        admission_queue_depth.labels(priority=priority).set(len(queue))
+        enqueued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout=None if math.isinf(slo) else slo)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller gave up; pass it on.
+                self._release_slot()
+            else:
+                self._remove(priority, future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            admission_shed.labels(priority=priority, reason="deadline").inc()
+            logger.warning(f"Shedding a '{priority}' query: still queued after its {slo:.2f}s SLO.")
+            raise Overloaded(priority, self.expected_wait(priority), "deadline") from None
+
+        admission_wait.labels(priority=priority).observe(time.perf_counter() - enqueued_at)
+        return Ticket(priority)
+
+    def release(self, ticket: Ticket):
+        """Returns a slot and records how long it was held."""
+        if ticket.released:
+            return
+        ticket.released = True
+        # Exponential moving average of the service time drives the expected-wait estimate.
+        self.service_seconds = 0.8 * self.service_seconds + 0.2 * (time.perf_counter() - ticket.admitted_at)
+        self._release_slot()
+
+    @asynccontextmanager
+    async def admit(self, role: str) -> AsyncIterator[Ticket]:
+        ticket = await self.acquire(role)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _release_slot(self):
+        # Hand the slot directly to the highest-priority waiter, so a new arrival cannot take it first.
+        for name in self.classes:
+            queue = self._queues[name]
+            while queue:
+                future = queue.popleft()
+                admission_queue_depth.labels(priority=name).set(len(queue))
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.active -= 1
+        admission_in_flight.set(self.active)
+
+    def _remove(self, priority: str, future: asyncio.Future):
+        queue = self._queues[priority]
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        admission_queue_depth.labels(priority=priority).set(len(queue))
+
+    def _waiting(self) -> bool:
+        return any(self._queues.values())
+
+    def status(self) -> Dict[str, object]:
+        """Current load, for health checks."""
+        return {
+            "in_flight": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queued": {name: len(queue) for name, queue in self._queues.items()},
+            "service_seconds": round(self.service_seconds, 3),
+        }
@@ -9,22 +9,23 @@ import json
 import logging
 import os
 from contextlib import asynccontextmanager
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 import time
 import aiofiles
 from pathlib import Path
 
 # FastAPI Enhanced
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, File, UploadFile, BackgroundTasks
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
 from starlette.websockets import WebSocketState
 
 # Monitoring
-from prometheus_client import Counter, Histogram, Gauge, generate_latest
+from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
 import structlog
 
 # Import our new main system
@@ -33,6 +34,7 @@ import structlog
 from erp_ai_pro.cognitive.main_system import MainSystem
 from erp_ai_pro.config.config import SystemConfig
 from erp_ai_pro.presentation.models import QueryRequest, QueryResponse
+from erp_ai_pro.presentation.admission import AdmissionController, Overloaded, Ticket
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -43,11 +45,19 @@ request_count = Counter('erp_ai_requests_total', 'Total requests', ['method', 'e
 request_duration = Histogram('erp_ai_request_duration_seconds', 'Request duration')
 active_connections = Gauge('erp_ai_active_connections', 'Active WebSocket connections')
 system_health = Gauge('erp_ai_system_health', 'Main system health status')
+event_loop_lag = Gauge('erp_ai_event_loop_lag_seconds', 'Scheduling delay of the latest event loop probe')
+time_to_first_token = Histogram(
+    'erp_ai_time_to_first_token_seconds', 'Time from request to the first streamed answer chunk', ['endpoint', 'agent']
+)
 
 # Pydantic Models for the API layer
 class APIQueryRequest(BaseModel):
     role: str = Field(..., description="User role (e.g., admin, finance_manager)")
     question: str = Field(..., description="The user's question")
+    trace: bool = Field(False, description="Include per-stage timings in the response")
+
+class APIBatchRequest(BaseModel):
+    items: List[APIQueryRequest] = Field(..., min_length=1, description="The queries to answer")
 
 class APIQueryResponse(BaseModel):
     response: Dict[str, Any] = Field(..., description="The detailed response from the agent system")
@@ -56,20 +66,35 @@ class APIQueryResponse(BaseModel):
 
 # Global variables
 main_system: Optional[MainSystem] = None
+admission: Optional[AdmissionController] = None
+
+async def monitor_event_loop_lag(interval: float = 0.1):
+    """Measures how late a periodic sleep wakes up; blocking work on the loop shows up as lag."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag.set(max(0.0, loop.time() - start - interval))
 
 # Lifespan management
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan management."""
-    global main_system
+    global main_system, admission
+    lag_monitor = None
     logger.info("Starting ERP AI Pro API with ATOMIC architecture...")
     try:
         config = SystemConfig()
         main_system = MainSystem(config)
         await main_system.setup()
+        if config.admission_enabled:
+            admission = AdmissionController(
+                config.admission_max_concurrency, config.admission_priority_classes, config.admission_slo_seconds
+            )
         system_health.set(1)
         logger.info("MainSystem initialized successfully.")
         os.makedirs("uploads", exist_ok=True)
+        lag_monitor = asyncio.create_task(monitor_event_loop_lag())
         yield
     except Exception as e:
         logger.error(f"Fatal startup error: {e}")
@@ -77,6 +102,10 @@ async def lifespan(app: FastAPI):
         raise
     finally:
         logger.info("Shutting down ERP AI Pro API...")
+        if lag_monitor is not None:
+            lag_monitor.cancel()
+        if main_system is not None:
+            await main_system.shutdown()
         system_health.set(0)
 
 # Create FastAPI app
@@ -91,6 +120,26 @@ app = FastAPI(
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": exc.retry_after_header})
+
+async def acquire_slot(role: str) -> Optional[Ticket]:
+    """Waits for admission; raises Overloaded when the request is shed."""
+    return await admission.acquire(role) if admission else None
+
+def release_slot(ticket: Optional[Ticket]):
+    if ticket is not None:
+        admission.release(ticket)
+
+@asynccontextmanager
+async def admitted(role: str) -> AsyncIterator[None]:
+    ticket = await acquire_slot(role)
+    try:
+        yield
+    finally:
+        release_slot(ticket)
+
 # --- API Endpoints ---
 
 @app.get("/")
@@ -103,9 +152,17 @@ async def health_check():
     return {
         "status": "healthy" if system_ready else "degraded",
         "system_ready": system_ready,
-        "active_llm": main_system.config.base_model_name if system_ready else None
+        "active_llm": main_system.config.base_model_name if system_ready else None,
+        # Per-agent readiness: registered (built on first use), loading, ready or failed.
+        "agents": main_system.agents.status() if main_system else {},
+        "admission": admission.status() if admission else None,
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/query/text", response_model=APIQueryResponse)
 async def query_text(request: APIQueryRequest):
     """Endpoint for text-based queries."""
@@ -114,8 +171,9 @@ async def query_text(request: APIQueryRequest):
         raise HTTPException(status_code=503, detail="System not initialized")
 
     start_time = time.time()
-    with request_duration.time():
-        response_data = await main_system.query(question=request.question, role=request.role)
+    async with admitted(request.role):
+        with request_duration.time():
+            response_data = await main_system.query(question=request.question, role=request.role, trace=request.trace)
     processing_time = time.time() - start_time
 
     return APIQueryResponse(
@@ -125,7 +183,7 @@ async def query_text(request: APIQueryRequest):
     )
 
 @app.post("/query/multimodal", response_model=APIQueryResponse)
-async def query_multimodal(role: str, question: str, file: UploadFile = File(...)):
+async def query_multimodal(role: str, question: str, file: UploadFile = File(...), trace: bool = False):
     """Endpoint for multimodal queries (text + image)."""
     request_count.labels(method='POST', endpoint='/query/multimodal').inc()
     if not main_system:
@@ -141,8 +199,9 @@ async def query_multimodal(role: str, question: str, file: UploadFile = File(...
             content = await file.read()
             await f.write(content)
 
-        with request_duration.time():
-            response_data = await main_system.query(question=question, role=role, image_path=file_path)
+        async with admitted(role):
+            with request_duration.time():
+                response_data = await main_system.query(question=question, role=role, image_path=file_path, trace=trace)
         
         processing_time = time.time() - start_time
 
@@ -155,7 +214,90 @@ async def query_multimodal(role: str, question: str, file: UploadFile = File(...
         if file_path and os.path.exists(file_path):
             os.remove(file_path)
 
-# Simplified WebSocket for demonstration
+async def timed_events(events, endpoint: str):
+    """Passes streaming events through, recording time-to-first-token for the chosen agent."""
+    start_time = time.perf_counter()
+    agent = "unknown"
+    first_chunk_seen = False
+    async for event in events:
+        if event["event"] == "routing":
+            agent = event["data"]["agent"]
+        elif not first_chunk_seen:
+            # Agents that do not stream deliver their whole answer in the result event.
+            first_chunk_seen = True
+            time_to_first_token.labels(endpoint=endpoint, agent=agent).observe(time.perf_counter() - start_time)
+        yield event
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encodes one streaming event as a Server-Sent Events frame."""
+    data = json.dumps(event["data"], ensure_ascii=False, default=str)
+    return f"event: {event['event']}\ndata: {data}\n\n"
+
+@app.post("/query/stream")
+async def query_stream(request: APIQueryRequest):
+    """
+    Streams a text query as Server-Sent Events: a `routing` event with the orchestrator's
+    decision, `token` events as the answer is generated, then a final `result` event.
+    """
+    request_count.labels(method='POST', endpoint='/query/stream').inc()
+    if not main_system:
+        raise HTTPException(status_code=503, detail="System not initialized")
+
+    # Admission is decided before the response starts, so a shed request still gets a 503.
+    # The slot is held until the stream ends.
+    ticket = await acquire_slot(request.role)
+
+    async def sse_frames():
+        try:
+            events = main_system.query_stream(question=request.question, role=request.role)
+            async for event in timed_events(events, "/query/stream"):
+                yield format_sse(event)
+        finally:
+            release_slot(ticket)
+
+    return StreamingResponse(
+        sse_frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also releases the slot if the client disconnected before the stream started.
+        background=BackgroundTask(release_slot, ticket),
+    )
+
+@app.post("/query/batch")
+async def query_batch(request: APIBatchRequest):
+    """
+    Answers many queries in one call. Results are streamed back as NDJSON, one line per item
+    in completion order, each carrying the item's index in the request.
+    """
+    request_count.labels(method='POST', endpoint='/query/batch').inc()
+    if not main_system:
+        raise HTTPException(status_code=503, detail="System not initialized")
+    if len(request.items) > main_system.config.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {main_system.config.batch_max_items} items per batch")
+
+    # Every item is admitted on its own, in its role's priority class, and holds its slot
+    # until it is answered; items that are shed are answered with the error.
+    items = [(item.question, item.role) for item in request.items]
+
+    async def ndjson_lines():
+        start_time = time.time()
+        async for index, response_data in main_system.query_batch(items, admission=admission):
+            question, role = items[index]
+            line = {
+                "index": index,
+                "role": role,
+                "question": question,
+                "chosen_agent": response_data.get("chosen_agent", "unknown"),
+                "processing_time": time.time() - start_time,
+                "response": response_data,
+            }
+            yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+# Simplified WebSocket for demonstration.
+# Send {"question": ..., "role": ..., "stream": true} to receive the same events as /query/stream.
+# Add "trace": true to a non-streaming message for per-stage timings in the response.
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -167,7 +309,19 @@ async def websocket_endpoint(websocket: WebSocket):
                 await websocket.send_json({"error": "System not ready"})
                 continue
 
-            response = await main_system.query(question=message.get("question", ""), role=message.get("role", "user"))
+            question, role = message.get("question", ""), message.get("role", "user")
+            try:
+                async with admitted(role):
+                    if message.get("stream"):
+                        events = main_system.query_stream(question=question, role=role)
+                        async for event in timed_events(events, "/ws"):
+                            await websocket.send_json(event)
+                        continue
+
+                    response = await main_system.query(question=question, role=role, trace=message.get("trace", False))
+            except Overloaded as e:
+                await websocket.send_json({"error": str(e), "retry_after": e.retry_after_header})
+                continue
             await websocket.send_json(response)
             
     except WebSocketDisconnect:
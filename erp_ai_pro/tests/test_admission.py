@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from erp_ai_pro.presentation.admission import AdmissionController, Overloaded
+
+CLASSES = {"executive": ["ceo"], "standard": []}
+
+def make_controller(max_concurrency=1, slo=None, service_seconds=0.01):
+    slo = slo or {"executive": 1.0, "standard": 1.0}
+    return AdmissionController(max_concurrency, CLASSES, slo, initial_service_seconds=service_seconds)
+
+@pytest.mark.asyncio
+async def test_waiting_requests_are_admitted_by_priority():
+    controller = make_controller()
+    order = []
+
+    async def query(role, name):
+        async with controller.admit(role):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    holder = await controller.acquire("default")
+    tasks = [asyncio.ensure_future(query("default", "standard")), asyncio.ensure_future(query("ceo", "ceo"))]
+    await asyncio.sleep(0)
+    assert controller.status()["queued"] == {"executive": 1, "standard": 1}
+    controller.release(holder)
+    await asyncio.gather(*tasks)
+    assert order == ["ceo", "standard"]
+    assert controller.status()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_sheds_when_expected_wait_exceeds_slo():
+    controller = make_controller(slo={"executive": 10.0, "standard": 0.5}, service_seconds=1.0)
+    holder = await controller.acquire("default")
+    with pytest.raises(Overloaded) as shed:
+        await controller.acquire("default")
+    assert shed.value.reason == "expected_wait"
+    assert shed.value.retry_after_header == "1"
+
+    # Executives still queue within their longer SLO.
+    waiting = asyncio.ensure_future(controller.acquire("ceo"))
+    await asyncio.sleep(0)
+    controller.release(holder)
+    controller.release(await waiting)
+
+@pytest.mark.asyncio
+async def test_sheds_queued_request_at_its_deadline():
+    controller = make_controller(slo={"executive": 1.0, "standard": 0.02}, service_seconds=0.001)
+    holder = await controller.acquire("default")
+    with pytest.raises(Overloaded) as shed:
+        await controller.acquire("default")
+    assert shed.value.reason == "deadline"
+    assert controller.status()["queued"]["standard"] == 0
+    controller.release(holder)
+    assert controller.status()["in_flight"] == 0
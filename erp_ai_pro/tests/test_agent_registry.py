@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from erp_ai_pro.cognitive.agent_registry import AgentRegistry
+
+class SlowFactory:
+    """Counts builds and blocks its thread like loading model weights does."""
+    def __init__(self, delay=0.05, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.builds = 0
+        self.threads = set()
+
+    def __call__(self):
+        self.builds += 1
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("weights not found")
+        return object()
+
+@pytest.mark.asyncio
+async def test_agent_is_built_once_on_first_use_off_the_loop():
+    factory = SlowFactory()
+    registry = AgentRegistry()
+    registry.register("KnowledgeAgent", factory)
+    assert registry.peek("KnowledgeAgent") is None
+    assert registry.status()["KnowledgeAgent"]["state"] == "registered"
+
+    agents = await asyncio.gather(*(registry.get("KnowledgeAgent") for _ in range(5)))
+    assert all(agent is agents[0] for agent in agents)
+    assert factory.builds == 1
+    assert threading.main_thread().name not in factory.threads
+    assert registry.status()["KnowledgeAgent"]["state"] == "ready"
+
+@pytest.mark.asyncio
+async def test_failed_agent_is_reported_and_not_retried():
+    factory = SlowFactory(delay=0, fail=True)
+    registry = AgentRegistry()
+    registry.register("MultimodalAgent", factory)
+    assert await registry.get("MultimodalAgent") is None
+    assert await registry.get("MultimodalAgent") is None
+    assert factory.builds == 1
+    assert registry.status()["MultimodalAgent"] == {"state": "failed", "error": "weights not found"}
+
+@pytest.mark.asyncio
+async def test_warmup_builds_preloaded_agents_in_background():
+    knowledge, multimodal = SlowFactory(delay=0), SlowFactory(delay=0)
+    registry = AgentRegistry()
+    registry.register("KnowledgeAgent", knowledge)
+    registry.register("MultimodalAgent", multimodal)
+    await registry.warmup(["KnowledgeAgent", "UnknownAgent"])
+    assert registry.peek("KnowledgeAgent") is not None
+    assert (knowledge.builds, multimodal.builds) == (1, 0)
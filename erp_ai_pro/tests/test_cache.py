@@ -0,0 +1,104 @@
+import unicodedata
+import zlib
+
+import numpy as np
+import pytest
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.cache import TieredCache, TTLCache, extract_entities, normalize_question
+from erp_ai_pro.cognitive.response_cache import ResponseCache
+
+def test_normalize_question_folds_case_diacritics_and_entities():
+    assert normalize_question("Tồn kho sản phẩm PROD001?") == "ton kho san pham <id>"
+    assert normalize_question("tồn  kho sản phẩm PROD002") == normalize_question("Ton kho san pham PROD001")
+    assert normalize_question("Đơn hàng của @nhanvien_A") == "don hang cua <user>"
+
+def test_normalize_question_without_masking_keeps_ids():
+    assert normalize_question("Stock of PROD001?", mask_entities=False) == "stock of prod001"
+
+def test_normalize_question_can_keep_diacritics():
+    assert normalize_question("Giá  BÁN sản phẩm?", fold_accents=False) == "giá bán sản phẩm"
+    assert normalize_question(unicodedata.normalize("NFD", "Trời mưa"), fold_accents=False) == "trời mưa"
+
+def test_response_cache_exact_key_keeps_diacritics():
+    assert ResponseCache._key("v1", "admin", "Giá bán?") == ResponseCache._key("v1", "admin", "giá  BÁN")
+    assert ResponseCache._key("v1", "admin", "Giá bán") != ResponseCache._key("v1", "admin", "Giá bàn")
+    assert ResponseCache._key("v1", "admin", "mua") != ResponseCache._key("v1", "admin", "mưa")
+
+def test_extract_entities_in_order():
+    question = "Move T-1 from PROJ-WEB to @nhanvien_A, see SOP_Warehouse_001"
+    assert extract_entities(question) == ["T-1", "PROJ-WEB", "@nhanvien_A", "SOP_Warehouse_001"]
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1, ttl=0)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+@pytest.mark.asyncio
+async def test_tiered_cache_without_shared_tier():
+    cache = TieredCache("test", TTLCache())
+    assert await cache.get("k") is None
+    await cache.set("k", {"agent": "KnowledgeAgent"})
+    assert await cache.get("k") == {"agent": "KnowledgeAgent"}
+
+def bag_of_words_encoder(texts):
+    """A deterministic stand-in for a sentence embedding model."""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in normalize_question(text, mask_entities=False).split():
+            vectors[row, zlib.crc32(token.encode()) % 64] += 1.0
+    return vectors
+
+def make_response_cache(version="v1"):
+    config = SystemConfig(response_cache_shared=False, response_cache_similarity=0.8)
+    versions = {"current": version}
+    cache = ResponseCache(config, version=lambda: versions["current"], encoder=bag_of_words_encoder)
+    return cache, versions
+
+@pytest.mark.asyncio
+async def test_response_cache_is_scoped_to_role_and_agent_ttls():
+    cache, _ = make_response_cache()
+    await cache.set("hr_manager", "What is the leave policy?", {"answer": "12 days", "chosen_agent": "KnowledgeAgent"})
+    await cache.set("hr_manager", "Stock of PROD001", {"answer": "40", "chosen_agent": "LiveERPAgent"})
+
+    assert await cache.get("hr_manager", "what is the leave policy") == ({"answer": "12 days", "chosen_agent": "KnowledgeAgent"}, "exact")
+    assert await cache.get("sales_rep", "What is the leave policy?") is None
+    assert await cache.get("hr_manager", "Stock of PROD001") is None
+
+@pytest.mark.asyncio
+async def test_response_cache_serves_paraphrases_with_the_same_entities():
+    cache, _ = make_response_cache()
+    await cache.set("admin", "Explain the onboarding process for PROJ-WEB", {"answer": "a", "chosen_agent": "KnowledgeAgent"})
+
+    hit = await cache.get("admin", "Please explain the onboarding process for PROJ-WEB")
+    assert hit is not None and hit[1] == "semantic"
+    assert await cache.get("admin", "Please explain the onboarding process for PROJ-APP") is None
+
+@pytest.mark.asyncio
+async def test_response_cache_invalidated_by_knowledge_base_version():
+    cache, versions = make_response_cache()
+    await cache.set("admin", "What is the return policy?", {"answer": "30 days", "chosen_agent": "KnowledgeAgent"})
+    versions["current"] = "v2"
+    assert await cache.get("admin", "What is the return policy?") is None
+    assert await cache.get("admin", "What's the return policy, please?") is None
+
+@pytest.mark.asyncio
+async def test_response_cache_never_stores_failures_or_fallback_answers():
+    config = SystemConfig(response_cache_shared=False, response_cache_semantic_enabled=False,
+                          response_cache_ttls={"KnowledgeAgent": 3600, "FallbackAgent": 300})
+    cache = ResponseCache(config)
+    await cache.set("admin", "What is the return policy?",
+                    {"answer": "Xin lỗi, có lỗi xảy ra khi xử lý truy vấn: timeout", "error": "timeout", "chosen_agent": "KnowledgeAgent"})
+    await cache.set("admin", "Hi", {"answer": "I am not sure how to handle your request", "chosen_agent": "FallbackAgent"})
+    assert await cache.get("admin", "What is the return policy?") is None
+    assert await cache.get("admin", "Hi") is None
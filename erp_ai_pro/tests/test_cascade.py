@@ -0,0 +1,60 @@
+import pytest
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.agents.orchestrator import OrchestratorAgent
+from erp_ai_pro.cognitive.cascade import LARGE, SMALL, ModelCascade
+from erp_ai_pro.cognitive.llm_providers import HuggingFaceLLMProvider, LLMProvider
+
+class RecordingLLM:
+    """HF-pipeline-shaped callable that always answers `answer`."""
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+
+    def __call__(self, prompts, return_full_text=True, **kwargs):
+        self.calls += 1
+        prefix = lambda prompt: prompt if return_full_text else ""
+        return [[{"generated_text": prefix(prompt) + self.answer}] for prompt in prompts]
+
+class FixedProvider(LLMProvider):
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    async def generate_batch(self, prompts, **kwargs):
+        self.prompts.extend(prompts)
+        return [self.answer for _ in prompts]
+
+def routing_config():
+    return SystemConfig(semantic_routing_enabled=False, routing_mode="generate", routing_batch_max_wait_ms=10)
+
+@pytest.mark.asyncio
+async def test_routing_escalates_invalid_small_model_output():
+    small, large = RecordingLLM("no idea"), RecordingLLM("KnowledgeAgent")
+    orchestrator = OrchestratorAgent(HuggingFaceLLMProvider(small), routing_config(),
+                                     escalation_llm=HuggingFaceLLMProvider(large))
+    decision = await orchestrator.route("what is the return policy")
+    assert (decision.agent, decision.tier) == ("KnowledgeAgent", LARGE)
+    assert (small.calls, large.calls) == (1, 1)
+
+@pytest.mark.asyncio
+async def test_routing_keeps_valid_small_model_decision():
+    small, large = RecordingLLM("KnowledgeAgent"), RecordingLLM("KnowledgeAgent")
+    orchestrator = OrchestratorAgent(HuggingFaceLLMProvider(small), routing_config(),
+                                     escalation_llm=HuggingFaceLLMProvider(large))
+    decision = await orchestrator.route("what is the return policy")
+    assert decision.tier == SMALL
+    assert large.calls == 0
+
+@pytest.mark.asyncio
+async def test_answers_pick_tier_and_regenerate_weak_ones():
+    small, large = FixedProvider(""), FixedProvider("Large answer")
+    cascade = ModelCascade(large, small, SystemConfig())
+    documents = [{"page_content": "Returns are accepted within 30 days."}]
+    assert cascade.answer_tier("Why was the return rejected?", documents) == (LARGE, "reasoning")
+    assert cascade.answer_tier("return window?", [{"page_content": "x" * 5000}]) == (LARGE, "long_context")
+
+    answers = await cascade.generate_answers([("p1", "return window?", documents), ("p2", "so sánh hai chính sách", documents)])
+    assert answers == [("Large answer", LARGE), ("Large answer", LARGE)]
+    assert small.prompts == ["p1"]
+    assert large.prompts == ["p2", "p1"]
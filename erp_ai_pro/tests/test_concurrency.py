@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from erp_ai_pro.cognitive.concurrency import SingleFlight
+
+class SlowAnswer:
+    """Counts calls and takes a while to answer, like routing plus generation."""
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, answer="ok"):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"answer": answer}
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_execution():
+    flight, work = SingleFlight("test"), SlowAnswer()
+    results = await asyncio.gather(*(flight.do(("default", "q"), work) for _ in range(5)))
+    assert work.calls == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert all(result == {"answer": "ok"} for result, _ in results)
+    assert len(flight) == 0
+
+    # Different keys and later calls start their own work.
+    await asyncio.gather(flight.do(("default", "q"), work), flight.do(("admin", "q"), work))
+    assert work.calls == 3
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flight, work = SingleFlight("test"), SlowAnswer()
+    first = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    result, shared = await second
+    assert (result, shared, work.calls) == ({"answer": "ok"}, True, 1)
+
+@pytest.mark.asyncio
+async def test_failure_propagates_to_every_waiter():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("LLM unavailable")
+
+    results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(flight) == 0
@@ -0,0 +1,92 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from erp_ai_pro.cognitive.agents.knowledge_agent import KnowledgeAgent
+from erp_ai_pro.cognitive.indexing import IndexManifest, KnowledgeDocument, SyncPlanner, index_version, load_manifest
+from erp_ai_pro.cognitive.ingestion import IngestionPipeline
+from erp_ai_pro.cognitive.llm_providers import LLMProvider
+from erp_ai_pro.cognitive.vector_index import NativeVectorStore, VectorIndex, current_version
+from erp_ai_pro.config.rag_config import RAGConfig
+
+class CountingEncoder:
+    """Deterministic text -> unit vector encoder that records what it embedded."""
+    def __init__(self, dim=16):
+        self.dim = dim
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        vectors = [np.random.default_rng(int(hashlib.sha1(text.encode()).hexdigest()[:8], 16)).normal(size=self.dim)
+                   for text in texts]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def corpus(**changes):
+    documents = {f"doc{i}": f"Quy trình số {i}" for i in range(5)}
+    documents.update(changes)
+    return [KnowledgeDocument(id, content, {"source": id}) for id, content in documents.items() if content is not None]
+
+def sync_native_index(path, documents, encoder, model_name="", **options):
+    return IngestionPipeline(lambda: encoder, model_name=model_name).sync_native(path, documents, **options)
+
+def test_planner_reembeds_everything_when_the_model_changes():
+    documents = corpus()
+    manifest = IndexManifest("model-a", {document.id: document.hash for document in documents})
+    planner = SyncPlanner(manifest, "model-a")
+    upserts = [document.id for document in corpus(doc1="Đã sửa", doc4=None, doc9="Mới") if planner.needs_embedding(document)]
+    assert upserts == ["doc1", "doc9"] and planner.deletes() == ["doc4"]
+    assert (planner.added, planner.updated, planner.unchanged) == (1, 1, 3)
+    planner = SyncPlanner(manifest, "model-b")
+    assert all(planner.needs_embedding(document) for document in documents)
+    with pytest.raises(ValueError):
+        planner.needs_embedding(documents[0])
+
+def test_native_sync_embeds_only_changes_and_skips_unchanged_corpus(tmp_path):
+    path = str(tmp_path)
+    encoder = CountingEncoder()
+    first = sync_native_index(path, corpus(), encoder, model_name="m", dtype="float32")
+    assert first.added == 5 and index_version(path) == first.version
+    old_vectors = np.array(VectorIndex(path).vectors)
+
+    encoder.texts.clear()
+    report = sync_native_index(path, corpus(doc1="Đã sửa", doc4=None, doc9="Mới"), encoder, model_name="m", dtype="float32")
+    assert sorted(encoder.texts) == ["Mới", "Đã sửa"]
+    assert (report.added, report.updated, report.deleted, report.unchanged) == (1, 1, 1, 3)
+
+    index = VectorIndex(path)
+    stored = {document["id"]: row for row, document in enumerate(index.documents)}
+    assert sorted(stored) == ["doc0", "doc1", "doc2", "doc3", "doc9"]
+    assert np.array_equal(index.vectors[stored["doc0"]], old_vectors[0])
+    assert index.documents[stored["doc1"]]["metadata"] == {"source": "doc1", "id": "doc1"}
+    assert load_manifest(path).version == report.version == index_version(path)
+
+    version = current_version(path)
+    encoder.texts.clear()
+    assert sync_native_index(path, corpus(doc1="Đã sửa", doc4=None, doc9="Mới"), encoder, model_name="m").version == report.version
+    assert encoder.texts == [] and current_version(path) == version
+
+class EchoProvider(LLMProvider):
+    async def generate(self, prompt, **params):
+        return prompt
+
+class NativeKnowledgeAgent(KnowledgeAgent):
+    encoder = CountingEncoder()
+
+    def _init_vector_store(self):
+        return NativeVectorStore(self.config.native_index_path, self.encoder)
+
+@pytest.mark.asyncio
+async def test_knowledge_agent_picks_up_a_new_index_version(tmp_path):
+    path = str(tmp_path)
+    sync_native_index(path, corpus(), NativeKnowledgeAgent.encoder, dtype="float32")
+    config = RAGConfig(vector_store_backend="native", native_index_path=path, retrieval_k=1,
+                       rerank_enabled=False, index_refresh_seconds=0)
+    agent = NativeKnowledgeAgent(config, EchoProvider())
+    assert (await agent.retrieve("Quy trình số 2", "default"))[0]["page_content"] == "Quy trình số 2"
+
+    report = sync_native_index(path, corpus(doc2="Quy trình nhập kho SOP_Warehouse_002"), NativeKnowledgeAgent.encoder, dtype="float32")
+    documents = await agent.retrieve("SOP_Warehouse_002", "default")
+    assert agent.index_version == report.version
+    assert documents[0]["page_content"] == "Quy trình nhập kho SOP_Warehouse_002"
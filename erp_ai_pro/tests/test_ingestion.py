@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+from erp_ai_pro.cognitive.indexing import KnowledgeDocument
+from erp_ai_pro.cognitive.ingestion import IngestionPipeline, chunk_document, read_knowledge_base
+from erp_ai_pro.cognitive.vector_index import VectorIndex, current_version
+from erp_ai_pro.tests.test_indexing import CountingEncoder
+
+def make_encoder():
+    """Module-level, so spawned pool workers can build it."""
+    return CountingEncoder()
+
+class FailingEncoder(CountingEncoder):
+    """Fails on the call after `calls` successful ones, like a crashed ingestion run."""
+    def __init__(self, calls):
+        super().__init__()
+        self.calls = calls
+
+    def __call__(self, texts):
+        if self.calls == 0:
+            raise RuntimeError("worker crashed")
+        self.calls -= 1
+        return super().__call__(texts)
+
+def write_jsonl(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"sop{i}", "content": f"Quy trình kho số {i} " * 3, "metadata": {"n": i}}, ensure_ascii=False) + "\n")
+    return str(path)
+
+def test_long_documents_are_chunked_with_overlap():
+    document = KnowledgeDocument("sop1", " ".join(f"w{i}" for i in range(25)), {"source": "SOP"})
+    chunks = chunk_document(document, chunk_tokens=10, overlap=2)
+    assert [chunk.id for chunk in chunks] == ["sop1#0", "sop1#1", "sop1#2"]
+    assert chunks[0].content.split() == [f"w{i}" for i in range(10)]
+    assert chunks[1].content.split()[0] == "w8" and chunks[-1].content.split()[-1] == "w24"
+    assert chunks[2].metadata == {"source": "SOP", "source_id": "sop1", "chunk": 2}
+    assert chunk_document(document, chunk_tokens=30) == [document]
+
+def test_interrupted_sync_resumes_from_its_checkpoint(tmp_path):
+    source = write_jsonl(tmp_path / "kb.jsonl", 10)
+    path = str(tmp_path / "index")
+    crashing = FailingEncoder(calls=2)
+    with pytest.raises(RuntimeError):
+        IngestionPipeline(lambda: crashing, batch_size=3).sync_native(path, read_knowledge_base(source))
+    assert current_version(path) is None
+
+    encoder = CountingEncoder()
+    report = IngestionPipeline(lambda: encoder, batch_size=3).sync_native(path, read_knowledge_base(source))
+    # The two batches embedded before the crash are not embedded again.
+    assert len(encoder.texts) == 10 - 2 * 3
+    assert report.added == 10 and [stage.name for stage in report.stages] == ["read", "chunk", "embed", "write"]
+    assert report.stages[0].items == 10 and report.stages[2].items == 4
+    assert len(VectorIndex(path).documents) == 10
+    assert not (tmp_path / "index" / "ingest").exists()
+
+def test_process_pool_matches_in_process_embedding(tmp_path):
+    source = write_jsonl(tmp_path / "kb.jsonl", 12)
+    IngestionPipeline(make_encoder, workers=2, batch_size=4).sync_native(str(tmp_path / "pool"), read_knowledge_base(source), dtype="float32")
+    IngestionPipeline(make_encoder, workers=0, batch_size=5).sync_native(str(tmp_path / "local"), read_knowledge_base(source), dtype="float32")
+    pooled, local = VectorIndex(str(tmp_path / "pool")), VectorIndex(str(tmp_path / "local"))
+    assert [document["id"] for document in pooled.documents] == [document["id"] for document in local.documents]
+    assert np.allclose(pooled.vectors, local.vectors)
+
+def test_lost_staged_batch_is_embedded_again(tmp_path):
+    source = write_jsonl(tmp_path / "kb.jsonl", 7)
+    encoder = CountingEncoder()
+    pipeline = IngestionPipeline(lambda: encoder, batch_size=3)
+    assemble = pipeline._assemble
+    def losing_assemble(writer, *args):
+        sorted((tmp_path / "index" / "ingest").glob("batch-*.npy"))[0].unlink()
+        return assemble(writer, *args)
+    pipeline._assemble = losing_assemble
+    pipeline.sync_native(str(tmp_path / "index"), read_knowledge_base(source), dtype="float32")
+    assert len(encoder.texts) == 7 + 3
+    IngestionPipeline(CountingEncoder, batch_size=3).sync_native(str(tmp_path / "clean"), read_knowledge_base(source), dtype="float32")
+    index, clean = VectorIndex(str(tmp_path / "index")), VectorIndex(str(tmp_path / "clean"))
+    assert [document["id"] for document in index.documents] == [document["id"] for document in clean.documents]
+    assert np.allclose(index.vectors, clean.vectors)
+    assert not list((tmp_path / "index").glob("*/staging.npy"))
@@ -0,0 +1,186 @@
+import pytest
+
+from erp_ai_pro.cognitive.agents.knowledge_agent import KnowledgeAgent
+from erp_ai_pro.cognitive.llm_providers import LLMProvider
+from erp_ai_pro.config.rag_config import RAGConfig
+
+class ChunkedProvider(LLMProvider):
+    """Provider fake that streams a fixed answer in word-sized chunks."""
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    async def generate(self, prompt, **params):
+        self.prompts.append(prompt)
+        return self.answer
+
+    async def stream(self, prompt, **params):
+        self.prompts.append(prompt)
+        for word in self.answer.split(" "):
+            yield word + " "
+
+class StaticKnowledgeAgent(KnowledgeAgent):
+    """KnowledgeAgent without a vector store; retrieval returns fixed documents."""
+    def _init_vector_store(self):
+        return None
+
+    async def retrieve(self, question, role):
+        return [{"page_content": "Returns are accepted within 30 days.", "metadata": {}}]
+
+@pytest.mark.asyncio
+async def test_stream_yields_tokens_then_result_matching_execute():
+    llm = ChunkedProvider("Within 30 days.")
+    agent = StaticKnowledgeAgent(RAGConfig(), llm)
+    events = [event async for event in agent.stream("What is the return policy?", role="default")]
+
+    assert [event["event"] for event in events] == ["token", "token", "token", "result"]
+    assert "".join(event["data"]["text"] for event in events[:-1]) == "Within 30 days. "
+    result = events[-1]["data"]
+    assert result["answer"] == "Within 30 days."
+    assert result == await agent.execute("What is the return policy?", role="default")
+    assert "Returns are accepted within 30 days." in llm.prompts[0]
+
+class BatchCountingProvider(ChunkedProvider):
+    def __init__(self, answer):
+        super().__init__(answer)
+        self.batches = []
+
+    async def generate_batch(self, prompts, **params):
+        self.batches.append(len(prompts))
+        return [await self.generate(prompt) for prompt in prompts]
+
+@pytest.mark.asyncio
+async def test_execute_batch_generates_in_one_call_and_matches_execute():
+    llm = BatchCountingProvider("Within 30 days.")
+    agent = StaticKnowledgeAgent(RAGConfig(), llm)
+    queries = [("What is the return policy?", "default"), ("Chính sách đổi trả?", "customer_service")]
+    results = await agent.execute_batch(queries)
+
+    assert llm.batches == [2]
+    assert results[0] == await agent.execute(*queries[0])
+    assert [result["answer"] for result in results] == ["Within 30 days.", "Within 30 days."]
+
+@pytest.mark.asyncio
+async def test_main_system_batch_yields_every_item_once():
+    from erp_ai_pro.cognitive.main_system import MainSystem
+    from erp_ai_pro.config.config import SystemConfig
+
+    config = SystemConfig(llm_backend="fake", fake_llm_latency_ms=1, fake_llm_tokens_per_second=0,
+                          semantic_routing_enabled=False, response_cache_enabled=False,
+                          preload_agents=[], batch_generation_size=2)
+    system = MainSystem(config)
+    await system.setup()
+    llm = BatchCountingProvider("Within 30 days.")
+    system.agents.add("KnowledgeAgent", StaticKnowledgeAgent(RAGConfig(), llm))
+
+    items = [("What is the return policy?", "default"), ("Hello there", "default"),
+             ("How do I onboard a new employee?", "hr_manager"), ("Explain our warehouse SOP", "warehouse_manager"),
+             ("What is today's date?", "admin")]
+    results = dict([item async for item in system.query_batch(items)])
+
+    assert sorted(results) == list(range(len(items)))
+    assert [results[index]["chosen_agent"] for index in range(len(items))] == [
+        "KnowledgeAgent", "FallbackAgent", "KnowledgeAgent", "KnowledgeAgent", "LiveERPAgent"]
+    assert sorted(llm.batches) == [1, 2]
+
+@pytest.mark.asyncio
+async def test_main_system_batch_answers_every_item_when_the_batch_fails():
+    from erp_ai_pro.cognitive.main_system import MainSystem
+    from erp_ai_pro.config.config import SystemConfig
+
+    config = SystemConfig(llm_backend="fake", fake_llm_latency_ms=1, fake_llm_tokens_per_second=0,
+                          semantic_routing_enabled=False, response_cache_enabled=False, preload_agents=[])
+    system = MainSystem(config)
+    await system.setup()
+    system.agents.add("KnowledgeAgent", StaticKnowledgeAgent(RAGConfig(), BatchCountingProvider("Within 30 days.")))
+
+    async def failing_cache_response(*args):
+        raise RuntimeError("cache unavailable")
+    system._cache_response = failing_cache_response
+
+    items = [("What is the return policy?", "default"), ("What is the warehouse SOP?", "default")]
+    results = dict([item async for item in system.query_batch(items)])
+    assert sorted(results) == [0, 1]
+    assert all(result["error"] == "cache unavailable" for result in results.values())
+
+class CountingKnowledgeAgent(StaticKnowledgeAgent):
+    retrievals = 0
+
+    async def retrieve(self, question, role):
+        self.retrievals += 1
+        return await super().retrieve(question, role)
+
+@pytest.mark.asyncio
+async def test_main_system_batch_uses_speculated_retrievals():
+    from erp_ai_pro.cognitive.main_system import MainSystem
+    from erp_ai_pro.config.config import SystemConfig
+
+    config = SystemConfig(llm_backend="fake", fake_llm_latency_ms=1, fake_llm_tokens_per_second=0,
+                          semantic_routing_enabled=False, response_cache_enabled=False, preload_agents=[],
+                          speculative_execution=True)
+    system = MainSystem(config)
+    await system.setup()
+    agent = CountingKnowledgeAgent(RAGConfig(), BatchCountingProvider("Within 30 days."))
+    system.agents.add("KnowledgeAgent", agent)
+
+    items = [("What is the return policy?", "default"), ("What is the warehouse SOP?", "default")]
+    results = dict([item async for item in system.query_batch(items)])
+    assert [results[index]["answer"] for index in range(2)] == ["Within 30 days.", "Within 30 days."]
+    assert agent.retrievals == 2
+
+@pytest.mark.asyncio
+async def test_main_system_batch_admits_every_item():
+    from erp_ai_pro.cognitive.main_system import MainSystem
+    from erp_ai_pro.config.config import SystemConfig
+    from erp_ai_pro.presentation.admission import AdmissionController
+
+    config = SystemConfig(llm_backend="fake", fake_llm_latency_ms=1, fake_llm_tokens_per_second=0,
+                          semantic_routing_enabled=False, response_cache_enabled=False,
+                          preload_agents=[], batch_generation_size=2)
+    system = MainSystem(config)
+    await system.setup()
+    system.agents.add("KnowledgeAgent", StaticKnowledgeAgent(RAGConfig(), BatchCountingProvider("Within 30 days.")))
+    controller = AdmissionController(2, {"standard": []}, {"standard": 5.0})
+    peak = []
+    acquire = controller.acquire
+    async def recording_acquire(role):
+        ticket = await acquire(role)
+        peak.append(controller.active)
+        return ticket
+    controller.acquire = recording_acquire
+
+    items = [(f"What is the return policy for item {i}?", "default") for i in range(5)] + [("Hello there", "default")]
+    results = dict([item async for item in system.query_batch(items, admission=controller)])
+    assert sorted(results) == list(range(len(items)))
+    assert all("error" not in result for result in results.values())
+    assert len(peak) == len(items) and max(peak) <= 2
+    assert controller.status()["in_flight"] == 0
+
+class SearchRecordingAgent(KnowledgeAgent):
+    """KnowledgeAgent over a stand-in vector store that records the k of each search."""
+    def _init_vector_store(self):
+        self.searches = []
+        return object()
+
+    def _dense_search(self, question, k, role=None):
+        self.searches.append(k)
+        return []
+
+@pytest.mark.asyncio
+async def test_retrieval_without_reranking_fetches_only_the_prompt_documents():
+    agent = SearchRecordingAgent(RAGConfig(hybrid_retrieval_enabled=False, retrieval_k=5, rerank_k=5), ChunkedProvider(""))
+    assert agent.reranker is None
+    agent = SearchRecordingAgent(RAGConfig(hybrid_retrieval_enabled=False, rerank_enabled=False, retrieval_k=10, rerank_k=5),
+                                 ChunkedProvider(""))
+    await agent.retrieve("What is the return policy?", "default")
+    assert agent.searches == [5]
+
+class FailingProvider(ChunkedProvider):
+    async def generate(self, prompt, **params):
+        raise RuntimeError("model unavailable")
+
+@pytest.mark.asyncio
+async def test_failed_answer_carries_an_error():
+    agent = StaticKnowledgeAgent(RAGConfig(), FailingProvider(""))
+    result = await agent.execute("What is the return policy?", role="default")
+    assert result["error"] == "model unavailable" and result["answer"].startswith("Xin lỗi")
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from pydantic import BaseModel, Field
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.agents.orchestrator import OrchestratorAgent
+from erp_ai_pro.cognitive.llm_providers import FakeLLMProvider, HuggingFaceLLMProvider
+
+class SlowPipeline:
+    """HF-pipeline-shaped callable that blocks its thread like real generation does."""
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.threads = set()
+        self.calls = []
+
+    def __call__(self, prompts, max_new_tokens=None, return_full_text=True, **kwargs):
+        self.threads.add(threading.current_thread().name)
+        self.calls.append((list(prompts), max_new_tokens, kwargs.get("do_sample")))
+        time.sleep(self.delay)
+        return [[{"generated_text": f" answer to {prompt} "}] for prompt in prompts]
+
+@pytest.mark.asyncio
+async def test_hf_provider_runs_off_the_event_loop():
+    pipeline = SlowPipeline()
+    provider = HuggingFaceLLMProvider(pipeline)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    ticking = asyncio.ensure_future(ticker())
+    answer = await provider.generate("q", max_tokens=8)
+    ticking.cancel()
+    assert answer == "answer to q"
+    assert ticks > 3
+    assert all(name.startswith("hf-llm") for name in pipeline.threads)
+
+@pytest.mark.asyncio
+async def test_hf_provider_batches_in_one_pipeline_call():
+    pipeline = SlowPipeline(delay=0)
+    provider = HuggingFaceLLMProvider(pipeline)
+    answers = await provider.generate_batch(["a", "b"], max_tokens=4, temperature=0.0)
+    assert answers == ["answer to a", "answer to b"]
+    assert pipeline.calls == [(["a", "b"], 4, False)]
+
+class ProjectTasksInput(BaseModel):
+    project_id: str = Field(description="The project ID.")
+
+class ProjectTasksTool:
+    """Lists the tasks of a project."""
+    input_schema = ProjectTasksInput
+
+@pytest.mark.asyncio
+async def test_fake_provider_plans_valid_tool_calls_and_answers():
+    provider = FakeLLMProvider(latency_ms=0, tokens_per_second=0, answer_tokens=5)
+    config = SystemConfig(semantic_routing_enabled=False, routing_mode="plan")
+    orchestrator = OrchestratorAgent(provider, config, tools={"get_tasks_by_project": ProjectTasksTool()})
+
+    decision = await orchestrator.route("List all tasks for project PROJ-WEB")
+    assert (decision.tool_name, decision.tool_input) == ("get_tasks_by_project", {"project_id": "PROJ-WEB"})
+    decision = await orchestrator.route("List all tasks for project PROJ-WEB", allowed_tools=[], role="guest")
+    assert decision.agent == "KnowledgeAgent"
+    assert (await orchestrator.route("Dự báo doanh thu quý tới")).agent == "BusinessIntelligenceAgent"
+
+    answer = await provider.generate("Explain onboarding", max_tokens=3)
+    assert len(answer.split()) == 3
+    assert "".join([chunk async for chunk in provider.stream("Explain onboarding", max_tokens=3)]) == answer
+    # Three routing plans of one token each, then two answers of three tokens.
+    assert provider.completion_tokens == 3 + 2 * 3
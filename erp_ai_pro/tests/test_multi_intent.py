@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.main_system import MULTI_INTENT, MainSystem
+
+class SlowKnowledgeAgent:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def retrieve(self, question, role):
+        return []
+
+    async def execute(self, question, role, source_documents=None):
+        await asyncio.sleep(self.delay)
+        return {"answer": "Returns are accepted within 30 days.", "source_documents": [{"page_content": "policy", "metadata": {}}]}
+
+async def make_system(knowledge_delay, **overrides):
+    config = SystemConfig(llm_backend="fake", fake_llm_latency_ms=1, fake_llm_tokens_per_second=0,
+                          semantic_routing_enabled=False, response_cache_enabled=False, preload_agents=[], **overrides)
+    system = MainSystem(config)
+    await system.setup()
+    system.agents.add("KnowledgeAgent", SlowKnowledgeAgent(knowledge_delay))
+    return system
+
+@pytest.mark.asyncio
+async def test_compound_question_fans_out_and_merges():
+    system = await make_system(0.2)
+    start = time.perf_counter()
+    result = await system.query("What is today's date and what is the return policy?", "admin")
+    assert time.perf_counter() - start < 0.4
+    assert result["chosen_agent"] == MULTI_INTENT
+    assert [intent["chosen_agent"] for intent in result["intents"]] == ["LiveERPAgent", "KnowledgeAgent"]
+    assert "Today's date is" in result["answer"] and "30 days" in result["answer"]
+    assert len(result["source_documents"]) == 1
+
+@pytest.mark.asyncio
+async def test_slow_branch_times_out_without_failing_the_others():
+    system = await make_system(1.0, multi_intent_timeouts={"KnowledgeAgent": 0.05})
+    result = await system.query("What is today's date and what is the return policy?", "admin")
+    date, policy = result["intents"]
+    assert "error" not in date
+    assert policy["timed_out"] is True
+
+@pytest.mark.asyncio
+async def test_same_tool_with_different_inputs_fans_out():
+    system = await make_system(0)
+    result = await system.query("Calculate 12 * 7 and calculate 3 + 4", "admin")
+    assert result["chosen_agent"] == MULTI_INTENT
+    assert [intent["chosen_agent"] for intent in result["intents"]] == ["LiveERPAgent", "LiveERPAgent"]
+
+@pytest.mark.asyncio
+async def test_agreeing_intents_reuse_their_decision():
+    system = await make_system(0)
+    orchestrator = system.agents["OrchestratorAgent"]
+    routed = []
+    route = orchestrator.route
+    async def recording_route(question, **kwargs):
+        routed.append(question)
+        return await route(question, **kwargs)
+    orchestrator.route = recording_route
+    result = await system.query("What is the return policy and how does onboarding work?", "admin")
+    assert result["chosen_agent"] == "KnowledgeAgent"
+    assert len(routed) == 2
@@ -0,0 +1,245 @@
+import asyncio
+import zlib
+
+import numpy as np
+import pytest
+from pydantic import BaseModel, Field
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.agents.orchestrator import (
+    OrchestratorAgent, RoutingBatcher, RoutingDecision, SemanticRouter, build_plan_schema, cache_entry_from_decision,
+    parse_agent_name, split_intents,
+)
+from erp_ai_pro.cognitive.llm_providers import HuggingFaceLLMProvider, LLMProvider
+
+EXAMPLES = {
+    "LiveERPAgent": ["what are my tasks", "stock for product"],
+    "KnowledgeAgent": ["what is the return policy", "explain the onboarding process"],
+    "FallbackAgent": ["hi", "hello"],
+}
+
+def bag_of_words_encoder(texts):
+    """A deterministic stand-in for a sentence embedding model."""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in text.lower().replace("?", "").split():
+            vectors[row, zlib.crc32(token.encode()) % 64] += 1.0
+    return vectors
+
+class RecordingLLM:
+    """Minimal HF-pipeline-shaped callable that records the prompts it receives."""
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+        self.calls = 0
+
+    def __call__(self, prompts, return_full_text=True, **kwargs):
+        self.calls += 1
+        self.prompts.extend(prompts)
+        prefix = lambda prompt: prompt if return_full_text else ""
+        return [[{"generated_text": prefix(prompt) + self.answer}] for prompt in prompts]
+
+def make_orchestrator(llm):
+    config = SystemConfig(semantic_routing_enabled=False, routing_mode="generate", routing_batch_max_wait_ms=50)
+    router = SemanticRouter(EXAMPLES, encoder=bag_of_words_encoder, min_score=0.6, min_margin=0.1)
+    return OrchestratorAgent(HuggingFaceLLMProvider(llm), config, semantic_router=router)
+
+def test_semantic_router_confident_match():
+    router = SemanticRouter(EXAMPLES, encoder=bag_of_words_encoder, min_score=0.6, min_margin=0.1)
+    decision = router.route("What are my tasks?")
+    assert decision.agent == "LiveERPAgent"
+    assert decision.method == "semantic"
+    assert decision.confidence == pytest.approx(1.0)
+
+def test_semantic_router_defers_ambiguous_question():
+    router = SemanticRouter(EXAMPLES, encoder=bag_of_words_encoder, min_score=0.6, min_margin=0.1)
+    assert router.route("quarterly revenue forecast") is None
+
+@pytest.mark.asyncio
+async def test_route_skips_llm_on_semantic_hit():
+    llm = RecordingLLM("KnowledgeAgent")
+    orchestrator = make_orchestrator(llm)
+    assert await orchestrator.route_request("what are my tasks") == "LiveERPAgent"
+    assert llm.prompts == []
+
+@pytest.mark.asyncio
+async def test_route_falls_back_to_llm_when_ambiguous():
+    llm = RecordingLLM("KnowledgeAgent")
+    orchestrator = make_orchestrator(llm)
+    decision = await orchestrator.route("quarterly revenue forecast", allowed_tools=["vector_search"])
+    assert decision.agent == "KnowledgeAgent"
+    assert decision.method == "llm"
+    assert len(llm.prompts) == 1
+
+@pytest.mark.asyncio
+async def test_image_routes_to_multimodal():
+    orchestrator = make_orchestrator(RecordingLLM("KnowledgeAgent"))
+    assert await orchestrator.route_request("what is this?", has_image=True) == "MultimodalAgent"
+
+@pytest.mark.asyncio
+async def test_concurrent_llm_routes_share_one_generate_call():
+    llm = RecordingLLM("KnowledgeAgent")
+    orchestrator = make_orchestrator(llm)
+    questions = [f"quarterly revenue forecast {i}" for i in range(5)]
+    agents = await asyncio.gather(*(orchestrator.route_request(q) for q in questions))
+    assert agents == ["KnowledgeAgent"] * 5
+    assert llm.calls == 1
+    assert len(llm.prompts) == 5
+
+@pytest.mark.asyncio
+async def test_batcher_respects_max_batch_size_and_propagates_errors():
+    batches = []
+
+    async def process(items):
+        batches.append(list(items))
+        if "boom" in items:
+            raise RuntimeError("generation failed")
+        return [item.upper() for item in items]
+
+    batcher = RoutingBatcher(process, max_batch_size=2, max_wait_ms=20)
+    results = await asyncio.gather(*(batcher.submit(x) for x in ["a", "b", "c"]))
+    assert results == ["A", "B", "C"]
+    assert [len(batch) for batch in batches] == [2, 1]
+
+    with pytest.raises(RuntimeError):
+        await batcher.submit("boom")
+
+class ScoringProvider(LLMProvider):
+    """Provider fake that strongly prefers continuations spelling `target`."""
+    def __init__(self, target):
+        self.target = target
+        self.calls = 0
+
+    async def score_continuations(self, candidates):
+        self.calls += 1
+        return [-0.1 if continuation == self.target else -8.0 for _, continuation in candidates]
+
+@pytest.mark.asyncio
+async def test_logprob_routing_returns_distribution():
+    llm = ScoringProvider("BusinessIntelligenceAgent")
+    config = SystemConfig(semantic_routing_enabled=False, routing_mode="logprob")
+    orchestrator = OrchestratorAgent(llm, config)
+    decision = await orchestrator.route("quarterly revenue forecast")
+    assert decision.agent == "BusinessIntelligenceAgent"
+    assert decision.confidence > 0.99
+    assert sum(decision.scores.values()) == pytest.approx(1.0)
+    assert llm.calls == 1
+
+def test_parse_agent_name_tolerates_punctuation():
+    assert parse_agent_name("LiveERPAgent.") == "LiveERPAgent"
+    assert parse_agent_name("**KnowledgeAgent**") == "KnowledgeAgent"
+    assert parse_agent_name("I think so") is None
+
+@pytest.mark.asyncio
+async def test_routing_cache_serves_normalized_repeats_per_role():
+    llm = RecordingLLM("KnowledgeAgent")
+    orchestrator = make_orchestrator(llm)
+    first = await orchestrator.route("Tồn kho sản phẩm PROD001?", role="inventory_clerk")
+    second = await orchestrator.route("tồn kho  sản phẩm PROD002", role="inventory_clerk")
+    assert (first.method, second.method) == ("llm", "cache")
+    assert second.agent == "KnowledgeAgent"
+    await orchestrator.route("tồn kho sản phẩm PROD002", role="sales_rep")
+    assert llm.calls == 2
+
+class ProjectTasksInput(BaseModel):
+    project_id: str = Field(description="The project ID.")
+
+class ProjectTasksTool:
+    """Lists the tasks of a project."""
+    input_schema = ProjectTasksInput
+
+class PlanningLLM(RecordingLLM):
+    """Answers every plan prompt with a plan built from the project ID in the question."""
+    def __call__(self, prompts, **kwargs):
+        self.calls += 1
+        self.prompts.extend(prompts)
+        outputs = []
+        for prompt in prompts:
+            project_id = prompt.split("project ")[-1].split('"')[0]
+            plan = f'{{"agent": "LiveERPAgent", "tool": "get_tasks_by_project", "arguments": {{"project_id": "{project_id}"}}}}'
+            outputs.append([{"generated_text": plan}])
+        return outputs
+
+def make_planner(llm):
+    config = SystemConfig(semantic_routing_enabled=False, routing_mode="plan")
+    return OrchestratorAgent(HuggingFaceLLMProvider(llm), config, tools={"get_tasks_by_project": ProjectTasksTool()})
+
+@pytest.mark.asyncio
+async def test_plan_mode_returns_tool_call_in_one_generation():
+    llm = PlanningLLM("")
+    orchestrator = make_planner(llm)
+    decision = await orchestrator.route("List all tasks for project PROJ-WEB", allowed_tools=["get_tasks_by_project"])
+    assert (decision.agent, decision.tool_name) == ("LiveERPAgent", "get_tasks_by_project")
+    assert decision.tool_input == {"project_id": "PROJ-WEB"}
+    assert llm.calls == 1
+    assert "get_tasks_by_project" in llm.prompts[0]
+
+@pytest.mark.asyncio
+async def test_cached_plan_is_reused_for_another_entity():
+    llm = PlanningLLM("")
+    orchestrator = make_planner(llm)
+    await orchestrator.route("List all tasks for project PROJ-WEB", allowed_tools=["get_tasks_by_project"])
+    decision = await orchestrator.route("list all tasks for project PROJ-APP", allowed_tools=["get_tasks_by_project"])
+    assert decision.method == "cache"
+    assert decision.tool_input == {"project_id": "PROJ-APP"}
+    assert llm.calls == 1
+
+class UppercasingPlanningLLM(PlanningLLM):
+    """Plans like PlanningLLM but upper-cases the project ID, as LLMs often do."""
+    def __call__(self, prompts, **kwargs):
+        self.calls += 1
+        project_ids = [prompt.split("project ")[-1].split('"')[0].upper() for prompt in prompts]
+        return [[{"generated_text": f'{{"agent": "LiveERPAgent", "tool": "get_tasks_by_project", "arguments": {{"project_id": "{project_id}"}}}}'}]
+                for project_id in project_ids]
+
+@pytest.mark.asyncio
+async def test_plan_with_rewritten_entity_caches_only_the_agent():
+    llm = UppercasingPlanningLLM("")
+    orchestrator = make_planner(llm)
+    first = await orchestrator.route("list tasks of project proj-001", allowed_tools=["get_tasks_by_project"])
+    assert first.tool_input == {"project_id": "PROJ-001"}
+    decision = await orchestrator.route("list tasks of project proj-002", allowed_tools=["get_tasks_by_project"])
+    assert (decision.method, decision.tool_input) == ("cache", {"project_id": "PROJ-002"})
+    assert llm.calls == 2
+
+def test_cache_entry_keeps_only_tool_calls_rebuilt_from_entities():
+    entities = ["@nhanvien_A"]
+    free_text = RoutingDecision("LiveERPAgent", "llm", tool_name="create_task",
+                                tool_input={"title": "bán hàng", "assignee_id": "nhanvien_A"})
+    assert cache_entry_from_decision(free_text, entities)["tool_name"] is None
+    entity_only = RoutingDecision("LiveERPAgent", "llm", tool_name="get_tasks_by_assignee", tool_input={"assignee_id": "nhanvien_A"})
+    assert cache_entry_from_decision(entity_only, entities)["tool_input"] == {"assignee_id": "<entity:0:bare>"}
+
+@pytest.mark.asyncio
+async def test_plan_without_permitted_tool_has_no_tool_call():
+    llm = PlanningLLM("")
+    orchestrator = make_planner(llm)
+    decision = await orchestrator.route("List all tasks for project PROJ-WEB", allowed_tools=["vector_search"])
+    assert decision.tool_name is None
+
+@pytest.mark.asyncio
+async def test_semantic_hit_without_a_fitting_tool_is_not_planned_into_one_or_cached():
+    llm = RecordingLLM('{"agent": "LiveERPAgent", "tool": null, "arguments": {}}')
+    config = SystemConfig(routing_mode="plan")
+    router = SemanticRouter(EXAMPLES, encoder=bag_of_words_encoder, min_score=0.6, min_margin=0.1)
+    orchestrator = OrchestratorAgent(HuggingFaceLLMProvider(llm), config, semantic_router=router,
+                                     tools={"get_tasks_by_project": ProjectTasksTool()})
+    for _ in range(2):
+        decision = await orchestrator.route("what are my tasks", allowed_tools=["get_tasks_by_project"])
+        assert (decision.agent, decision.method, decision.tool_name) == ("LiveERPAgent", "semantic", None)
+    assert llm.calls == 2
+    assert "Orchestrator AI" not in llm.prompts[0]
+    schema = build_plan_schema(["LiveERPAgent"], orchestrator.tools)
+    assert {"agent": {"enum": ["LiveERPAgent"]}, "tool": {"type": "null"}}.items() <= schema["anyOf"][0]["properties"].items()
+
+def test_split_intents_on_conjunctions():
+    assert split_intents("Show my open tasks and the stock of PROD001 and what is our return policy") == [
+        "Show my open tasks", "the stock of PROD001", "what is our return policy"]
+    assert split_intents("Công việc của tôi là gì và chính sách đổi trả thế nào?") == [
+        "Công việc của tôi là gì", "chính sách đổi trả thế nào"]
+    assert split_intents("compare revenue and expenses") == ["compare revenue and expenses"]
+
+def test_split_intents_keeps_clauses_sharing_one_request():
+    for question in ["Quy trình nhập và xuất kho là gì?", "Show sales and profit for Q3",
+                     "What is the return policy and the onboarding process?"]:
+        assert split_intents(question) == [question]
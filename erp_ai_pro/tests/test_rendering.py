@@ -0,0 +1,49 @@
+import pytest
+
+from erp_ai_pro.config.config import SystemConfig
+from erp_ai_pro.cognitive.agents.live_erp_agent import LiveERPAgent
+from erp_ai_pro.cognitive.rendering import ResponseRenderer, detect_language, render_tool_output
+from erp_ai_pro.cognitive.llm_providers import LLMProvider
+from erp_ai_pro.tools.tools import CalculationOutput, TaskSummary, TasksByProjectOutput
+
+class CountingProvider(LLMProvider):
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, prompt, **params):
+        self.prompts.append(prompt)
+        return "Combined answer."
+
+def test_detect_language():
+    assert detect_language("Công việc của tôi là gì?") == "vi"
+    assert detect_language("cong viec cua toi") == "vi"
+    assert detect_language("What are my tasks?") == "en"
+    assert detect_language("Show an invoice") == "en"
+    assert detect_language("Is there a ton of stock in La Paz for an order?") == "en"
+
+def test_task_list_renders_in_both_languages():
+    output = TasksByProjectOutput(project_id="PROJ-WEB", tasks=[
+        TaskSummary(task_id="T-1", title="Design homepage", status="Đang làm", assignee_id="an"),
+    ])
+    assert render_tool_output("get_tasks_by_project", output, "en") == (
+        "Project PROJ-WEB has 1 task(s):\n- T-1: Design homepage (assignee: an, status: In progress)")
+    assert render_tool_output("get_tasks_by_project", output, "vi").startswith("Dự án PROJ-WEB có 1 công việc:")
+    empty = TasksByProjectOutput(project_id="PROJ-X", tasks=[])
+    assert render_tool_output("get_tasks_by_project", empty, "en") == "No tasks found for project PROJ-X."
+
+@pytest.mark.asyncio
+async def test_single_tool_answer_uses_no_llm():
+    llm = CountingProvider()
+    agent = LiveERPAgent(renderer=ResponseRenderer(SystemConfig(), llm=llm))
+    result = await agent.execute("perform_calculation", {"expression": "6 * 7"}, ["perform_calculation"], question="Tính 6 * 7")
+    assert (result["answer"], result["rendered_by"]) == ("Kết quả của 6 * 7 là 42.", "template")
+    assert result["result"] == {"expression": "6 * 7", "result": "42"}
+    assert llm.prompts == []
+
+@pytest.mark.asyncio
+async def test_multi_tool_results_are_phrased_by_llm():
+    llm = CountingProvider()
+    renderer = ResponseRenderer(SystemConfig(), llm=llm)
+    results = [("perform_calculation", CalculationOutput(expression="1+1", result="2")), ("vector_search", "No documents.")]
+    assert await renderer.render("what is 1+1 and the policy", results) == ("Combined answer.", "llm")
+    assert "English" in llm.prompts[0]
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from erp_ai_pro.cognitive.reranking import CrossEncoderReranker
+
+DOCUMENTS = [{"page_content": text, "metadata": {}} for text in
+             ("Office opening hours.", "Returns are accepted within 30 days.", "Holiday calendar.")]
+
+class OverlapScorer:
+    """Scores a passage by the words it shares with the question; counts scored pairs."""
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.pairs = 0
+
+    def __call__(self, pairs):
+        import time
+        time.sleep(self.delay)
+        self.pairs += len(pairs)
+        return [len(set(question.lower().split()) & set(passage.lower().split())) for question, passage in pairs]
+
+@pytest.mark.asyncio
+async def test_rerank_keeps_top_k_and_caches_scores():
+    scorer = OverlapScorer()
+    reranker = CrossEncoderReranker("test", scorer=scorer)
+    documents, outcome = await reranker.rerank("are returns accepted", DOCUMENTS, top_k=1)
+    assert (documents[0]["page_content"], outcome) == ("Returns are accepted within 30 days.", "reranked")
+    _, outcome = await reranker.rerank("Are returns accepted?", DOCUMENTS, top_k=1)
+    assert outcome == "cached"
+    assert scorer.pairs == 3
+
+@pytest.mark.asyncio
+async def test_rerank_is_skipped_over_the_latency_budget():
+    reranker = CrossEncoderReranker("test", scorer=OverlapScorer(delay=0.05), max_latency_ms=50, initial_pair_ms=10)
+    first = asyncio.ensure_future(reranker.rerank("returns", DOCUMENTS, top_k=2))
+    await asyncio.sleep(0)
+    # Three pairs are queued ahead; three more would exceed the 50ms budget.
+    documents, outcome = await reranker.rerank("holiday", DOCUMENTS, top_k=2)
+    assert outcome == "skipped"
+    assert documents == DOCUMENTS[:2]
+    assert (await first)[1] == "reranked"
+
+@pytest.mark.asyncio
+async def test_rerank_cache_keeps_diacritics_apart():
+    scorer = OverlapScorer()
+    reranker = CrossEncoderReranker("test", scorer=scorer)
+    await reranker.rerank("giá bán", DOCUMENTS, top_k=1)
+    _, outcome = await reranker.rerank("giá bàn", DOCUMENTS, top_k=1)
+    assert outcome == "reranked" and scorer.pairs == 6
+
+@pytest.mark.asyncio
+async def test_rerank_probes_after_a_slow_batch_instead_of_skipping_for_good():
+    scorer = OverlapScorer(delay=0.2)
+    reranker = CrossEncoderReranker("test", scorer=scorer, max_latency_ms=30, probe_interval_seconds=0.05)
+    assert (await reranker.rerank("returns", DOCUMENTS, top_k=2))[1] == "reranked"
+    assert (await reranker.rerank("holiday", DOCUMENTS, top_k=2))[1] == "skipped"
+    scorer.delay = 0.0
+    await asyncio.sleep(0.06)
+    assert (await reranker.rerank("office", DOCUMENTS, top_k=2))[1] == "reranked"
+    assert (await reranker.rerank("calendar", DOCUMENTS, top_k=2))[1] == "reranked"
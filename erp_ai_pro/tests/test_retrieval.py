@@ -0,0 +1,57 @@
+from erp_ai_pro.cognitive.rbac import can_read_document, document_filter, role_metadata_fields
+from erp_ai_pro.cognitive.retrieval import BM25Index, HybridRetriever, reciprocal_rank_fusion, tokenize
+from erp_ai_pro.cognitive.vector_index import PUBLIC_ROLE, role_postings
+
+CHUNKS = [
+    ("SOP_Warehouse_001: Quy trình nhập kho hàng hóa tại kho trung tâm.", {"id": "sop-1"}),
+    ("Chính sách đổi trả: khách hàng được đổi trả trong 30 ngày.", {"id": "policy-1"}),
+    ("Quy trình kiểm kê tồn kho định kỳ hàng tháng.", {"id": "stock-1"}),
+    ("Employee onboarding checklist for new hires.", {"id": "hr-1"}),
+]
+
+def make_index():
+    index = BM25Index()
+    index.add_many(CHUNKS)
+    return index
+
+def test_tokenize_folds_diacritics_and_keeps_ids():
+    tokens = tokenize("Tồn kho SOP_Warehouse_001")
+    assert {"ton", "kho", "ton kho", "sop_warehouse_001", "warehouse", "001"} <= set(tokens)
+
+def test_bm25_finds_exact_codes_and_unaccented_terms():
+    index = make_index()
+    assert index.search("SOP_Warehouse_001", 1)[0][0]["metadata"]["id"] == "sop-1"
+    assert index.search("kiem ke ton kho", 1)[0][0]["metadata"]["id"] == "stock-1"
+    assert index.search("xyz", 3) == []
+
+def test_rrf_prefers_documents_found_by_both_retrievers():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]])
+    assert [key for key, _ in fused][:2] == ["c", "a"]
+
+def test_hybrid_retriever_adds_lexical_hits_to_dense_results():
+    documents = [{"page_content": text, "metadata": metadata} for text, metadata in CHUNKS]
+    # Dense search that misses the SOP code entirely.
+    dense = lambda question, k, role: [documents[1], documents[3]][:k]
+    retriever = HybridRetriever(dense, make_index(), candidates_k=4)
+    results = retriever.search("SOP_Warehouse_001 là gì?", k=2)
+    assert "sop-1" in [doc["metadata"]["id"] for doc in results]
+
+def test_bm25_only_returns_documents_the_role_may_read():
+    index = BM25Index()
+    index.add("Quy trình nhập kho SOP_Warehouse_001.", {"id": "sop-1", "authorized_roles": ["warehouse_manager"]})
+    index.add("Quy trình nhập kho hàng trả lại.", {"id": "sop-2", "role_inventory_clerk": True})
+    index.add("Quy trình nhập kho chung.", {"id": "sop-3"})
+    search = lambda role: [doc["metadata"]["id"] for doc, _ in index.search("quy trình nhập kho", 3, role)]
+    assert sorted(search("inventory_clerk")) == ["sop-2", "sop-3"]
+    assert sorted(search("warehouse_manager")) == ["sop-1", "sop-3"]
+    assert sorted(search("admin")) == ["sop-1", "sop-2", "sop-3"]
+
+def test_empty_authorized_roles_restricts_the_document_to_unrestricted_roles():
+    restricted = {"id": "memo-1", "authorized_roles": []}
+    assert not can_read_document("sales_manager", restricted) and can_read_document("admin", restricted)
+    flattened = role_metadata_fields(restricted)
+    assert flattened == {"visible_to_all": False}
+    assert not can_read_document("sales_manager", flattened) and can_read_document("admin", flattened)
+    assert not any(flattened.get(key) is True for clause in document_filter("sales_manager")["$or"] for key in clause)
+    assert can_read_document("sales_manager", {"id": "memo-2"})
+    assert role_postings([restricted, {"id": "memo-2"}])[PUBLIC_ROLE].tolist() == [1]
@@ -0,0 +1,52 @@
+import asyncio
+import io
+import json
+
+import pytest
+from prometheus_client import REGISTRY
+
+from erp_ai_pro.cognitive.tracing import StreamExporter, Tracer, span
+
+@pytest.mark.asyncio
+async def test_spans_nest_and_follow_tasks_into_the_trace():
+    tracer = Tracer()
+
+    async def retrieve():
+        with span("retrieval", agent="KnowledgeAgent"):
+            await asyncio.sleep(0.01)
+
+    with tracer.trace("query", role="analyst") as trace:
+        with span("execute", agent="KnowledgeAgent") as execute:
+            await asyncio.gather(retrieve(), retrieve())
+            with span("llm", agent="KnowledgeAgent"):
+                pass
+
+    spans = trace.to_dict()["spans"]
+    assert [entry["stage"] for entry in spans] == ["retrieval", "retrieval", "llm", "execute"]
+    assert all(entry["parent_id"] == execute.span_id for entry in spans[:3])
+    assert spans[-1]["duration_ms"] >= 10
+
+@pytest.mark.asyncio
+async def test_failed_stage_is_recorded_and_observed():
+    labels = {"stage": "tool", "agent": "LiveERPAgent", "tool": "get_current_date"}
+    before = REGISTRY.get_sample_value("erp_ai_stage_duration_seconds_count", labels) or 0
+    with Tracer().trace("query") as trace:
+        with pytest.raises(RuntimeError):
+            with span("tool", agent="LiveERPAgent", tool="get_current_date"):
+                raise RuntimeError("ERP unreachable")
+    assert trace.to_dict()["spans"][0]["error"] == "RuntimeError: ERP unreachable"
+    assert REGISTRY.get_sample_value("erp_ai_stage_duration_seconds_count", labels) == before + 1
+
+def test_stream_exporter_writes_one_json_line_per_trace():
+    stream = io.StringIO()
+    tracer = Tracer(StreamExporter(stream))
+    with tracer.trace("query", role="ceo"):
+        with span("route", agent="OrchestratorAgent"):
+            pass
+    exported = json.loads(stream.getvalue())
+    assert exported["attributes"] == {"role": "ceo"}
+    assert exported["spans"][0]["agent"] == "OrchestratorAgent"
+    # Outside a trace, spans only feed the histogram.
+    with span("route"):
+        pass
+    assert stream.getvalue().count("\n") == 1
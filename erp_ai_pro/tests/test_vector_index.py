@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from erp_ai_pro.cognitive.vector_index import NativeVectorStore, VectorIndex, current_version, write_index
+
+def random_corpus(count=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"doc{i}" for i in range(count)]
+    return ids, [f"text {i}" for i in ids], [{"n": i} for i in range(count)], vectors
+
+def exact_top(vectors, query, k):
+    return list(np.argsort(vectors @ query)[::-1][:k])
+
+def write(path, dtype, index_type, corpus):
+    ids, texts, metadatas, vectors = corpus
+    write_index(str(path), ids, texts, metadatas, vectors, dtype=dtype, index_type=index_type, nlist=16)
+    return VectorIndex(str(path))
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_flat_search_matches_exact_ranking(tmp_path, dtype):
+    corpus = random_corpus()
+    index = write(tmp_path, dtype, "flat", corpus)
+    rng = np.random.default_rng(1)
+    recall = []
+    for query in corpus[3][rng.choice(len(corpus[3]), 20)] + 0.1 * rng.normal(size=(20, 32)):
+        query = (query / np.linalg.norm(query)).astype(np.float32)
+        found = [index.documents[row]["id"] for row, _ in index.search(query, 10)]
+        expected = [corpus[0][row] for row in exact_top(corpus[3], query, 10)]
+        recall.append(len(set(found) & set(expected)) / 10)
+    assert np.mean(recall) >= (1.0 if dtype == "float32" else 0.95)
+
+def test_ivf_probing_every_list_is_exact(tmp_path):
+    corpus = random_corpus()
+    index = write(tmp_path, "float32", "ivf", corpus)
+    query = corpus[3][7]
+    rows = [row for row, _ in index.search(query, 5, nprobe=16)]
+    assert [index.documents[row]["id"] for row in rows] == [corpus[0][row] for row in exact_top(corpus[3], query, 5)]
+    assert index.documents[index.search(query, 1, nprobe=1)[0][0]]["id"] == "doc7"
+
+def test_new_version_is_published_atomically(tmp_path):
+    first = write(tmp_path, "int8", "flat", random_corpus(count=50))
+    write(tmp_path, "int8", "flat", random_corpus(count=60, seed=1))
+    assert current_version(str(tmp_path)) != first.version
+    # An index opened before the swap keeps serving its own version.
+    assert first.count == 50 and len(first.search(first.vectors[0].astype(np.float32), 3)) == 3
+    assert VectorIndex(str(tmp_path)).count == 60
+
+def test_native_store_matches_the_vector_store_interface(tmp_path):
+    vocabulary = ["return", "policy", "warehouse", "receiving", "onboarding", "laptop"]
+    def encoder(texts):
+        return np.array([[float(word in text.lower()) + 1e-3 for word in vocabulary] for text in texts], dtype=np.float32)
+    texts = ["Return policy: 30 days.", "Warehouse receiving procedure.", "Onboarding and laptop requests."]
+    store = NativeVectorStore.from_texts(str(tmp_path), texts, encoder, metadatas=[{"source": str(i)} for i in range(3)])
+    assert store.similarity_search("warehouse receiving", k=1)[0].page_content == texts[1]
+    assert store.get(include=["documents", "metadatas"])["documents"] == texts
+
+def test_role_search_only_scans_readable_rows_and_still_fills_k(tmp_path):
+    ids, texts, _, vectors = random_corpus()
+    # 3% of the documents belong to the clerk, a few are public, the rest to the sales manager.
+    metadatas = [{"authorized_roles": ["inventory_clerk"]} if i % 33 == 0 else {} if i % 50 == 1
+                 else {"authorized_roles": ["sales_manager"]} for i in range(len(ids))]
+    write_index(str(tmp_path), ids, texts, metadatas, vectors, dtype="int8", index_type="ivf", nlist=16)
+    index = VectorIndex(str(tmp_path))
+    readable = [row for row, document in enumerate(index.documents) if document["metadata"].get("authorized_roles") in (None, ["inventory_clerk"])]
+    assert index.allowed_rows("inventory_clerk").tolist() == readable
+    assert index.allowed_rows("admin") is None
+
+    rows = [row for row, _ in index.search(vectors[0], 10, nprobe=1, rows=index.allowed_rows("inventory_clerk"))]
+    assert len(rows) == 10 and set(rows) <= set(readable)
+    assert index.documents[rows[0]]["id"] == "doc0"
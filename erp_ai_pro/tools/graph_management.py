@@ -1,10 +1,6 @@
-from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from neo4j import GraphDatabase
-from neo4j.exceptions import ServiceUnavailable, AuthError
 import logging
-from erp_ai_pro.core.rag_config import RAGConfig
+from typing import Optional
+from erp_ai_pro.config.rag_config import RAGConfig
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -52,10 +48,11 @@ Cypher: MATCH (p:Product {{name: 'Product A'}}) RETURN p.stock
 **Question:** {question}
 **Cypher Query:**
 """
-CYPHER_PROMPT = PromptTemplate.from_template(CYPHER_GENERATION_TEMPLATE)
 
 class Neo4jConnection:
     def __init__(self, uri, username, password):
+        from neo4j import GraphDatabase
+        from neo4j.exceptions import ServiceUnavailable, AuthError
         try:
             self.driver = GraphDatabase.driver(uri, auth=(username, password))
             self.verify_connection()
@@ -74,6 +71,7 @@ class Neo4jConnection:
 
     def verify_connection(self):
         """Verifies the connection to the database by running a simple query."""
+        from neo4j.exceptions import ServiceUnavailable, AuthError
         try:
             with self.driver.session() as session:
                 session.run("RETURN 1")
@@ -87,6 +85,7 @@ class Neo4jConnection:
             raise
 
     def query(self, cypher_query: str) -> list[dict]:
+        from neo4j.exceptions import ServiceUnavailable
         try:
             with self.driver.session() as session:
                 result = session.run(cypher_query)
@@ -99,20 +98,33 @@ class Neo4jConnection:
             logger.error(f"An unexpected error occurred during query execution: {e}")
             raise
 
-# Initialize Neo4j connection using RAGConfig
-rag_config = RAGConfig()
-neo4j_connection = Neo4jConnection(
-    rag_config.neo4j_uri,
-    rag_config.neo4j_username,
-    rag_config.neo4j_password
-)
+_neo4j_connection: Optional[Neo4jConnection] = None
+
+def get_neo4j_connection() -> Neo4jConnection:
+    """
+    Returns the shared Neo4j connection, connecting on first use (using RAGConfig) rather
+    than when this module is imported.
+    """
+    global _neo4j_connection
+    if _neo4j_connection is None:
+        rag_config = RAGConfig()
+        _neo4j_connection = Neo4jConnection(
+            rag_config.neo4j_uri,
+            rag_config.neo4j_username,
+            rag_config.neo4j_password
+        )
+    return _neo4j_connection
 
 # Chain for Cypher generation
 def get_cypher_generation_chain(llm):
+    from langchain.prompts import PromptTemplate
+    from langchain_core.runnables import RunnablePassthrough
+    from langchain_core.output_parsers import StrOutputParser
+
+    cypher_prompt = PromptTemplate.from_template(CYPHER_GENERATION_TEMPLATE)
     return (
         RunnablePassthrough.assign(graph_schema=lambda x: GRAPH_SCHEMA)
-        | CYPHER_PROMPT
+        | cypher_prompt
         | llm.bind(stop=["\nCypher Query:"]) # Stop generation after the query
         | StrOutputParser()
     )
-
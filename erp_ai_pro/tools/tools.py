@@ -1,23 +1,36 @@
 from pydantic import BaseModel, Field
+from typing import List, Optional
 import datetime
-from .graph_management import neo4j_connection, get_cypher_generation_chain, GRAPH_SCHEMA
+from .graph_management import get_neo4j_connection, get_cypher_generation_chain, GRAPH_SCHEMA
 from .erp_client import ERPClient
 import numexpr as ne
 
 # Initialize the ERP Client
 erp_client = ERPClient()
 
+# Tools return pydantic output models rather than text; cognitive/rendering.py turns
+# them into answers in the user's language.
+
+class ToolError(Exception):
+    """A tool could not do what was asked; the message is shown to the user."""
+
 # --- Base Tool Schemas ---
 
 class GetCurrentDateInput(BaseModel):
     query: str = Field(description="Any string, will be ignored. Use this tool when the user asks for the current date.")
 
+class CurrentDateOutput(BaseModel):
+    date: str
+
 class GetCurrentDateTool:
     """
     Returns the current date. Use this tool when the user asks for the current date.
     """
-    def run(self, query: str) -> str:
-        return f"Today's date is {datetime.date.today().strftime('%Y-%m-%d')}."
+    input_schema = GetCurrentDateInput
+    output_schema = CurrentDateOutput
+
+    def run(self, query: str) -> CurrentDateOutput:
+        return CurrentDateOutput(date=datetime.date.today().strftime('%Y-%m-%d'))
 
 # --- Task Management Tools ---
 
@@ -26,88 +39,140 @@ class CreateTaskInput(BaseModel):
     description: str = Field(description="A detailed description of the task.")
     assignee_id: str = Field(description="The ID of the user to whom the task is assigned.")
 
+class TaskCreatedOutput(BaseModel):
+    task_id: str
+    title: str
+    assignee_id: str
+
 class CreateTaskTool:
     """
     Creates a new task with a title, description, and assigns it to a user.
     Use this when a user wants to create or assign a new task.
     """
-    def run(self, title: str, description: str, assignee_id: str, reporter_id: str = "system") -> str:
+    input_schema = CreateTaskInput
+    output_schema = TaskCreatedOutput
+
+    def run(self, title: str, description: str, assignee_id: str, reporter_id: str = "system") -> TaskCreatedOutput:
         # In a real system, reporter_id would come from the authenticated user
         result = erp_client.create_task(title, description, assignee_id, reporter_id)
         if "error" in result:
-            return f"Error creating task: {result['error']}"
-        return f"Successfully created task '{result['task_id']}: {result['title']}' and assigned it to {result['assignee_id']}."
+            raise ToolError(f"Error creating task: {result['error']}")
+        return TaskCreatedOutput(task_id=result['task_id'], title=result['title'], assignee_id=assignee_id)
+
+class TaskSummary(BaseModel):
+    task_id: str
+    title: str
+    status: str
+    project_id: Optional[str] = None
+    assignee_id: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: dict) -> "TaskSummary":
+        return cls(**{name: row.get(name) for name in cls.model_fields})
 
 class GetTasksByAssigneeInput(BaseModel):
     assignee_id: str = Field(description="The ID of the user whose tasks are to be retrieved.")
 
+class TasksByAssigneeOutput(BaseModel):
+    assignee_id: str
+    tasks: List[TaskSummary]
+
 class GetTasksByAssigneeTool:
     """
     Retrieves a list of all tasks assigned to a specific user.
     Use this when a user asks to see their tasks or someone else's tasks.
     """
-    def run(self, assignee_id: str) -> str:
+    input_schema = GetTasksByAssigneeInput
+    output_schema = TasksByAssigneeOutput
+
+    def run(self, assignee_id: str) -> TasksByAssigneeOutput:
         tasks = erp_client.get_tasks_by_assignee(assignee_id)
-        if not tasks:
-            return f"No tasks found for user '{assignee_id}'."
-        
-        task_list_str = "\n".join([f"- {t['task_id']}: {t['title']} (Project: {t.get('project_id', 'N/A')}, Status: {t['status']})") for t in tasks])
-        return f"Tasks for {assignee_id}:\n{task_list_str}"
+        return TasksByAssigneeOutput(assignee_id=assignee_id, tasks=[TaskSummary.from_row(t) for t in tasks])
 
 class GetTasksByProjectInput(BaseModel):
     project_id: str = Field(description="The ID of the project whose tasks are to be retrieved.")
 
+class TasksByProjectOutput(BaseModel):
+    project_id: str
+    tasks: List[TaskSummary]
+
 class GetTasksByProjectTool:
     """
     Retrieves a list of all tasks for a specific project.
     Use this when a user asks for all tasks related to a project.
     """
-    def run(self, project_id: str) -> str:
+    input_schema = GetTasksByProjectInput
+    output_schema = TasksByProjectOutput
+
+    def run(self, project_id: str) -> TasksByProjectOutput:
         tasks = erp_client.get_tasks_by_project(project_id)
-        if not tasks:
-            return f"No tasks found for project '{project_id}'."
-        
-        task_list_str = "\n".join([f"- {t['task_id']}: {t['title']} (Assignee: {t['assignee_id']}, Status: {t['status']})") for t in tasks])
-        return f"Tasks for project {project_id}:\n{task_list_str}"
+        return TasksByProjectOutput(project_id=project_id, tasks=[TaskSummary.from_row(t) for t in tasks])
 
 class UpdateTaskStatusInput(BaseModel):
     task_id: str = Field(description="The ID of the task to update (e.g., 'T-1').")
     new_status: str = Field(description="The new status for the task (e.g., 'Đang làm', 'Hoàn thành').")
 
+class TaskStatusUpdatedOutput(BaseModel):
+    task_id: str
+    new_status: str
+
 class UpdateTaskStatusTool:
     """
     Updates the status of a specific task.
     Use this when a user wants to change the state of a task.
     """
-    def run(self, task_id: str, new_status: str) -> str:
+    input_schema = UpdateTaskStatusInput
+    output_schema = TaskStatusUpdatedOutput
+
+    def run(self, task_id: str, new_status: str) -> TaskStatusUpdatedOutput:
         result = erp_client.update_task_status(task_id, new_status)
         if "error" in result:
-            return f"Error updating task {task_id}: {result['error']}"
-        return f"Successfully updated status for task {task_id} to '{new_status}'."
+            raise ToolError(f"Error updating task {task_id}: {result['error']}")
+        return TaskStatusUpdatedOutput(task_id=task_id, new_status=new_status)
 
 # --- Other Tools (Placeholder) ---
 
+class GraphERPLookupInput(BaseModel):
+    question: str = Field(description="The question to answer from the ERP Knowledge Graph.")
+
 class GraphERPLookupTool:
     """
     (Placeholder) Generates and executes a Cypher query against the ERP Knowledge Graph.
     """
-    def run(self, question: str, role: str) -> str:
+    input_schema = GraphERPLookupInput
+
+    def run(self, question: str, role: str = "default") -> str:
         return "GraphERPLookupTool is not yet implemented."
 
+class VectorSearchInput(BaseModel):
+    query: str = Field(description="The search query for the knowledge base.")
+
 class VectorSearchTool:
     """
     (Placeholder) Searches the knowledge base for relevant documents.
     """
-    def run(self, query: str, role: str) -> str:
+    input_schema = VectorSearchInput
+
+    def run(self, query: str, role: str = "default") -> str:
         return "VectorSearchTool is not yet implemented."
 
+class PerformCalculationInput(BaseModel):
+    expression: str = Field(description="The arithmetic expression to evaluate (e.g., '12 * (3 + 4)').")
+
+class CalculationOutput(BaseModel):
+    expression: str
+    result: str
+
 class PerformCalculationTool:
     """
     Performs a safe mathematical calculation.
     """
-    def run(self, expression: str) -> str:
+    input_schema = PerformCalculationInput
+    output_schema = CalculationOutput
+
+    def run(self, expression: str) -> CalculationOutput:
         try:
             result = ne.evaluate(expression)
-            return f"Result of '{expression}': {result}"
-        except Exception as e:
-            return f"Error performing calculation '{expression}': Invalid expression."
+        except Exception:
+            raise ToolError(f"Error performing calculation '{expression}': Invalid expression.") from None
+        return CalculationOutput(expression=expression, result=str(result))
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Vector index benchmark for ERP AI Pro.
+Compares the native memory-mapped index (erp_ai_pro/cognitive/vector_index.py) in its
+storage and search variants with Chroma on:
+  - recall@k against exact float32 search,
+  - per-query latency (p50 / p95),
+  - resident memory of the searching process, and index size on disk.
+
+Each variant is built and searched in a fresh interpreter, so RSS numbers do not include
+the other variants. The corpus is synthetic, clustered unit vectors by default, or the
+embeddings of a .npy file (one row per document).
+
+    python scripts/benchmark_vector_index.py
+    python scripts/benchmark_vector_index.py --count 200000 --dim 384 --variants flat-int8 ivf-int8 chroma
+    python scripts/benchmark_vector_index.py --vectors embeddings.npy --queries 500 --json bench.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Add the project root to the Python path for robust imports
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+VARIANTS = ["flat-float32", "flat-float16", "flat-int8", "ivf-float16", "ivf-int8", "chroma"]
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def directory_size(path: str) -> int:
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file())
+
+
+def synthetic_corpus(count: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Unit vectors around random cluster centres, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.35 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), count)] + 0.2 * rng.normal(size=(count, vectors.shape[1])).astype(np.float32)
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    neighbours = []
+    for start in range(0, len(queries), 256):
+        scores = queries[start:start + 256] @ vectors.T
+        neighbours.append(np.argsort(-scores, axis=1)[:, :k])
+    return np.concatenate(neighbours)
+
+
+def run_variant(variant: str, data_path: str, index_dir: str, k: int, nprobe: int) -> Dict[str, Any]:
+    """Child process: builds one variant, then measures search latency, recall and RSS."""
+    data = np.load(data_path)
+    vectors, queries, truth = data["vectors"], data["queries"], data["truth"]
+    ids = [str(row) for row in range(len(vectors))]
+    del data
+
+    build_start = time.perf_counter()
+    if variant == "chroma":
+        import chromadb
+
+        client = chromadb.PersistentClient(path=index_dir)
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+        step = 5000
+        for start in range(0, len(vectors), step):
+            collection.add(ids=ids[start:start + step], embeddings=vectors[start:start + step].tolist())
+        del client, collection
+        build_seconds = time.perf_counter() - build_start
+        del vectors
+        base_rss = rss_bytes()
+        client = chromadb.PersistentClient(path=index_dir)
+        collection = client.get_collection("bench")
+
+        def search(query: np.ndarray) -> List[int]:
+            return [int(i) for i in collection.query(query_embeddings=[query.tolist()], n_results=k)["ids"][0]]
+    else:
+        from erp_ai_pro.cognitive.vector_index import VectorIndex, write_index
+
+        index_type, dtype = variant.split("-")
+        write_index(index_dir, ids, ids, [{} for _ in ids], vectors, dtype=dtype, index_type=index_type)
+        build_seconds = time.perf_counter() - build_start
+        del vectors
+        base_rss = rss_bytes()
+        index = VectorIndex(index_dir)
+
+        def search(query: np.ndarray) -> List[int]:
+            return [int(index.documents[row]["id"]) for row, _ in index.search(query, k, nprobe=nprobe)]
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found) & set(expected.tolist()))
+    return {
+        "variant": variant,
+        "recall_at_k": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "build_seconds": build_seconds,
+        "rss_mb": rss_bytes() / 2**20,
+        "rss_added_mb": (rss_bytes() - base_rss) / 2**20,
+        "disk_mb": directory_size(index_dir) / 2**20,
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    vectors = np.load(args.vectors).astype(np.float32) if args.vectors else synthetic_corpus(args.count, args.dim)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = make_queries(vectors, args.queries)
+    print(f"Corpus: {len(vectors)} x {vectors.shape[1]}, {len(queries)} queries, k={args.k}. Computing exact neighbours...")
+    truth = exact_neighbours(vectors, queries, args.k)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        data_path = os.path.join(workdir, "data.npz")
+        np.savez(data_path, vectors=vectors, queries=queries, truth=truth)
+        del vectors
+        for variant in args.variants:
+            index_dir = os.path.join(workdir, variant)
+            command = [sys.executable, __file__, "--worker", variant, "--data", data_path, "--index-dir", index_dir,
+                       "--k", str(args.k), "--nprobe", str(args.nprobe)]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                reason = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"
+                print(f"{variant:>14}: skipped ({reason})")
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{variant:>14}: recall@{args.k} {result['recall_at_k']:.3f}  p50 {result['p50_ms']:.2f}ms  "
+                  f"p95 {result['p95_ms']:.2f}ms  RSS {result['rss_mb']:.0f}MB (+{result['rss_added_mb']:.0f}MB)  "
+                  f"disk {result['disk_mb']:.1f}MB  build {result['build_seconds']:.1f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the native vector index against Chroma.")
+    parser.add_argument("--count", type=int, default=50000, help="Synthetic corpus size.")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic embedding dimension (all-MiniLM-L6-v2: 384).")
+    parser.add_argument("--vectors", help="Benchmark on these embeddings (.npy) instead of a synthetic corpus.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF lists probed per query.")
+    parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    # Internal: run one variant in this (child) process.
+    parser.add_argument("--worker", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    parser.add_argument("--index-dir", help=argparse.SUPPRESS)
+    parsed = parser.parse_args()
+    if parsed.worker:
+        print(json.dumps(run_variant(parsed.worker, parsed.data, parsed.index_dir, parsed.k, parsed.nprobe)))
+        sys.exit(0)
+    sys.exit(main(parsed))
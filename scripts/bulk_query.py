@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Offline bulk inference for ERP AI Pro.
+Runs a file of questions through MainSystem without the API, for QA regression sets and
+cache pre-warming. Questions are processed in chunks through MainSystem.query_batch, so
+each chunk is routed in one batched LLM call and its knowledge answers are generated in
+large batched calls; with the default vllm_offline backend those go to vLLM's offline
+LLM.generate.
+
+Input is JSONL or CSV with a `question` column and optional `role` and `id` columns.
+Results are appended to the output after every chunk, so an interrupted run resumes
+where it stopped when started again with the same arguments. Parquet output is written
+from that progress file once all questions are answered (requires pyarrow).
+
+    python scripts/bulk_query.py questions.jsonl results.jsonl
+    python scripts/bulk_query.py regression.csv results.parquet --batch-size 512 --default-role analyst
+    python scripts/bulk_query.py questions.jsonl results.jsonl --backend fake
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Set
+
+# Add the project root to the Python path for robust imports
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+
+def read_questions(path: str, default_role: str) -> Iterator[Dict[str, str]]:
+    """Yields {"id", "role", "question"} items; ids default to the item's position in the file."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for position, row in enumerate(rows):
+            question = (row.get("question") or "").strip()
+            if not question:
+                continue
+            yield {
+                "id": str(row.get("id") or position),
+                "role": row.get("role") or default_role,
+                "question": question,
+            }
+
+
+def completed_ids(progress_path: str) -> Set[str]:
+    """Ids already answered in an earlier run. A line cut off by an interruption is ignored."""
+    done = set()
+    if not os.path.exists(progress_path):
+        return done
+    with open(progress_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return done
+
+
+def truncate_partial_line(progress_path: str):
+    """Drops a trailing line left incomplete by an interrupted write, so appends stay valid JSONL."""
+    if not os.path.exists(progress_path):
+        return
+    with open(progress_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def write_parquet(progress_path: str, output_path: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with open(progress_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    for row in rows:
+        # Responses differ in shape between agents; keep them as JSON text.
+        row["response"] = json.dumps(row["response"], ensure_ascii=False, default=str)
+    pq.write_table(pa.Table.from_pylist(rows), output_path)
+
+
+class Throughput:
+    def __init__(self, llm, already_done: int):
+        self.llm = llm
+        self.start = time.perf_counter()
+        self.start_tokens = llm.completion_tokens
+        self.questions = 0
+        self.estimated_tokens = 0
+        self.already_done = already_done
+
+    def add(self, result: Dict[str, Any]):
+        self.questions += 1
+        # Fallback for backends that do not count generated tokens.
+        self.estimated_tokens += len(str(result.get("answer") or result.get("result") or "").split())
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        counted = self.llm.completion_tokens - self.start_tokens
+        tokens = counted or self.estimated_tokens
+        return {
+            "questions": self.questions,
+            "resumed_after": self.already_done,
+            "seconds": elapsed,
+            "questions_per_second": self.questions / elapsed if elapsed else 0.0,
+            "tokens": tokens,
+            "tokens_estimated": not counted,
+            "tokens_per_second": tokens / elapsed if elapsed else 0.0,
+        }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    estimated = " (estimated from answer words)" if summary["tokens_estimated"] else ""
+    return (f"{summary['questions']} questions in {summary['seconds']:.1f}s: "
+            f"{summary['questions_per_second']:.2f} questions/s, "
+            f"{summary['tokens_per_second']:.1f} tokens/s{estimated}")
+
+
+async def main(args: argparse.Namespace) -> int:
+    from erp_ai_pro.cognitive.main_system import MainSystem
+    from erp_ai_pro.config.config import SystemConfig
+
+    parquet = args.output.endswith(".parquet")
+    progress_path = args.output + ".partial.jsonl" if parquet else args.output
+    truncate_partial_line(progress_path)
+    done = completed_ids(progress_path)
+    pending = [item for item in read_questions(args.input, args.default_role) if item["id"] not in done]
+    print(f"{len(done)} questions already answered, {len(pending)} to go.")
+
+    # One chunk is routed in one LLM call and answered in as few generate calls as possible.
+    config = SystemConfig(
+        llm_backend=args.backend,
+        preload_agents=[],
+        routing_batch_max_size=args.batch_size,
+        routing_batch_max_wait_ms=50.0,
+        batch_generation_size=args.batch_size,
+        batch_max_concurrency=args.batch_size,
+        response_cache_enabled=not args.no_cache,
+    )
+    system = MainSystem(config)
+    await system.setup()
+    if system.llm is None:
+        print(f"Could not load the '{args.backend}' LLM backend.", file=sys.stderr)
+        return 1
+    await system.agents.get("KnowledgeAgent")
+
+    throughput = Throughput(system.llm, len(done))
+    with open(progress_path, "a", encoding="utf-8") as out:
+        for start in range(0, len(pending), args.batch_size):
+            chunk = pending[start:start + args.batch_size]
+            async for index, result in system.query_batch([(item["question"], item["role"]) for item in chunk]):
+                item = chunk[index]
+                record = {**item, "chosen_agent": result.get("chosen_agent", "unknown"),
+                          "answer": result.get("answer") or result.get("result"), "response": result}
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                throughput.add(result)
+            # Everything written so far survives an interruption.
+            out.flush()
+            os.fsync(out.fileno())
+            print(f"[{len(done) + start + len(chunk)}/{len(done) + len(pending)}] {format_summary(throughput.summary())}")
+
+    await system.shutdown()
+    if parquet:
+        write_parquet(progress_path, args.output)
+        os.remove(progress_path)
+
+    summary = throughput.summary()
+    print(format_summary(summary))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of questions offline through MainSystem.")
+    parser.add_argument("input", help="JSONL or CSV file with question, and optional role and id, columns.")
+    parser.add_argument("output", help="Results file: .jsonl, or .parquet (needs pyarrow).")
+    parser.add_argument("--backend", default="vllm_offline", help="LLM backend (default: vllm_offline).")
+    parser.add_argument("--batch-size", type=int, default=256, help="Questions routed and generated per batch.")
+    parser.add_argument("--default-role", default="default", help="Role for rows without one.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or fill the answer cache.")
+    parser.add_argument("--json", help="Also write the throughput summary to this JSON file.")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Load test harness for the ERP AI Pro API.
+Drives /query/text, /query/multimodal and /ws at a fixed request rate (open loop: requests
+are sent on schedule whether or not earlier ones have finished) and reports latency
+percentiles per endpoint and agent, achieved throughput and event-loop lag.
+
+By default the FastAPI app is served in-process over an ASGI transport with the fake LLM
+backend, so no model, GPU or running server is needed:
+
+    python scripts/load_test.py --rps 50 --duration 30
+
+Against a running server (event-loop lag is scraped from its /metrics endpoint; /ws
+needs the `websockets` package):
+
+    python scripts/load_test.py --url http://localhost:8000 --rps 20 --duration 60 --mix text=0.7,multimodal=0.1,ws=0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+# Add the project root to the Python path for robust imports
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+# (role, question) pairs covering every agent, in English and Vietnamese.
+QUESTIONS: List[Tuple[str, str]] = [
+    ("project_manager", "List all tasks for project PROJ-WEB"),
+    ("project_manager", "Liệt kê các công việc của dự án PROJ-APP"),
+    ("default", "What are my tasks for @nhanvien_A?"),
+    ("admin", "What is today's date?"),
+    ("finance_manager", "Calculate 1250 * 12"),
+    ("analyst", "Forecast our revenue for the next quarter."),
+    ("ceo", "Dự báo doanh thu quý tới"),
+    ("warehouse_manager", "Làm thế nào để kiểm tra tồn kho hiện tại?"),
+    ("hr_manager", "Explain the process for new employee onboarding."),
+    ("customer_service", "What is our company's return policy?"),
+    ("default", "Hello there"),
+]
+
+# A 1x1 PNG, enough to exercise the multimodal upload path.
+TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000005000157dd8d2e0000000049454e44ae426082"
+)
+
+
+class ASGIWebSocket:
+    """Minimal in-process WebSocket client speaking the ASGI protocol directly to the app."""
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "ASGIWebSocket":
+        scope = {
+            "type": "websocket", "path": self.path, "raw_path": self.path.encode(), "query_string": b"",
+            "headers": [], "scheme": "ws", "server": ("testserver", 80), "client": ("loadtest", 0),
+            "subprotocols": [], "asgi": {"version": "3.0"},
+        }
+        self._task = asyncio.ensure_future(self.app(scope, self._to_app.get, self._from_app.put))
+        await self._to_app.put({"type": "websocket.connect"})
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket rejected: {message}")
+        return self
+
+    async def send(self, text: str):
+        await self._to_app.put({"type": "websocket.receive", "text": text})
+
+    async def recv(self) -> str:
+        message = await self._from_app.get()
+        if message["type"] != "websocket.send":
+            raise ConnectionError(f"WebSocket closed: {message}")
+        return message.get("text") or message["bytes"].decode()
+
+    async def __aexit__(self, *exc_info):
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self._task, timeout=5)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        endpoint, _, weight = part.partition("=")
+        if endpoint not in ("text", "multimodal", "ws"):
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in --mix: '{endpoint}'")
+        weights[endpoint] = float(weight)
+    return weights
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, app=None, url: Optional[str] = None, timeout: float = 60.0):
+        self.client = client
+        self.app = app
+        self.url = url
+        self.timeout = timeout
+        # (endpoint, agent, latency seconds, ok)
+        self.results: List[Tuple[str, str, float, bool]] = []
+        self.lag_samples: List[float] = []
+
+    async def query_text(self, role: str, question: str) -> str:
+        response = await self.client.post("/query/text", json={"role": role, "question": question})
+        response.raise_for_status()
+        return response.json().get("chosen_agent", "unknown")
+
+    async def query_multimodal(self, role: str, question: str) -> str:
+        response = await self.client.post(
+            "/query/multimodal",
+            params={"role": role, "question": question},
+            files={"file": ("loadtest.png", TINY_PNG, "image/png")},
+        )
+        response.raise_for_status()
+        return response.json().get("chosen_agent", "unknown")
+
+    async def query_ws(self, role: str, question: str) -> str:
+        message = json.dumps({"role": role, "question": question})
+        if self.app is not None:
+            async with ASGIWebSocket(self.app, "/ws") as websocket:
+                await websocket.send(message)
+                response = json.loads(await websocket.recv())
+        else:
+            import websockets
+            ws_url = self.url.replace("http", "ws", 1).rstrip("/") + "/ws"
+            async with websockets.connect(ws_url) as websocket:
+                await websocket.send(message)
+                response = json.loads(await websocket.recv())
+        if "retry_after" in response:
+            return "shed"
+        if "error" in response and "chosen_agent" not in response:
+            raise RuntimeError(response["error"])
+        return response.get("chosen_agent", "unknown")
+
+    async def one_request(self, endpoint: str, role: str, question: str):
+        send = {"text": self.query_text, "multimodal": self.query_multimodal, "ws": self.query_ws}[endpoint]
+        start = time.perf_counter()
+        try:
+            agent = await asyncio.wait_for(send(role, question), timeout=self.timeout)
+            ok = True
+        except httpx.HTTPStatusError as e:
+            # 503 is admission control shedding load, reported apart from failures.
+            agent, ok = ("shed" if e.response.status_code == 503 else f"error:{e.response.status_code}"), False
+        except Exception as e:
+            agent, ok = f"error:{type(e).__name__}", False
+        self.results.append((endpoint, agent, time.perf_counter() - start, ok))
+
+    async def sample_lag(self, interval: float = 0.1):
+        """Samples the server's erp_ai_event_loop_lag_seconds gauge."""
+        while True:
+            await asyncio.sleep(interval)
+            if self.app is not None:
+                from prometheus_client import REGISTRY
+                value = REGISTRY.get_sample_value("erp_ai_event_loop_lag_seconds")
+            else:
+                try:
+                    metrics = (await self.client.get("/metrics")).text
+                except httpx.HTTPError:
+                    continue
+                value = next(
+                    (float(line.split()[-1]) for line in metrics.splitlines() if line.startswith("erp_ai_event_loop_lag_seconds ")),
+                    None,
+                )
+            if value is not None:
+                self.lag_samples.append(value)
+
+    async def run(self, rps: float, duration: float, mix: Dict[str, float], seed: int) -> float:
+        """Sends requests on a fixed schedule and returns the wall time until all completed."""
+        rng = random.Random(seed)
+        endpoints, weights = zip(*mix.items())
+        loop = asyncio.get_running_loop()
+        sampler = asyncio.ensure_future(self.sample_lag())
+        tasks = []
+        start = loop.time()
+        for i in range(int(rps * duration)):
+            delay = start + i / rps - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            role, question = rng.choice(QUESTIONS)
+            endpoint = rng.choices(endpoints, weights)[0]
+            tasks.append(asyncio.ensure_future(self.one_request(endpoint, role, question)))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+        sampler.cancel()
+        return elapsed
+
+    def report(self, rps: float, elapsed: float) -> Dict[str, Any]:
+        groups: Dict[Tuple[str, str], List[float]] = {}
+        for endpoint, agent, latency, _ in self.results:
+            groups.setdefault((endpoint, agent), []).append(latency)
+        rows = []
+        for (endpoint, agent), latencies in sorted(groups.items()):
+            latencies.sort()
+            rows.append({
+                "endpoint": endpoint, "agent": agent, "count": len(latencies),
+                "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+            })
+        lag = sorted(self.lag_samples)
+        return {
+            "target_rps": rps,
+            "requests": len(self.results),
+            "errors": sum(1 for _, agent, _, ok in self.results if not ok and agent != "shed"),
+            "shed": sum(1 for _, agent, _, _ in self.results if agent == "shed"),
+            "throughput_rps": len(self.results) / elapsed if elapsed else 0.0,
+            "latency": rows,
+            "event_loop_lag": {
+                "samples": len(lag), "p50": percentile(lag, 50), "p99": percentile(lag, 99),
+                "max": lag[-1] if lag else float("nan"),
+            },
+        }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"Requests: {report['requests']}  errors: {report['errors']}  shed: {report['shed']}  "
+          f"throughput: {report['throughput_rps']:.1f} req/s (target {report['target_rps']:.1f})")
+    print(f"{'endpoint':<12}{'agent':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in report["latency"]:
+        print(f"{row['endpoint']:<12}{row['agent']:<28}{row['count']:>7}"
+              f"{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}")
+    lag = report["event_loop_lag"]
+    print(f"Event loop lag ({lag['samples']} samples): p50 {lag['p50'] * 1000:.1f} ms, "
+          f"p99 {lag['p99'] * 1000:.1f} ms, max {lag['max'] * 1000:.1f} ms")
+
+
+async def main(args: argparse.Namespace):
+    mix = parse_mix(args.mix)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            load_test = LoadTest(client, url=args.url, timeout=args.timeout)
+            elapsed = await load_test.run(args.rps, args.duration, mix, args.seed)
+    else:
+        # The backend is read from the environment when SystemConfig is created.
+        os.environ.setdefault("LLM_BACKEND", args.backend)
+        from erp_ai_pro.presentation.main import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+                load_test = LoadTest(client, app=app, timeout=args.timeout)
+                elapsed = await load_test.run(args.rps, args.duration, mix, args.seed)
+
+    report = load_test.report(args.rps, elapsed)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the ERP AI Pro API.")
+    parser.add_argument("--url", help="Base URL of a running server; omit to serve the app in-process.")
+    parser.add_argument("--backend", default="fake", help="LLM backend for in-process mode (default: fake).")
+    parser.add_argument("--rps", type=float, default=20.0, help="Target requests per second.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to send requests for.")
+    parser.add_argument("--mix", default="text=0.8,multimodal=0.1,ws=0.1", help="Endpoint weights.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the request mix.")
+    parser.add_argument("--json", help="Also write the report to this JSON file.")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Startup profiler for ERP AI Pro.
+Imports a module (by default the API, erp_ai_pro.presentation.main) in fresh interpreters
+and reports:
+  - the import-time tree from `python -X importtime` (cumulative time per module),
+  - the resident memory added by each module's import (inclusive of what it imports),
+  - which heavy libraries were pulled in at import time.
+
+Heavy libraries are meant to be imported only when the code that needs them runs, so
+`--fail-on-heavy` exits non-zero if any of them is imported, for use in CI:
+
+    python scripts/profile_startup.py
+    python scripts/profile_startup.py --module erp_ai_pro.cognitive.main_system --top 40
+    python scripts/profile_startup.py --fail-on-heavy --json startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+project_root = Path(__file__).resolve().parent.parent
+
+# Libraries that must not be loaded just by importing the API.
+HEAVY_MODULES = [
+    "torch", "transformers", "vllm", "sentence_transformers", "easyocr", "cv2", "PIL",
+    "pandas", "polars", "sklearn", "scipy", "xgboost", "lightgbm", "prophet", "optuna", "statsmodels",
+    "matplotlib", "seaborn", "plotly", "selenium", "langchain", "langchain_community", "chromadb", "neo4j",
+]
+
+# Runs in the child interpreter: wraps __import__ to record the RSS added by each new
+# top-level import of a module, then prints the results as JSON.
+RSS_DRIVER = r"""
+import builtins, json, os, sys
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+deltas = {}
+original_import = builtins.__import__
+
+def measured_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules:
+        return original_import(name, globals, locals, fromlist, level)
+    before = rss_bytes()
+    try:
+        return original_import(name, globals, locals, fromlist, level)
+    finally:
+        deltas[name] = deltas.get(name, 0) + rss_bytes() - before
+
+start = rss_bytes()
+builtins.__import__ = measured_import
+try:
+    __import__(sys.argv[1])
+finally:
+    builtins.__import__ = original_import
+print(json.dumps({"baseline": start, "total": rss_bytes(), "deltas": deltas, "modules": sorted(sys.modules)}))
+"""
+
+
+def run_child(args: List[str]) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(project_root), os.environ.get("PYTHONPATH")])))
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, cwd=project_root, env=env)
+
+
+def profile_import_time(module: str) -> List[Dict[str, Any]]:
+    """Returns the -X importtime entries in import order: name, depth, self and cumulative microseconds."""
+    result = run_child(["-X", "importtime", "-c", f"import {module}"])
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:  <self> | <cumulative> | <two spaces per level><module>"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append({"module": name.strip(), "depth": depth, "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return entries
+
+
+def profile_rss(module: str) -> Dict[str, Any]:
+    result = run_child(["-c", RSS_DRIVER, module])
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_tree(entries: List[Dict[str, Any]], top: int, max_depth: int):
+    """Prints the slowest modules, indented by import depth, in import order."""
+    visible = [entry for entry in entries if entry["depth"] <= max_depth]
+    threshold = sorted((entry["cumulative_us"] for entry in visible), reverse=True)[:top][-1] if visible else 0
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    # -X importtime lists a module after its imports; reversing puts parents first.
+    for entry in reversed(visible):
+        if entry["cumulative_us"] >= threshold:
+            print(f"{entry['cumulative_us'] / 1000:>14.1f}{entry['self_us'] / 1000:>10.1f}  {'  ' * entry['depth']}{entry['module']}")
+
+
+def main(args: argparse.Namespace) -> int:
+    entries = profile_import_time(args.module)
+    rss = profile_rss(args.module)
+    root = next((entry for entry in entries if entry["module"] == args.module), entries[-1])
+    heavy = sorted(name for name in HEAVY_MODULES if name in rss["modules"])
+
+    print(f"Import of {args.module}: {root['cumulative_us'] / 1000:.1f} ms, "
+          f"{(rss['total'] - rss['baseline']) / 2**20:.1f} MiB RSS added ({rss['total'] / 2**20:.1f} MiB total)\n")
+    print_tree(entries, args.top, args.depth)
+
+    print(f"\n{'RSS MiB':>10}  module (inclusive of its imports)")
+    for name, delta in sorted(rss["deltas"].items(), key=lambda item: -item[1])[:args.top]:
+        if delta > 0:
+            print(f"{delta / 2**20:>10.1f}  {name}")
+
+    print(f"\nHeavy libraries imported at startup: {', '.join(heavy) if heavy else 'none'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "module": args.module,
+                "import_ms": root["cumulative_us"] / 1000,
+                "rss_added_bytes": rss["total"] - rss["baseline"],
+                "import_time": entries,
+                "rss_deltas": rss["deltas"],
+                "heavy_modules": heavy,
+            }, f, indent=2)
+
+    return 1 if args.fail_on_heavy and heavy else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile import time and memory at startup.")
+    parser.add_argument("--module", default="erp_ai_pro.presentation.main", help="Module to import.")
+    parser.add_argument("--top", type=int, default=25, help="Number of modules to list.")
+    parser.add_argument("--depth", type=int, default=3, help="Deepest import level shown in the tree.")
+    parser.add_argument("--json", help="Also write the full profile to this JSON file.")
+    parser.add_argument("--fail-on-heavy", action="store_true", help="Exit with status 1 if a heavy library is imported.")
+    sys.exit(main(parser.parse_args()))
@@ -1,70 +1,64 @@
 # -*- coding: utf-8 -*-
 """
-Script to create and persist the ChromaDB vector store from the ERP knowledge base.
+Script to create or update the vector store from the ERP knowledge base.
+
+The knowledge base (JSON Lines, read lazily, or a JSON list) is streamed through the
+ingestion pipeline (erp_ai_pro/cognitive/ingestion.py). Long documents are chunked, and
+only new and changed chunks are embedded, in batches across a pool of worker processes.
+Documents removed from the knowledge base are deleted, and running KnowledgeAgents pick
+up the new version without a restart. An interrupted run resumes from its checkpoint, and
+--full re-embeds everything.
+
+    python scripts/run_create_vector_store.py
+    python scripts/run_create_vector_store.py --backend native --workers 4 --batch-size 512
+    python scripts/run_create_vector_store.py --knowledge-base knowledge.jsonl --full
 """
-import json
+import argparse
+import dataclasses
 from pathlib import Path
 import sys
 
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_core.documents import Document
-from langchain_community.vectorstores.utils import filter_complex_metadata
-
 # Add the project root to the Python path for robust imports
 project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(project_root))
 
-from erp_ai_pro.core.rag_config import RAGConfig
+from erp_ai_pro.config.rag_config import RAGConfig
+from erp_ai_pro.cognitive.ingestion import read_knowledge_base, sync_vector_store
 
-def create_vector_store():
+def create_vector_store(args: argparse.Namespace):
     config = RAGConfig()
+    config = dataclasses.replace(
+        config,
+        vector_store_backend=args.backend or config.vector_store_backend,
+        vector_store_path=str(project_root / config.vector_store_path),
+        native_index_path=str(project_root / config.native_index_path),
+        ingest_workers=config.ingest_workers if args.workers is None else args.workers,
+        ingest_batch_size=args.batch_size or config.ingest_batch_size,
+    )
 
     # Construct the absolute path to the knowledge base file
-    knowledge_base_file = project_root / config.knowledge_base_path
-    print(f"--- Creating Vector Store from: {knowledge_base_file} ---")
-
-    # Load knowledge base
-    try:
-        with open(knowledge_base_file, 'r', encoding='utf-8') as f:
-            knowledge_data = json.load(f)
-    except FileNotFoundError:
+    knowledge_base_file = project_root / (args.knowledge_base or config.knowledge_base_path)
+    if not knowledge_base_file.exists():
         print(f"Error: Knowledge base file not found at {knowledge_base_file}")
         sys.exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON in knowledge base file at {knowledge_base_file}")
-        sys.exit(1)
+    print(f"--- Syncing the {config.vector_store_backend} vector store from: {knowledge_base_file} ---")
 
-    # Convert data to LangChain Document format
-    documents = []
-    for item in knowledge_data:
-        doc = Document(
-            page_content=item["content"],
-            metadata=item.get("metadata", {})
-        )
-        documents.append(doc)
-
-    if not documents:
-        print("No documents found in the knowledge base. Vector store will be empty.")
-        return
-
-    # Filter complex metadata
-    documents = filter_complex_metadata(documents)
-
-    # Initialize embedding function
-    print(f"Initializing embedding model: {config.embedding_model_name}")
-    embedding_function = SentenceTransformerEmbeddings(model_name=config.embedding_model_name)
+    try:
+        report = sync_vector_store(config, read_knowledge_base(str(knowledge_base_file)), full=args.full)
+    except ValueError as e:
+        # json.JSONDecodeError is a ValueError too.
+        print(f"Error: Invalid knowledge base file at {knowledge_base_file}: {e}")
+        sys.exit(1)
 
-    # Create and persist the vector store
-    print(f"Creating and persisting ChromaDB vector store to: {config.vector_store_path}")
-    vector_store = Chroma.from_documents(
-        documents=documents,
-        embedding=embedding_function,
-        persist_directory=str(project_root / config.vector_store_path),
-        collection_name=config.collection_name
-    )
-    vector_store.persist()
-    print("Vector store created and persisted successfully.")
+    print(f"Vector store synced: {report}.")
+    for stage in report.stages:
+        print(f"  {stage}")
 
 if __name__ == "__main__":
-    create_vector_store()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create or incrementally update the ERP knowledge vector store.")
+    parser.add_argument("--backend", choices=["chroma", "native"], help="Defaults to VECTOR_STORE_BACKEND.")
+    parser.add_argument("--knowledge-base", help="Knowledge base .jsonl or .json file; defaults to ERP_KNOWLEDGE_BASE_PATH.")
+    parser.add_argument("--full", action="store_true", help="Re-embed every document instead of only the changed ones.")
+    parser.add_argument("--workers", type=int, help="Embedding processes (0: in this process); defaults to INGEST_WORKERS.")
+    parser.add_argument("--batch-size", type=int, help="Chunks per embedding batch; defaults to INGEST_BATCH_SIZE.")
+    create_vector_store(parser.parse_args())